@@ -1,3 +1,7 @@
+# Versão do prompt: incremente ao alterar SYSTEM_PROMPT ou USER_MESSAGE_TEMPLATE
+# (invalida as comparações em cache)
+PROMPT_VERSION = "2"
+
 SYSTEM_PROMPT = """
 # Role (Papel)
 Você é um Médico Auditor Especialista em Radiologia e Diagnóstico por Imagem. Sua função
@@ -83,3 +87,25 @@ USER_MESSAGE_TEMPLATE = """
 ## LAUDO AUDITOR (B)
 {auditor_text}
 """
+
+# Acrescentado à mensagem quando só os trechos divergentes são enviados (ver report_diff)
+EXCERPT_NOTE = """
+## Observação
+Os laudos abaixo foram reduzidos aos trechos que diferem entre si, com trechos
+vizinhos como contexto. As partes omitidas (marcadas com [...]) são idênticas nos
+dois laudos ({shared_segments} trechos em comum) e devem ser consideradas concordantes.
+"""
+
+# Continuação de uma resposta interrompida (ex.: limite de tokens de saída)
+CONTINUE_PROMPT = """
+Sua resposta anterior foi interrompida. Continue o JSON exatamente do ponto em que
+parou, sem repetir nada do que já foi enviado e sem nenhum texto adicional.
+"""
+
+# Correção de um JSON malformado, sem reenviar os laudos
+REPAIR_PROMPT_TEMPLATE = """
+O JSON abaixo, com uma análise comparativa de laudos, está malformado. Corrija apenas
+a sintaxe, sem alterar o conteúdo, e responda EXCLUSIVAMENTE com o JSON corrigido.
+
+{response_text}
+"""
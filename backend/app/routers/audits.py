@@ -1,11 +1,10 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import StreamingResponse
-from typing import Optional
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from typing import Any, AsyncIterator, List, Literal, Optional
 from datetime import date
 from pydantic import BaseModel
-import io
-
-from app.services.pdf_extractor import extract_text_from_pdf, validate_pdf
+import hashlib
+import json
 
 
 class TextAuditRequest(BaseModel):
@@ -14,11 +13,24 @@ class TextAuditRequest(BaseModel):
     patient_name: str = "Não informado"
     exam_type: str = "Não informado"
     exam_date: Optional[str] = None
-from app.services.gemini_comparator import compare_reports
+from app.services.audit_pipeline import (
+    AuditPipelineError, run_pdf_audit, run_text_audit, stream_pdf_audit, stream_text_audit
+)
+from app.services.batch_audit import (
+    BatchError, check_batch_size, duplicate_names, pairs_from_manifest, pairs_from_zip,
+    stream_batch
+)
+from app.services.audit_stats import audit_stats
+from app.services.job_queue import (
+    CallbackURLError, audit_job_queue, serialize_job, validate_callback_url
+)
 from app.services.supabase_client import (
-    upload_pdf_to_storage, save_audit, get_audit, list_audits
+    AUDIT_FIELDS, count_discrepancies, get_audit, get_audit_texts, list_audits,
+    list_discrepancies
 )
-from app.services.report_generator import generate_report_pdf
+from app.services.report_cache import report_cache
+from app.services.report_generator import generate_report_pdf, report_content_hash
+from app.services.worker_pools import run_cpu, run_io
 
 router = APIRouter(prefix="/api/audits", tags=["audits"])
 
@@ -41,234 +53,406 @@ async def create_audit(
     - Salva tudo no Supabase
     """
 
-    # 1. Lê os arquivos
+    # Lê os arquivos
     official_bytes = await official_pdf.read()
     auditor_bytes = await auditor_pdf.read()
 
-    # 2. Valida os PDFs
-    is_valid, error = validate_pdf(official_bytes)
-    if not is_valid:
-        raise HTTPException(status_code=400, detail=f"Laudo Oficial inválido: {error}")
+    try:
+        return await run_pdf_audit(
+            official_bytes,
+            auditor_bytes,
+            official_filename=official_pdf.filename,
+            auditor_filename=auditor_pdf.filename,
+            patient_name=patient_name,
+            exam_type=exam_type,
+            exam_date=exam_date
+        )
+    except AuditPipelineError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
-    is_valid, error = validate_pdf(auditor_bytes)
-    if not is_valid:
-        raise HTTPException(status_code=400, detail=f"Laudo Auditor inválido: {error}")
 
-    # 3. Extrai texto dos PDFs
-    official_text = extract_text_from_pdf(official_bytes)
-    auditor_text = extract_text_from_pdf(auditor_bytes)
+@router.post("/text")
+async def create_audit_from_text(request: TextAuditRequest):
+    """
+    Cria uma nova auditoria a partir de textos já extraídos.
 
-    if not official_text:
-        raise HTTPException(
-            status_code=400,
-            detail="Não foi possível extrair texto do Laudo Oficial. O PDF pode ser uma imagem escaneada."
-        )
+    - Recebe 2 textos (oficial e auditor)
+    - Envia para IA comparar
+    - Gera relatório PDF
+    - Salva tudo no Supabase
+    """
 
-    if not auditor_text:
-        raise HTTPException(
-            status_code=400,
-            detail="Não foi possível extrair texto do Laudo Auditor. O PDF pode ser uma imagem escaneada."
+    try:
+        return await run_text_audit(
+            official_text=request.official_text,
+            auditor_text=request.auditor_text,
+            patient_name=request.patient_name,
+            exam_type=request.exam_type,
+            exam_date=request.exam_date
         )
+    except AuditPipelineError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
-    # 4. Compara os laudos via Gemini
-    comparison_result = compare_reports(
-        official_text=official_text,
-        auditor_text=auditor_text,
-        patient_name=patient_name,
-        exam_type=exam_type,
-        exam_date=exam_date or "Não informada"
-    )
 
-    if not comparison_result["success"]:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Erro na análise: {comparison_result.get('error', 'Erro desconhecido')}"
-        )
+def _sse_message(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-    analysis = comparison_result["data"]
 
-    # 5. Faz upload dos PDFs para o Storage
-    official_url = upload_pdf_to_storage(
-        official_bytes,
-        official_pdf.filename or "laudo_oficial.pdf",
-        folder="oficiais"
-    )
+async def _sse(events: AsyncIterator[tuple[str, Any]]) -> AsyncIterator[str]:
+    """Converte eventos do pipeline em Server-Sent Events (erros viram evento "error")."""
+    try:
+        async for event, data in events:
+            yield _sse_message(event, data)
+    except AuditPipelineError as e:
+        yield _sse_message("error", {"status_code": e.status_code, "detail": e.detail})
+    except Exception as e:
+        # Erro inesperado: o cliente recebe um evento genérico em vez de a conexão cair
+        print(f"Erro no streaming da auditoria: {e!r}")
+        yield _sse_message("error", {"status_code": 500, "detail": "Erro interno ao processar a auditoria"})
 
-    auditor_url = upload_pdf_to_storage(
-        auditor_bytes,
-        auditor_pdf.filename or "laudo_auditor.pdf",
-        folder="auditores"
-    )
 
-    # 6. Prepara dados da auditoria
-    audit_data = {
-        "patient_name": patient_name,
-        "exam_type": exam_type,
-        "exam_date": exam_date,
-        "official_pdf_url": official_url,
-        "auditor_pdf_url": auditor_url,
-        "official_text": official_text,
-        "auditor_text": auditor_text,
-        "classification": analysis.get("classification"),
-        "analysis_summary": analysis.get("summary"),
-        "concordant_findings": analysis.get("concordant_findings", []),
-        "discrepancies": analysis.get("discrepancies", []),
-        "has_critical_alert": analysis.get("has_critical_alert", False),
-        "critical_alert_text": analysis.get("critical_alert_text"),
-        "technical_note": analysis.get("technical_note"),
-    }
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
 
-    # 7. Gera o relatório PDF
-    report_bytes = generate_report_pdf(audit_data)
 
-    # 8. Faz upload do relatório
-    report_url = upload_pdf_to_storage(
-        report_bytes,
-        f"relatorio_{patient_name.replace(' ', '_')}.pdf",
-        folder="relatorios"
+@router.post("/stream")
+async def create_audit_stream(
+    official_pdf: UploadFile = File(..., description="PDF do Laudo Oficial"),
+    auditor_pdf: UploadFile = File(..., description="PDF do Laudo Auditor"),
+    patient_name: str = Form(default="Não informado"),
+    exam_type: str = Form(default="Não informado"),
+    exam_date: Optional[str] = Form(default=None)
+):
+    """
+    Cria uma auditoria enviando o resultado em streaming (SSE).
+
+    Eventos: `stage`, `ingestion`, `classification`, `summary`,
+    `concordant_finding` (um por achado), `discrepancy` (uma por discrepância),
+    demais campos da análise, e `done` com o resultado completo (ou `error`).
+    """
+    official_bytes = await official_pdf.read()
+    auditor_bytes = await auditor_pdf.read()
+
+    events = stream_pdf_audit(
+        official_bytes,
+        auditor_bytes,
+        official_filename=official_pdf.filename,
+        auditor_filename=auditor_pdf.filename,
+        patient_name=patient_name,
+        exam_type=exam_type,
+        exam_date=exam_date
     )
-    audit_data["report_pdf_url"] = report_url
+    return StreamingResponse(_sse(events), media_type="text/event-stream", headers=SSE_HEADERS)
 
-    # 9. Salva no banco de dados
-    saved_audit = save_audit(audit_data)
 
-    # 10. Retorna resultado
-    return {
-        "success": True,
-        "audit_id": saved_audit["id"] if saved_audit else None,
-        "classification": analysis.get("classification"),
-        "summary": analysis.get("summary"),
-        "concordant_findings": analysis.get("concordant_findings", []),
-        "discrepancies": analysis.get("discrepancies", []),
-        "has_critical_alert": analysis.get("has_critical_alert", False),
-        "critical_alert_text": analysis.get("critical_alert_text"),
-        "technical_note": analysis.get("technical_note"),
-        "report_url": report_url,
-        "extracted_texts": {
-            "official": official_text[:500] + "..." if len(official_text) > 500 else official_text,
-            "auditor": auditor_text[:500] + "..." if len(auditor_text) > 500 else auditor_text
-        }
-    }
+@router.post("/text/stream")
+async def create_audit_from_text_stream(request: TextAuditRequest):
+    """Versão em streaming (SSE) de POST /api/audits/text (eventos como em /stream)."""
+    events = stream_text_audit(
+        official_text=request.official_text,
+        auditor_text=request.auditor_text,
+        patient_name=request.patient_name,
+        exam_type=request.exam_type,
+        exam_date=request.exam_date
+    )
+    return StreamingResponse(_sse(events), media_type="text/event-stream", headers=SSE_HEADERS)
 
 
-@router.post("/text")
-async def create_audit_from_text(request: TextAuditRequest):
+@router.post("/batch")
+async def create_audit_batch(
+    archive: Optional[UploadFile] = File(default=None, description="ZIP com os pares de laudos"),
+    files: Optional[List[UploadFile]] = File(default=None, description="PDFs referenciados pelo manifest"),
+    manifest: Optional[str] = Form(default=None, description="JSON com a lista de pares")
+):
     """
-    Cria uma nova auditoria a partir de textos já extraídos.
+    Audita vários pares de laudos de uma vez.
 
-    - Recebe 2 textos (oficial e auditor)
-    - Envia para IA comparar
-    - Gera relatório PDF
-    - Salva tudo no Supabase
+    - ZIP: com `manifest.json` ou arquivos `<chave>_oficial.pdf` / `<chave>_auditor.pdf`
+    - Multipart: vários PDFs em `files` + `manifest` (JSON) referenciando-os pelo nome
+    - Resposta em NDJSON: uma linha por par, emitida assim que o par termina
     """
+    try:
+        if archive is not None:
+            pairs = await run_cpu(pairs_from_zip, await archive.read())
+        elif files and manifest:
+            uploaded = {upload.filename: await upload.read() for upload in files}
+            duplicates = duplicate_names([upload.filename for upload in files])
+            try:
+                entries = json.loads(manifest)
+            except json.JSONDecodeError as e:
+                raise BatchError(f"Manifest inválido: {e}")
+            pairs = pairs_from_manifest(entries, uploaded, duplicates)
+        else:
+            raise BatchError("Envie um ZIP em 'archive' ou PDFs em 'files' com um 'manifest'")
+        check_batch_size(pairs)
+    except BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return StreamingResponse(stream_batch(pairs), media_type="application/x-ndjson")
+
+
+@router.post("/jobs", status_code=202)
+async def create_audit_job(
+    official_pdf: UploadFile = File(..., description="PDF do Laudo Oficial"),
+    auditor_pdf: UploadFile = File(..., description="PDF do Laudo Auditor"),
+    patient_name: str = Form(default="Não informado"),
+    exam_type: str = Form(default="Não informado"),
+    exam_date: Optional[str] = Form(default=None),
+    callback_url: Optional[str] = Form(default=None, description="URL notificada (POST) ao final")
+):
+    """
+    Enfileira uma auditoria para processamento em background.
 
-    official_text = request.official_text.strip()
-    auditor_text = request.auditor_text.strip()
-
-    if len(official_text) < 10:
-        raise HTTPException(status_code=400, detail="Texto do Laudo Oficial muito curto")
+    Retorna imediatamente (202) com o ID do job. O progresso por etapa
+    pode ser consultado em GET /api/audits/jobs/{job_id}.
+    """
+    if callback_url:
+        try:
+            await run_io(validate_callback_url, callback_url)
+        except CallbackURLError as e:
+            raise HTTPException(status_code=422, detail=str(e))
 
-    if len(auditor_text) < 10:
-        raise HTTPException(status_code=400, detail="Texto do Laudo Auditor muito curto")
+    official_bytes = await official_pdf.read()
+    auditor_bytes = await auditor_pdf.read()
 
-    # Compara os laudos via Gemini
-    comparison_result = compare_reports(
-        official_text=official_text,
-        auditor_text=auditor_text,
-        patient_name=request.patient_name,
-        exam_type=request.exam_type,
-        exam_date=request.exam_date or "Não informada"
+    job_id = await audit_job_queue.submit(
+        official_bytes,
+        auditor_bytes,
+        params={
+            "official_filename": official_pdf.filename,
+            "auditor_filename": auditor_pdf.filename,
+            "patient_name": patient_name,
+            "exam_type": exam_type,
+            "exam_date": exam_date,
+        },
+        callback_url=callback_url
     )
 
-    if not comparison_result["success"]:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Erro na análise: {comparison_result.get('error', 'Erro desconhecido')}"
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/api/audits/jobs/{job_id}"
+    }
+
+
+@router.get("/jobs/{job_id}")
+async def get_audit_job(job_id: str):
+    """Retorna o status e o progresso por etapa de um job de auditoria."""
+    job = await audit_job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return serialize_job(job)
+
+
+@router.get("")
+async def get_audits(
+    limit: int = Query(default=50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(
+        default=None, description="Colunas separadas por vírgula (padrão: colunas de resumo)"
+    ),
+    offset: int = Query(default=0, ge=0, description="Obsoleto: prefira cursor"),
+    classification: Optional[
+        Literal["CONCORDÂNCIA TOTAL", "CONCORDÂNCIA PARCIAL", "DISCORDÂNCIA"]
+    ] = None,
+    exam_type: Optional[str] = None,
+    has_critical_alert: Optional[bool] = None,
+    date_from: Optional[date] = Query(default=None, description="Criadas a partir de (inclusive)"),
+    date_to: Optional[date] = Query(default=None, description="Criadas até (inclusive)"),
+    patient: Optional[str] = Query(default=None, description="Trecho do nome do paciente"),
+    search: Optional[str] = Query(default=None, description="Busca textual nos laudos e no resumo")
+):
+    """
+    Lista as auditorias, das mais recentes para as mais antigas, com filtros.
+
+    Retorna só as colunas de resumo, a menos que `fields` peça outras.
+    Para a próxima página, envie o `next_cursor` da resposta em `cursor`
+    (com os mesmos filtros).
+    """
+    requested = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    unknown = sorted(set(requested or []) - set(AUDIT_FIELDS))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(unknown)}")
+
+    try:
+        audits, next_cursor = await run_io(
+            list_audits, limit=limit, offset=offset, cursor=cursor, fields=requested,
+            filters={
+                "classification": classification,
+                "exam_type": exam_type,
+                "has_critical_alert": has_critical_alert,
+                "date_from": date_from,
+                "date_to": date_to,
+                "patient": patient,
+                "search": search,
+            }
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"audits": audits, "count": len(audits), "next_cursor": next_cursor}
 
-    analysis = comparison_result["data"]
-
-    # Prepara dados da auditoria
-    audit_data = {
-        "patient_name": request.patient_name,
-        "exam_type": request.exam_type,
-        "exam_date": request.exam_date,
-        "official_pdf_url": None,
-        "auditor_pdf_url": None,
-        "official_text": official_text,
-        "auditor_text": auditor_text,
-        "classification": analysis.get("classification"),
-        "analysis_summary": analysis.get("summary"),
-        "concordant_findings": analysis.get("concordant_findings", []),
-        "discrepancies": analysis.get("discrepancies", []),
-        "has_critical_alert": analysis.get("has_critical_alert", False),
-        "critical_alert_text": analysis.get("critical_alert_text"),
-        "technical_note": analysis.get("technical_note"),
-    }
 
-    # Gera o relatório PDF
-    report_bytes = generate_report_pdf(audit_data)
+Severity = Literal["baixa", "média", "alta", "crítica"]
+
 
-    # Faz upload do relatório
-    report_url = upload_pdf_to_storage(
-        report_bytes,
-        f"relatorio_{request.patient_name.replace(' ', '_')}.pdf",
-        folder="relatorios"
+@router.get("/discrepancies")
+async def get_discrepancies(
+    limit: int = Query(default=50, ge=1, le=200),
+    cursor: Optional[int] = None,
+    severity: Optional[Severity] = None,
+    type: Optional[str] = Query(default=None, description="Tipo da discrepância (ex.: diagnóstica)"),
+    exam_type: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None
+):
+    """
+    Lista discrepâncias de todas as auditorias, das mais recentes para as
+    mais antigas, com o id da auditoria de cada uma.
+    """
+    rows, next_cursor = await run_io(
+        list_discrepancies, limit=limit, cursor=cursor,
+        filters={
+            "severity": severity, "type": type, "exam_type": exam_type,
+            "date_from": date_from, "date_to": date_to,
+        }
     )
-    audit_data["report_pdf_url"] = report_url
+    return {"discrepancies": rows, "count": len(rows), "next_cursor": next_cursor}
 
-    # Salva no banco de dados
-    saved_audit = save_audit(audit_data)
 
-    # Retorna resultado
+@router.get("/discrepancies/summary")
+async def get_discrepancies_summary(
+    severity: Optional[Severity] = None,
+    type: Optional[str] = None,
+    exam_type: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None
+):
+    """
+    Contagem de discrepâncias (e de auditorias com elas) por tipo de exame,
+    tipo e severidade. Ex.: discrepâncias críticas diagnósticas no mês:
+    ?severity=crítica&type=diagnóstica&date_from=2026-01-01&date_to=2026-01-31
+    """
+    groups = await run_io(count_discrepancies, {
+        "severity": severity, "type": type, "exam_type": exam_type,
+        "date_from": date_from, "date_to": date_to,
+    })
+    if groups is None:
+        raise HTTPException(status_code=503, detail="Estatísticas indisponíveis no momento")
     return {
-        "success": True,
-        "audit_id": saved_audit["id"] if saved_audit else None,
-        "classification": analysis.get("classification"),
-        "summary": analysis.get("summary"),
-        "concordant_findings": analysis.get("concordant_findings", []),
-        "discrepancies": analysis.get("discrepancies", []),
-        "has_critical_alert": analysis.get("has_critical_alert", False),
-        "critical_alert_text": analysis.get("critical_alert_text"),
-        "technical_note": analysis.get("technical_note"),
-        "report_url": report_url,
-        "extracted_texts": {
-            "official": official_text[:500] + "..." if len(official_text) > 500 else official_text,
-            "auditor": auditor_text[:500] + "..." if len(auditor_text) > 500 else auditor_text
-        }
+        "groups": groups,
+        "total": sum(group["discrepancies"] for group in groups),
     }
 
 
-@router.get("")
-async def get_audits(limit: int = 50, offset: int = 0):
-    """Lista todas as auditorias."""
-    audits = list_audits(limit=limit, offset=offset)
-    return {"audits": audits, "count": len(audits)}
+@router.get("/stats")
+async def get_audits_stats(days: int = Query(default=30, ge=1, le=365)):
+    """
+    Estatísticas do painel nos últimos `days` dias: totais por classificação,
+    tipo de exame e severidade das discrepâncias, e a série diária.
+    """
+    stats = await run_io(audit_stats.get, days)
+    if stats is None:
+        raise HTTPException(status_code=503, detail="Estatísticas indisponíveis no momento")
+    return stats
 
 
 @router.get("/{audit_id}")
-async def get_audit_detail(audit_id: str):
-    """Retorna detalhes de uma auditoria específica."""
-    audit = get_audit(audit_id)
+async def get_audit_detail(audit_id: str, include_texts: bool = False):
+    """
+    Retorna detalhes de uma auditoria específica.
+
+    Os textos extraídos dos laudos só vêm com `include_texts=true`
+    (ou em GET /{audit_id}/texts).
+    """
+    audit = await run_io(get_audit, audit_id, include_texts)
     if not audit:
         raise HTTPException(status_code=404, detail="Auditoria não encontrada")
     return audit
 
 
+@router.get("/{audit_id}/texts")
+async def get_audit_source_texts(audit_id: str):
+    """Retorna os textos extraídos do Laudo Oficial e do Laudo Auditor."""
+    texts = await run_io(get_audit_texts, audit_id)
+    if texts is None:
+        raise HTTPException(status_code=404, detail="Auditoria não encontrada")
+    return texts
+
+
+def _parse_range(range_header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """
+    Intervalo (início, fim inclusivo) de um header Range de intervalo único.
+    None = sem Range utilizável (responde o arquivo inteiro);
+    levanta 416 se o intervalo estiver fora do arquivo.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start, _, end = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if not start:
+            # bytes=-N: os últimos N bytes
+            length = int(end)
+            if length <= 0:
+                raise ValueError
+            first, last = max(0, size - length), size - 1
+        else:
+            first = int(start)
+            last = min(int(end), size - 1) if end else size - 1
+    except ValueError:
+        return None
+    if first >= size or first > last:
+        raise HTTPException(
+            status_code=416,
+            detail="Intervalo inválido",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return first, last
+
+
 @router.get("/{audit_id}/report")
-async def download_report(audit_id: str):
-    """Regenera e faz download do relatório PDF."""
-    audit = get_audit(audit_id)
+async def download_report(audit_id: str, request: Request):
+    """
+    Faz download do relatório PDF.
+
+    O PDF vem do cache local (gerado na criação da auditoria ou no primeiro
+    download) e só é gerado de novo se os dados da auditoria ou o template
+    mudarem. Suporta ETag/If-None-Match e requisições Range; o ETag é o hash
+    dos bytes servidos, então If-Range nunca mistura versões do arquivo.
+    """
+    audit = await run_io(get_audit, audit_id)
     if not audit:
         raise HTTPException(status_code=404, detail="Auditoria não encontrada")
 
-    # Regenera o PDF
-    report_bytes = generate_report_pdf(audit)
+    digest = report_content_hash(audit)
+    report_bytes = await run_io(report_cache.get, audit_id, digest)
+    if report_bytes is None:
+        report_bytes = await run_cpu(generate_report_pdf, audit)
+        await run_io(report_cache.put, audit_id, digest, report_bytes)
+
+    etag = f'"{hashlib.sha256(report_bytes).hexdigest()[:32]}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f"attachment; filename=relatorio_{audit_id}.pdf"
+    }
 
-    return StreamingResponse(
-        io.BytesIO(report_bytes),
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in if_none_match.split(", ") or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+
+    # If-Range: só atende o intervalo se o cliente tiver a mesma versão
+    range_header = request.headers.get("range")
+    if request.headers.get("if-range", etag) != etag:
+        range_header = None
+    byte_range = _parse_range(range_header, len(report_bytes))
+    if byte_range is None:
+        return Response(report_bytes, media_type="application/pdf", headers=headers)
+
+    first, last = byte_range
+    headers["Content-Range"] = f"bytes {first}-{last}/{len(report_bytes)}"
+    return Response(
+        report_bytes[first:last + 1],
+        status_code=206,
         media_type="application/pdf",
-        headers={
-            "Content-Disposition": f"attachment; filename=relatorio_{audit_id}.pdf"
-        }
+        headers=headers
     )
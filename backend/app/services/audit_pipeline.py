@@ -0,0 +1,581 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Callable, Optional
+
+from app.config import REPORT_DEFERRED, TEXT_PREPARATION_ENABLED
+from app.services.pdf_extractor import (
+    PdfIngestion, apply_ocr_results, get_cached_ingestion, ingest_pdf, ocr_page,
+    pdf_sha256, remove_temp_pdf, store_ingestion, write_temp_pdf
+)
+from app.services.comparator import compare_reports_async, compare_reports_stream
+from app.services.supabase_client import upload_pdf_to_storage, save_audit, update_audit
+from app.services.report_cache import report_cache
+from app.services.report_generator import generate_report_pdf, report_content_hash
+from app.services.text_preparation import prepare_report_text
+from app.services.worker_pools import run_cpu, run_io, run_ocr
+
+
+# Etapas do pipeline de auditoria, na ordem de execução
+PDF_STAGES = ["ingest", "compare", "report", "upload", "save"]
+TEXT_STAGES = ["compare", "report", "upload", "save"]
+
+
+class AuditPipelineError(Exception):
+    """Erro de negócio do pipeline, com o status HTTP correspondente."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class BackgroundReports:
+    """
+    Relatórios gerados depois da resposta (REPORT_DEFERRED): guarda as tasks
+    em andamento para não serem coletadas e permite aguardá-las no desligamento.
+    """
+
+    def __init__(self):
+        self._tasks: set[asyncio.Task] = set()
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+
+    def start(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        self.started += 1
+        task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if task.cancelled():
+            self.failed += 1
+        elif task.exception() is not None:
+            self.failed += 1
+            print(f"Erro inesperado ao gerar relatório em background: {task.exception()}")
+        elif not task.result():
+            self.failed += 1
+        else:
+            self.completed += 1
+
+    async def drain(self, timeout: float = 30) -> None:
+        """Aguarda os relatórios pendentes (no desligamento da aplicação)."""
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._tasks),
+            "started": self.started,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+background_reports = BackgroundReports()
+
+
+def _notify(on_stage: Optional[Callable[[str], None]], stage: str) -> None:
+    if on_stage is not None:
+        on_stage(stage)
+
+
+def _preview(text: str) -> str:
+    return text[:500] + "..." if len(text) > 500 else text
+
+
+async def run_pdf_audit(
+    official_bytes: bytes,
+    auditor_bytes: bytes,
+    official_filename: Optional[str] = None,
+    auditor_filename: Optional[str] = None,
+    patient_name: str = "Não informado",
+    exam_type: str = "Não informado",
+    exam_date: Optional[str] = None,
+    on_stage: Optional[Callable[[str], None]] = None,
+    defer_report: bool = REPORT_DEFERRED
+) -> dict:
+    """
+    Executa a auditoria completa a partir de dois PDFs.
+
+    Args:
+        official_bytes: Conteúdo do Laudo Oficial
+        auditor_bytes: Conteúdo do Laudo Auditor
+        official_filename: Nome original do Laudo Oficial
+        auditor_filename: Nome original do Laudo Auditor
+        patient_name: Nome do paciente
+        exam_type: Tipo do exame
+        exam_date: Data do exame
+        on_stage: Callback chamado no início de cada etapa (ver PDF_STAGES)
+        defer_report: Salva e responde antes de gerar o relatório e enviar os
+            PDFs ao Storage, que seguem em background (report_status "pending")
+
+    Returns:
+        dict com o resultado da auditoria (mesmo formato de POST /api/audits)
+
+    Raises:
+        AuditPipelineError: PDF inválido, texto vazio ou falha na análise
+    """
+    # 1-2. Valida os PDFs e extrai o texto dos dois laudos em paralelo
+    _notify(on_stage, "ingest")
+    official, auditor = await _ingest_pair(official_bytes, auditor_bytes)
+
+    official_text = official.text
+    auditor_text = auditor.text
+
+    # 3. Compara os laudos via Gemini (sem cabeçalhos/rodapés repetidos)
+    _notify(on_stage, "compare")
+    analysis, usage = await _compare(
+        _prompt_text(official_text, official.pages),
+        _prompt_text(auditor_text, auditor.pages),
+        patient_name, exam_type, exam_date
+    )
+
+    # 4. Inicia o upload dos PDFs para o Storage (em paralelo com o relatório)
+    source_uploads = _start_source_uploads(
+        official_bytes, auditor_bytes, official_filename, auditor_filename
+    )
+
+    # 5. Prepara dados da auditoria
+    audit_data = _build_audit_data(
+        analysis, official_text, auditor_text, patient_name, exam_type, exam_date, usage
+    )
+
+    result = await _render_and_save(audit_data, analysis, on_stage, source_uploads, defer_report)
+    result["ingestion"] = {
+        "official": _ingestion_summary(official),
+        "auditor": _ingestion_summary(auditor),
+    }
+    return result
+
+
+async def run_text_audit(
+    official_text: str,
+    auditor_text: str,
+    patient_name: str = "Não informado",
+    exam_type: str = "Não informado",
+    exam_date: Optional[str] = None,
+    on_stage: Optional[Callable[[str], None]] = None,
+    defer_report: bool = REPORT_DEFERRED
+) -> dict:
+    """
+    Executa a auditoria a partir de textos já extraídos (ver run_pdf_audit).
+
+    Raises:
+        AuditPipelineError: textos curtos demais ou falha na análise
+    """
+    official_text, auditor_text = _check_texts(official_text, auditor_text)
+
+    _notify(on_stage, "compare")
+    analysis, usage = await _compare(
+        _prompt_text(official_text), _prompt_text(auditor_text),
+        patient_name, exam_type, exam_date
+    )
+
+    audit_data = _build_audit_data(
+        analysis, official_text, auditor_text, patient_name, exam_type, exam_date, usage
+    )
+
+    return await _render_and_save(audit_data, analysis, on_stage, defer_report=defer_report)
+
+
+async def stream_pdf_audit(
+    official_bytes: bytes,
+    auditor_bytes: bytes,
+    official_filename: Optional[str] = None,
+    auditor_filename: Optional[str] = None,
+    patient_name: str = "Não informado",
+    exam_type: str = "Não informado",
+    exam_date: Optional[str] = None
+) -> AsyncIterator[tuple[str, Any]]:
+    """
+    Versão em streaming de run_pdf_audit. Emite eventos (nome, dado):
+    "stage" no início de cada etapa, "ingestion", as partes da análise
+    assim que o modelo as produz (ver compare_reports_stream) e, ao final,
+    "done" com o mesmo resultado de run_pdf_audit.
+
+    Raises:
+        AuditPipelineError: PDF inválido, texto vazio ou falha na análise
+    """
+    yield "stage", {"stage": "ingest"}
+    official, auditor = await _ingest_pair(official_bytes, auditor_bytes)
+    ingestion = {
+        "official": _ingestion_summary(official),
+        "auditor": _ingestion_summary(auditor),
+    }
+    yield "ingestion", ingestion
+
+    async for event, data in _stream_compare_and_save(
+        official.text, auditor.text, patient_name, exam_type, exam_date,
+        pages=(official.pages, auditor.pages),
+        sources=(official_bytes, auditor_bytes, official_filename, auditor_filename)
+    ):
+        if event == "done":
+            data["ingestion"] = ingestion
+        yield event, data
+
+
+async def stream_text_audit(
+    official_text: str,
+    auditor_text: str,
+    patient_name: str = "Não informado",
+    exam_type: str = "Não informado",
+    exam_date: Optional[str] = None
+) -> AsyncIterator[tuple[str, Any]]:
+    """
+    Versão em streaming de run_text_audit (eventos como em stream_pdf_audit).
+
+    Raises:
+        AuditPipelineError: textos curtos demais ou falha na análise
+    """
+    official_text, auditor_text = _check_texts(official_text, auditor_text)
+
+    async for event in _stream_compare_and_save(
+        official_text, auditor_text, patient_name, exam_type, exam_date
+    ):
+        yield event
+
+
+async def _stream_compare_and_save(
+    official_text: str,
+    auditor_text: str,
+    patient_name: str,
+    exam_type: str,
+    exam_date: Optional[str],
+    pages: tuple = (None, None),
+    sources: Optional[tuple] = None
+) -> AsyncIterator[tuple[str, Any]]:
+    """Compara em streaming e, com a análise completa, gera o relatório e salva."""
+    yield "stage", {"stage": "compare"}
+    analysis = None
+    usage = None
+    try:
+        async for event, data in compare_reports_stream(
+            official_text=_prompt_text(official_text, pages[0]),
+            auditor_text=_prompt_text(auditor_text, pages[1]),
+            patient_name=patient_name,
+            exam_type=exam_type,
+            exam_date=exam_date or "Não informada"
+        ):
+            if event == "analysis":
+                analysis = data
+            elif event == "usage":
+                usage = data
+            else:
+                yield event, data
+    except json.JSONDecodeError as e:
+        raise AuditPipelineError(500, f"Erro na análise: Erro ao parsear resposta da IA: {str(e)}")
+    except Exception as e:
+        raise AuditPipelineError(500, f"Erro na análise: Erro na chamada da API Gemini: {str(e)}")
+
+    source_uploads = _start_source_uploads(*sources) if sources else None
+    audit_data = _build_audit_data(
+        analysis, official_text, auditor_text, patient_name, exam_type, exam_date, usage
+    )
+
+    yield "stage", {"stage": "save" if REPORT_DEFERRED else "report"}
+    result = await _render_and_save(audit_data, analysis, None, source_uploads, REPORT_DEFERRED)
+    yield "done", result
+
+
+async def _render_and_upload(
+    audit_data: dict,
+    on_stage: Optional[Callable[[str], None]],
+    source_uploads: dict[str, asyncio.Task]
+) -> bytes:
+    """Gera o relatório e o envia ao Storage; preenche as URLs em audit_data."""
+    # Gera o relatório PDF
+    _notify(on_stage, "report")
+    report_bytes = await run_cpu(generate_report_pdf, audit_data)
+
+    # Faz upload do relatório, junto com os uploads já em andamento
+    _notify(on_stage, "upload")
+    report_url, *source_urls = await asyncio.gather(
+        run_io(
+            upload_pdf_to_storage,
+            report_bytes,
+            f"relatorio_{audit_data['patient_name'].replace(' ', '_')}.pdf",
+            folder="relatorios"
+        ),
+        *source_uploads.values()
+    )
+    audit_data.update(zip(source_uploads.keys(), source_urls))
+    audit_data["report_pdf_url"] = report_url
+    return report_bytes
+
+
+async def _finish_report(
+    saved_audit: dict,
+    audit_data: dict,
+    source_uploads: dict[str, asyncio.Task]
+) -> bool:
+    """Etapa em background do relatório adiado: gera, envia e atualiza o registro."""
+    audit_id = saved_audit["id"]
+    try:
+        report_bytes = await _render_and_upload(audit_data, None, source_uploads)
+    except Exception as e:
+        print(f"Erro ao gerar o relatório da auditoria {audit_id}: {e}")
+        await run_io(update_audit, audit_id, {"report_status": "failed"})
+        return False
+
+    await run_io(
+        report_cache.put, audit_id, report_content_hash(saved_audit), report_bytes
+    )
+    fields = {field: audit_data.get(field) for field in source_uploads}
+    fields["report_pdf_url"] = audit_data["report_pdf_url"]
+    fields["report_status"] = "ready"
+    return await run_io(update_audit, audit_id, fields) is not None
+
+
+def _start_source_uploads(
+    official_bytes: bytes,
+    auditor_bytes: bytes,
+    official_filename: Optional[str],
+    auditor_filename: Optional[str]
+) -> dict[str, asyncio.Task]:
+    """Inicia em background o upload dos PDFs originais para o Storage."""
+    return {
+        "official_pdf_url": asyncio.create_task(run_io(
+            upload_pdf_to_storage,
+            official_bytes,
+            official_filename or "laudo_oficial.pdf",
+            folder="oficiais"
+        )),
+        "auditor_pdf_url": asyncio.create_task(run_io(
+            upload_pdf_to_storage,
+            auditor_bytes,
+            auditor_filename or "laudo_auditor.pdf",
+            folder="auditores"
+        )),
+    }
+
+
+def _check_texts(official_text: str, auditor_text: str) -> tuple[str, str]:
+    """Valida os textos informados diretamente (sem PDF)."""
+    official_text = official_text.strip()
+    auditor_text = auditor_text.strip()
+
+    if len(official_text) < 10:
+        raise AuditPipelineError(400, "Texto do Laudo Oficial muito curto")
+
+    if len(auditor_text) < 10:
+        raise AuditPipelineError(400, "Texto do Laudo Auditor muito curto")
+
+    return official_text, auditor_text
+
+
+async def ingest(pdf_bytes: bytes) -> PdfIngestion:
+    """
+    Valida e extrai o texto de um PDF no pool de CPU, consultando antes o
+    cache por hash (um PDF já visto não é reprocessado nem passa de novo por OCR).
+    Páginas escaneadas são distribuídas, uma tarefa por página, no pool de OCR;
+    o PDF é gravado uma vez em disco e as tarefas recebem só o caminho.
+    """
+    digest = pdf_sha256(pdf_bytes)
+    ingestion = await run_io(get_cached_ingestion, digest)
+    if ingestion is not None:
+        return ingestion
+
+    ingestion = await run_cpu(ingest_pdf, pdf_bytes, ocr=False)
+
+    if ingestion.valid and ingestion.needs_ocr:
+        started = time.perf_counter()
+        pdf_path = await run_io(write_temp_pdf, pdf_bytes)
+        try:
+            texts = await asyncio.gather(*(
+                run_ocr(ocr_page, pdf_path, number) for number in ingestion.needs_ocr
+            ))
+        finally:
+            await run_io(remove_temp_pdf, pdf_path)
+        apply_ocr_results(
+            ingestion, dict(zip(ingestion.needs_ocr, texts)), time.perf_counter() - started
+        )
+
+    await run_io(store_ingestion, digest, ingestion)
+    return ingestion
+
+
+async def _ingest_pair(
+    official_bytes: bytes,
+    auditor_bytes: bytes
+) -> tuple[PdfIngestion, PdfIngestion]:
+    """
+    Ingere os dois PDFs ao mesmo tempo. Se um lado falhar (PDF inválido ou
+    sem texto), o trabalho ainda pendente do outro lado é cancelado.
+    """
+    tasks = [
+        asyncio.create_task(_checked_ingest(official_bytes, "Laudo Oficial")),
+        asyncio.create_task(_checked_ingest(auditor_bytes, "Laudo Auditor")),
+    ]
+    try:
+        official, auditor = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return official, auditor
+
+
+async def _checked_ingest(pdf_bytes: bytes, label: str) -> PdfIngestion:
+    """Ingere um PDF medindo o tempo total do lado (inclui espera nos pools)."""
+    started = time.perf_counter()
+    ingestion = await ingest(pdf_bytes)
+    _check_ingestion(ingestion, label)
+    ingestion.timings["wall_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return ingestion
+
+
+def _ingestion_summary(ingestion: PdfIngestion) -> dict:
+    return {
+        "page_count": ingestion.page_count,
+        "used_ocr": ingestion.used_ocr,
+        "ocr_pages": ingestion.ocr_pages,
+        "ocr_failed_pages": ingestion.ocr_failed_pages,
+        "cached": ingestion.cached,
+        "timings": ingestion.timings,
+    }
+
+
+def _check_ingestion(ingestion: PdfIngestion, label: str) -> None:
+    """Converte PDF inválido ou sem texto em AuditPipelineError."""
+    if not ingestion.valid:
+        raise AuditPipelineError(400, f"{label} inválido: {ingestion.error}")
+
+    if not ingestion.text:
+        raise AuditPipelineError(
+            400,
+            f"Não foi possível extrair texto do {label}. O PDF pode ser uma imagem escaneada."
+        )
+
+
+def _prompt_text(text: str, pages: Optional[list[str]] = None) -> str:
+    """Texto enviado ao modelo (ver text_preparation); o texto salvo é o original."""
+    if not TEXT_PREPARATION_ENABLED:
+        return text
+    return prepare_report_text(text, pages)
+
+
+async def _compare(
+    official_text: str,
+    auditor_text: str,
+    patient_name: str,
+    exam_type: str,
+    exam_date: Optional[str]
+) -> tuple[dict, dict]:
+    """Envia os textos para comparação e retorna a análise e o uso de tokens."""
+    comparison_result = await compare_reports_async(
+        official_text=official_text,
+        auditor_text=auditor_text,
+        patient_name=patient_name,
+        exam_type=exam_type,
+        exam_date=exam_date or "Não informada"
+    )
+
+    if not comparison_result["success"]:
+        raise AuditPipelineError(
+            500,
+            f"Erro na análise: {comparison_result.get('error', 'Erro desconhecido')}"
+        )
+
+    return comparison_result["data"], comparison_result.get("usage") or {}
+
+
+def _build_audit_data(
+    analysis: dict,
+    official_text: str,
+    auditor_text: str,
+    patient_name: str,
+    exam_type: str,
+    exam_date: Optional[str],
+    usage: Optional[dict] = None,
+    official_pdf_url: Optional[str] = None,
+    auditor_pdf_url: Optional[str] = None
+) -> dict:
+    """Monta o registro da auditoria a partir da análise e do uso de tokens."""
+    usage = usage or {}
+    return {
+        "patient_name": patient_name,
+        "exam_type": exam_type,
+        "exam_date": exam_date,
+        "official_pdf_url": official_pdf_url,
+        "auditor_pdf_url": auditor_pdf_url,
+        "official_text": official_text,
+        "auditor_text": auditor_text,
+        "classification": analysis.get("classification"),
+        "analysis_summary": analysis.get("summary"),
+        "concordant_findings": analysis.get("concordant_findings", []),
+        "discrepancies": analysis.get("discrepancies", []),
+        "has_critical_alert": analysis.get("has_critical_alert", False),
+        "critical_alert_text": analysis.get("critical_alert_text"),
+        "technical_note": analysis.get("technical_note"),
+        "input_tokens": usage.get("input_tokens"),
+        "output_tokens": usage.get("output_tokens"),
+    }
+
+
+async def _render_and_save(
+    audit_data: dict,
+    analysis: dict,
+    on_stage: Optional[Callable[[str], None]],
+    source_uploads: Optional[dict[str, asyncio.Task]] = None,
+    defer_report: bool = False
+) -> dict:
+    """
+    Gera o relatório, faz upload, salva no banco e monta a resposta.
+
+    `source_uploads` mapeia campos de URL (ex.: "official_pdf_url") para
+    uploads já iniciados; eles são aguardados junto com o upload do relatório.
+
+    Com `defer_report`, a auditoria é salva primeiro (report_status "pending")
+    e o relatório/uploads seguem em background, atualizando o registro ao fim.
+    Se não for possível salvar, o relatório é gerado na hora, como sem defer.
+    """
+    source_uploads = source_uploads or {}
+    saved_audit = None
+
+    if defer_report:
+        _notify(on_stage, "save")
+        audit_data["report_status"] = "pending"
+        saved_audit = await run_io(save_audit, audit_data)
+        if saved_audit:
+            background_reports.start(_finish_report(saved_audit, audit_data, source_uploads))
+
+    if not saved_audit:
+        report_bytes = await _render_and_upload(audit_data, on_stage, source_uploads)
+        audit_data["report_status"] = "ready"
+
+        # Salva no banco de dados
+        _notify(on_stage, "save")
+        saved_audit = await run_io(save_audit, audit_data)
+        if saved_audit:
+            # O download do relatório reaproveita o PDF já gerado
+            await run_io(
+                report_cache.put, saved_audit["id"], report_content_hash(saved_audit), report_bytes
+            )
+
+    audit_id = saved_audit["id"] if saved_audit else None
+    return {
+        "success": True,
+        "audit_id": audit_id,
+        "classification": analysis.get("classification"),
+        "summary": analysis.get("summary"),
+        "concordant_findings": analysis.get("concordant_findings", []),
+        "discrepancies": analysis.get("discrepancies", []),
+        "has_critical_alert": analysis.get("has_critical_alert", False),
+        "critical_alert_text": analysis.get("critical_alert_text"),
+        "technical_note": analysis.get("technical_note"),
+        "report_status": audit_data["report_status"],
+        "report_url": audit_data.get("report_pdf_url"),
+        "report_download_url": f"/api/audits/{audit_id}/report" if audit_id else None,
+        "usage": {
+            "input_tokens": audit_data["input_tokens"],
+            "output_tokens": audit_data["output_tokens"]
+        },
+        "extracted_texts": {
+            "official": _preview(audit_data["official_text"]),
+            "auditor": _preview(audit_data["auditor_text"])
+        }
+    }
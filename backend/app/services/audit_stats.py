@@ -0,0 +1,128 @@
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from app.config import AUDIT_STATS_CACHE_TTL, AUDIT_STATS_REFRESH_INTERVAL
+from app.services.cache import LRUCache
+from app.services.supabase_client import list_audit_daily_stats, refresh_audit_daily_stats
+
+
+# Fuso em que a view agrupa as auditorias por dia (migration 005)
+STATS_TIMEZONE = ZoneInfo("America/Sao_Paulo")
+
+# Severidade das discrepâncias -> coluna de audit_daily_stats
+SEVERITY_COLUMNS = {
+    "baixa": "severity_baixa",
+    "média": "severity_media",
+    "alta": "severity_alta",
+    "crítica": "severity_critica",
+}
+
+
+def _add(counts: dict, key: str, value: int) -> None:
+    if value:
+        counts[key] = counts.get(key, 0) + value
+
+
+def summarize_daily_stats(rows: list[dict], since: date) -> dict:
+    """
+    Agrega as linhas de audit_daily_stats (dia x classificação x tipo de
+    exame) nos totais do painel e na série diária.
+    """
+    by_classification: dict[str, int] = {}
+    by_exam_type: dict[str, int] = {}
+    by_severity = {severity: 0 for severity in SEVERITY_COLUMNS}
+    daily: dict[str, dict] = {}
+    total = critical = 0
+
+    for row in rows:
+        audits = row.get("audits") or 0
+        critical_alerts = row.get("critical_alerts") or 0
+        total += audits
+        critical += critical_alerts
+        _add(by_classification, row.get("classification") or "", audits)
+        _add(by_exam_type, row.get("exam_type") or "", audits)
+
+        day = daily.setdefault(row["day"], {
+            "day": row["day"], "total": 0, "critical_alerts": 0,
+            "by_classification": {}, "by_severity": {},
+        })
+        day["total"] += audits
+        day["critical_alerts"] += critical_alerts
+        _add(day["by_classification"], row.get("classification") or "", audits)
+        for severity, column in SEVERITY_COLUMNS.items():
+            _add(by_severity, severity, row.get(column) or 0)
+            _add(day["by_severity"], severity, row.get(column) or 0)
+
+    return {
+        "since": since.isoformat(),
+        "total": total,
+        "critical_alerts": critical,
+        "by_classification": by_classification,
+        "by_exam_type": dict(sorted(by_exam_type.items(), key=lambda item: -item[1])),
+        "by_severity": by_severity,
+        "daily": [daily[day] for day in sorted(daily)],
+    }
+
+
+class AuditStats:
+    """
+    Estatísticas do painel, lidas da view materializada audit_daily_stats.
+
+    O resultado fica em cache por `ttl` segundos e a view é atualizada no
+    banco no máximo a cada `refresh_interval` segundos (na primeira consulta
+    após o intervalo), para não recalcular a agregação a cada acesso.
+    """
+
+    def __init__(self, ttl: float, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._cache = LRUCache(32, ttl=ttl)
+        self._refresh_lock = threading.Lock()
+        self._refreshed_at = 0.0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def _maybe_refresh(self) -> None:
+        with self._refresh_lock:
+            if time.time() - self._refreshed_at < self.refresh_interval:
+                return
+            if refresh_audit_daily_stats():
+                self.refreshes += 1
+            else:
+                self.refresh_failures += 1
+            # Mesmo em falha, espera o intervalo antes de tentar de novo
+            self._refreshed_at = time.time()
+
+    def get(self, days: int) -> Optional[dict]:
+        """Estatísticas dos últimos `days` dias, ou None se o banco falhar (faz I/O)."""
+        summary = self._cache.get(str(days))
+        if summary is not None:
+            return summary
+
+        self._maybe_refresh()
+        since = datetime.now(STATS_TIMEZONE).date() - timedelta(days=days - 1)
+        rows = list_audit_daily_stats(since)
+        if rows is None:
+            return None
+        summary = summarize_daily_stats(rows, since)
+        summary["days"] = days
+        self._cache.set(str(days), summary)
+        return summary
+
+    def invalidate(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return {
+            **self._cache.stats(),
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "seconds_since_refresh": (
+                round(time.time() - self._refreshed_at) if self._refreshed_at else None
+            ),
+        }
+
+
+audit_stats = AuditStats(ttl=AUDIT_STATS_CACHE_TTL, refresh_interval=AUDIT_STATS_REFRESH_INTERVAL)
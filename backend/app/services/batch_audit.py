@@ -0,0 +1,246 @@
+import asyncio
+import io
+import json
+import posixpath
+import zipfile
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from app.config import (
+    BATCH_CONCURRENCY, BATCH_MAX_PAIRS, BATCH_ZIP_MAX_FILE_MB, BATCH_ZIP_MAX_MEMBERS,
+    BATCH_ZIP_MAX_TOTAL_MB
+)
+from app.services.audit_pipeline import AuditPipelineError, run_pdf_audit
+
+
+# Sufixos aceitos para parear arquivos de um ZIP sem manifest
+OFFICIAL_SUFFIXES = ("_oficial", "_official")
+AUDITOR_SUFFIXES = ("_auditor",)
+
+
+@dataclass
+class BatchPair:
+    """Um par de laudos (oficial/auditor) de um lote."""
+    pair_id: str
+    official_filename: str
+    official_bytes: bytes
+    auditor_filename: str
+    auditor_bytes: bytes
+    patient_name: str = "Não informado"
+    exam_type: str = "Não informado"
+    exam_date: Optional[str] = None
+    # Par recusado na montagem do lote (ex.: arquivo repetido): não é auditado
+    error: Optional[str] = None
+
+
+def _error_pair(pair_id: str, error: str) -> BatchPair:
+    return BatchPair(pair_id, "", b"", "", b"", error=error)
+
+
+def duplicate_names(names: list[str]) -> frozenset[str]:
+    """Nomes que aparecem mais de uma vez (o conteúdo de cada um seria ambíguo)."""
+    seen, duplicates = set(), set()
+    for name in names:
+        (duplicates if name in seen else seen).add(name)
+    return frozenset(duplicates)
+
+
+class BatchError(ValueError):
+    """Lote mal formado (manifest inválido, arquivo ausente, etc.)."""
+
+
+def pairs_from_manifest(
+    manifest: list,
+    files: dict[str, bytes],
+    duplicate_files: frozenset[str] = frozenset()
+) -> list[BatchPair]:
+    """
+    Monta os pares a partir de um manifest.
+
+    Cada entrada do manifest é um objeto com "official" e "auditor" (nomes
+    dos arquivos) e, opcionalmente, "id", "patient_name", "exam_type" e
+    "exam_date".
+
+    Entradas com id repetido ou que usam um arquivo enviado mais de uma vez
+    (`duplicate_files`) viram pares com erro, em vez de sobrescrever outros.
+    """
+    if not isinstance(manifest, list):
+        raise BatchError("Manifest deve ser uma lista de pares")
+
+    pairs = []
+    seen_ids = set()
+    for index, entry in enumerate(manifest):
+        if not isinstance(entry, dict) or "official" not in entry or "auditor" not in entry:
+            raise BatchError(f"Entrada {index} do manifest precisa de 'official' e 'auditor'")
+
+        for key in ("official", "auditor"):
+            if entry[key] not in files:
+                raise BatchError(f"Arquivo '{entry[key]}' (entrada {index}) não encontrado no lote")
+
+        pair_id = str(entry.get("id", index))
+        repeated = [entry[key] for key in ("official", "auditor") if entry[key] in duplicate_files]
+        if pair_id in seen_ids:
+            pairs.append(_error_pair(pair_id, f"Id '{pair_id}' repetido no manifest (entrada {index})"))
+            continue
+        seen_ids.add(pair_id)
+        if repeated:
+            pairs.append(_error_pair(
+                pair_id, f"Arquivo '{repeated[0]}' aparece mais de uma vez no lote"
+            ))
+            continue
+
+        pairs.append(BatchPair(
+            pair_id=pair_id,
+            official_filename=entry["official"],
+            official_bytes=files[entry["official"]],
+            auditor_filename=entry["auditor"],
+            auditor_bytes=files[entry["auditor"]],
+            patient_name=entry.get("patient_name") or "Não informado",
+            exam_type=entry.get("exam_type") or "Não informado",
+            exam_date=entry.get("exam_date"),
+        ))
+
+    return pairs
+
+
+def pairs_from_zip(zip_bytes: bytes) -> list[BatchPair]:
+    """
+    Monta os pares a partir de um arquivo ZIP.
+
+    Se o ZIP contiver um `manifest.json`, ele define os pares. Caso contrário,
+    os PDFs são pareados pelo nome: `<chave>_oficial.pdf` + `<chave>_auditor.pdf`.
+    """
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(zip_bytes))
+    except zipfile.BadZipFile:
+        raise BatchError("Arquivo não é um ZIP válido")
+
+    with archive:
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        _check_zip_members(members)
+        try:
+            files = {info.filename: archive.read(info) for info in members}
+        except (zipfile.BadZipFile, NotImplementedError, RuntimeError) as e:
+            raise BatchError(f"Não foi possível descompactar o ZIP: {e}")
+    duplicates = duplicate_names([info.filename for info in members])
+
+    if "manifest.json" in files:
+        if "manifest.json" in duplicates:
+            raise BatchError("O ZIP contém mais de um manifest.json")
+        try:
+            manifest = json.loads(files.pop("manifest.json"))
+        except json.JSONDecodeError as e:
+            raise BatchError(f"manifest.json inválido: {e}")
+        return pairs_from_manifest(manifest, files, duplicates)
+
+    official, auditor = {}, {}
+    for filename in sorted(files):
+        stem = posixpath.splitext(filename)[0]
+        for suffixes, side in ((OFFICIAL_SUFFIXES, official), (AUDITOR_SUFFIXES, auditor)):
+            for suffix in suffixes:
+                if stem.lower().endswith(suffix):
+                    side.setdefault(stem[:-len(suffix)], []).append(filename)
+
+    missing = sorted(set(official) ^ set(auditor))
+    if missing:
+        raise BatchError(f"Pares incompletos no ZIP: {', '.join(missing)}")
+
+    pairs = []
+    for key in sorted(official):
+        # Mais de um arquivo para o mesmo lado (ex.: _oficial e _official): par ambíguo
+        ambiguous = [names for names in (official[key], auditor[key]) if len(names) > 1]
+        if ambiguous:
+            names = ", ".join(ambiguous[0])
+            pairs.append(_error_pair(key, f"Mais de um arquivo para o par '{key}': {names}"))
+            continue
+        entry = {"id": key, "official": official[key][0], "auditor": auditor[key][0]}
+        pairs.extend(pairs_from_manifest([entry], files, duplicates))
+    return pairs
+
+
+def _check_zip_members(members: list[zipfile.ZipInfo]) -> None:
+    """Confere quantidade, tipo e tamanho descompactado dos arquivos antes de ler."""
+    if len(members) > BATCH_ZIP_MAX_MEMBERS:
+        raise BatchError(f"ZIP excede o limite de {BATCH_ZIP_MAX_MEMBERS} arquivos")
+
+    not_pdf = [
+        info.filename for info in members
+        if info.filename != "manifest.json" and posixpath.splitext(info.filename)[1].lower() != ".pdf"
+    ]
+    if not_pdf:
+        raise BatchError(f"O ZIP só pode conter PDFs e manifest.json: {', '.join(not_pdf[:5])}")
+
+    max_file = int(BATCH_ZIP_MAX_FILE_MB * 1024 * 1024)
+    total = 0
+    for info in members:
+        if info.file_size > max_file:
+            raise BatchError(
+                f"Arquivo '{info.filename}' excede o limite de {BATCH_ZIP_MAX_FILE_MB:g} MB"
+            )
+        total += info.file_size
+    if total > BATCH_ZIP_MAX_TOTAL_MB * 1024 * 1024:
+        raise BatchError(f"ZIP descompactado excede o limite de {BATCH_ZIP_MAX_TOTAL_MB:g} MB")
+
+
+def check_batch_size(pairs: list[BatchPair]) -> None:
+    if not pairs:
+        raise BatchError("Lote não contém pares de laudos")
+    if len(pairs) > BATCH_MAX_PAIRS:
+        raise BatchError(f"Lote excede o limite de {BATCH_MAX_PAIRS} pares")
+
+
+async def _run_pair(index: int, pair: BatchPair, semaphore: asyncio.Semaphore) -> dict:
+    if pair.error:
+        return {
+            "index": index, "pair_id": pair.pair_id, "status": "error",
+            "status_code": 400, "error": pair.error
+        }
+    async with semaphore:
+        try:
+            result = await run_pdf_audit(
+                pair.official_bytes,
+                pair.auditor_bytes,
+                official_filename=pair.official_filename,
+                auditor_filename=pair.auditor_filename,
+                patient_name=pair.patient_name,
+                exam_type=pair.exam_type,
+                exam_date=pair.exam_date
+            )
+            return {"index": index, "pair_id": pair.pair_id, "status": "ok", "result": result}
+        except AuditPipelineError as e:
+            return {
+                "index": index, "pair_id": pair.pair_id, "status": "error",
+                "status_code": e.status_code, "error": e.detail
+            }
+        except Exception as e:
+            return {
+                "index": index, "pair_id": pair.pair_id, "status": "error",
+                "status_code": 500, "error": str(e)
+            }
+
+
+async def stream_batch(pairs: list[BatchPair]) -> AsyncIterator[str]:
+    """
+    Processa os pares com concorrência limitada e emite uma linha NDJSON
+    por par, na ordem em que terminam. A última linha traz o resumo do lote.
+    """
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    tasks = [
+        asyncio.create_task(_run_pair(index, pair, semaphore))
+        for index, pair in enumerate(pairs)
+    ]
+
+    succeeded = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            item = await next_done
+            if item["status"] == "ok":
+                succeeded += 1
+            yield json.dumps(item, ensure_ascii=False) + "\n"
+    finally:
+        # Cliente desconectou: cancela os pares que ainda não terminaram
+        for task in tasks:
+            task.cancel()
+
+    summary = {"total": len(pairs), "succeeded": succeeded, "failed": len(pairs) - succeeded}
+    yield json.dumps({"summary": summary}, ensure_ascii=False) + "\n"
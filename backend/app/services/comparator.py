@@ -0,0 +1,108 @@
+from typing import Any, AsyncIterator, Protocol
+
+from app.config import (
+    COMPARATOR_BACKEND, GEMINI_MAX_CONCURRENCY,
+    LOCAL_COMPARATOR_LATENCY, LOCAL_COMPARATOR_JITTER,
+    LOCAL_COMPARATOR_ERROR_RATE, LOCAL_COMPARATOR_SEED
+)
+from app.services.gemini_comparator import gemini_comparator
+from app.services.local_comparator import LocalComparator
+
+
+class ComparatorBackend(Protocol):
+    """
+    Interface dos comparadores de laudos.
+
+    `compare` retorna {"success", "data" | "error", "raw_response", "usage"};
+    `compare_stream` emite as partes da análise e termina com ("usage", dict)
+    e ("analysis", dict).
+    """
+
+    name: str
+
+    async def compare(
+        self,
+        official_text: str,
+        auditor_text: str,
+        patient_name: str = "Não informado",
+        exam_type: str = "Não informado",
+        exam_date: str = "Não informada"
+    ) -> dict: ...
+
+    def compare_stream(
+        self,
+        official_text: str,
+        auditor_text: str,
+        patient_name: str = "Não informado",
+        exam_type: str = "Não informado",
+        exam_date: str = "Não informada"
+    ) -> AsyncIterator[tuple[str, Any]]: ...
+
+    def stats(self) -> dict: ...
+
+
+def _make_comparator(kind: str) -> ComparatorBackend:
+    if kind == "gemini":
+        return gemini_comparator
+    if kind == "local":
+        return LocalComparator(
+            latency=LOCAL_COMPARATOR_LATENCY,
+            jitter=LOCAL_COMPARATOR_JITTER,
+            error_rate=LOCAL_COMPARATOR_ERROR_RATE,
+            seed=LOCAL_COMPARATOR_SEED,
+            max_concurrency=GEMINI_MAX_CONCURRENCY
+        )
+    raise ValueError(f"COMPARATOR_BACKEND inválido: {kind!r} (use 'gemini' ou 'local')")
+
+
+comparator = _make_comparator(COMPARATOR_BACKEND)
+
+
+async def compare_reports_async(
+    official_text: str,
+    auditor_text: str,
+    patient_name: str = "Não informado",
+    exam_type: str = "Não informado",
+    exam_date: str = "Não informada"
+) -> dict:
+    """
+    Compara dois laudos médicos usando o comparador configurado
+    (COMPARATOR_BACKEND: Gemini ou local).
+
+    Args:
+        official_text: Texto do laudo oficial
+        auditor_text: Texto do laudo do auditor
+        patient_name: Nome do paciente
+        exam_type: Tipo do exame
+        exam_date: Data do exame
+
+    Returns:
+        dict com resultado da comparação
+    """
+    return await comparator.compare(
+        official_text, auditor_text, patient_name, exam_type, exam_date
+    )
+
+
+async def compare_reports_stream(
+    official_text: str,
+    auditor_text: str,
+    patient_name: str = "Não informado",
+    exam_type: str = "Não informado",
+    exam_date: str = "Não informada"
+) -> AsyncIterator[tuple[str, Any]]:
+    """
+    Compara dois laudos em streaming, emitindo cada parte da análise assim
+    que ela fica completa: ("classification", str), ("summary", str),
+    ("concordant_finding", str), ("discrepancy", dict), etc.
+    Os dois últimos eventos são ("usage", dict), com os tokens de entrada/saída,
+    e ("analysis", dict) com a análise completa.
+
+    Raises:
+        json.JSONDecodeError: resposta final não é um JSON válido
+        Exception: erro na chamada à API (ou falha injetada no comparador local)
+    """
+    async for event in comparator.compare_stream(
+        official_text, auditor_text, patient_name, exam_type, exam_date
+    ):
+        yield event
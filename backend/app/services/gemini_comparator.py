@@ -1,8 +1,117 @@
+import asyncio
+import copy
 import json
+import os
+import random
+import re
+import threading
+import time
 import google.generativeai as genai
-from typing import Optional
-from app.config import GEMINI_API_KEY
-from app.prompts.comparison import SYSTEM_PROMPT, USER_MESSAGE_TEMPLATE
+from contextlib import asynccontextmanager
+from google.api_core import exceptions as google_exceptions
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+from app.config import (
+    GEMINI_API_KEY, GEMINI_MODEL, DATA_DIR,
+    GEMINI_MAX_CONCURRENCY, GEMINI_RPM, GEMINI_TPM, GEMINI_TIMEOUT, GEMINI_DEADLINE,
+    GEMINI_MAX_RETRIES, GEMINI_BACKOFF_BASE, GEMINI_BACKOFF_MAX, GEMINI_STREAM_CHUNK_TIMEOUT,
+    COMPARISON_CACHE_ENABLED, COMPARISON_CACHE_MEMORY_ENTRIES,
+    COMPARISON_CACHE_DISK_ENTRIES, COMPARISON_CACHE_TTL,
+    REPORT_DIFF_ENABLED, REPORT_DIFF_CONTEXT, REPORT_DIFF_MAX_CHANGED_RATIO,
+    PROMPT_TOKEN_BUDGET, JSON_REPAIR_FOLLOWUPS,
+    GEMINI_LIGHT_MODEL, GEMINI_HEAVY_MODEL, GEMINI_FALLBACK_MODEL,
+    GEMINI_LIGHT_MAX_TOKENS, GEMINI_HEAVY_MIN_TOKENS, GEMINI_HEAVY_EXAM_TYPES,
+    GEMINI_HEDGE_ENABLED, GEMINI_HEDGE_PERCENTILE, GEMINI_HEDGE_MIN_SAMPLES,
+    GEMINI_MODEL_PRICES
+)
+from app.prompts.comparison import (
+    CONTINUE_PROMPT, EXCERPT_NOTE, PROMPT_VERSION, REPAIR_PROMPT_TEMPLATE,
+    SYSTEM_PROMPT, USER_MESSAGE_TEMPLATE
+)
+from app.services.cache import LRUCache, SQLiteCache, TieredCache, content_hash
+from app.services.json_repair import (
+    TRUNCATED_RESPONSE_NOTE, add_technical_note, repair_json, repair_stats, validate_analysis,
+    validate_stream_event
+)
+from app.services.json_stream import AnalysisStreamParser, analysis_events
+from app.services.metrics import get_histogram
+from app.services.prompt_cache import system_prompt_cache
+from app.services.rate_limiter import RateLimiter
+from app.services.report_diff import (
+    ReportDiff, diff_reports, diff_stats, identical_analysis, normalize_segment
+)
+from app.services.text_preparation import estimate_tokens, fit_to_budget
+from app.services.worker_pools import run_io
+
+
+# Configuração de geração
+GENERATION_CONFIG = {
+    "temperature": 0.1,  # Baixa temperatura para respostas consistentes
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 4096,
+}
+
+# Erros transitórios que justificam nova tentativa (429, 5xx, timeout)
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    asyncio.TimeoutError,
+)
+
+
+# Cache de comparações: memória (LRU) + SQLite local
+comparison_cache = TieredCache(
+    LRUCache(COMPARISON_CACHE_MEMORY_ENTRIES, ttl=COMPARISON_CACHE_TTL),
+    SQLiteCache(
+        os.path.join(DATA_DIR, "cache", "comparisons.sqlite3"),
+        COMPARISON_CACHE_DISK_ENTRIES,
+        ttl=COMPARISON_CACHE_TTL
+    )
+)
+
+
+def _normalize_text(text: str) -> str:
+    """Normaliza espaços e quebras de linha para a chave do cache."""
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def comparison_cache_key(
+    official_text: str,
+    auditor_text: str,
+    patient_name: str,
+    exam_type: str,
+    exam_date: str,
+    model: str
+) -> str:
+    """Chave do cache: textos normalizados + dados do exame + versão do prompt + modelo que respondeu."""
+    return content_hash(
+        _normalize_text(official_text),
+        _normalize_text(auditor_text),
+        patient_name,
+        exam_type,
+        exam_date,
+        PROMPT_VERSION,
+        model
+    )
+
+
+def _cached_analysis(key_parts: tuple, models: list[str]) -> Optional[dict]:
+    """
+    Análise em cache de algum modelo da cadeia roteada, o principal primeiro:
+    cada resposta fica guardada sob o modelo que de fato a gerou.
+    """
+    for model in models:
+        cached = comparison_cache.get(comparison_cache_key(*key_parts, model))
+        if cached is not None:
+            return copy.deepcopy(cached)
+    return None
+
+
+def _store_analysis(key_parts: tuple, usage: dict, models: list[str], result: dict) -> None:
+    comparison_cache.set(comparison_cache_key(*key_parts, usage.get("model") or models[0]), result)
 
 
 def configure_gemini():
@@ -12,102 +121,795 @@ def configure_gemini():
     genai.configure(api_key=GEMINI_API_KEY)
 
 
-def compare_reports(
-    official_text: str,
-    auditor_text: str,
-    patient_name: str = "Não informado",
-    exam_type: str = "Não informado",
-    exam_date: str = "Não informada"
-) -> dict:
+def parse_response_text(response_text: str) -> dict:
+    """
+    Converte o texto da resposta do modelo no dict da análise, validando
+    o formato (ver json_repair.validate_analysis).
+
+    Raises:
+        json.JSONDecodeError: se a resposta não for um JSON válido
     """
-    Compara dois laudos médicos usando Gemini API.
+    result, _ = validate_analysis(_load_json(response_text))
+    return result
+
+
+def _strip_fences(response_text: str) -> str:
+    """Remove possíveis marcadores de código markdown."""
+    response_text = response_text.strip()
+
+    if response_text.startswith("```json"):
+        response_text = response_text[7:]
+    if response_text.startswith("```"):
+        response_text = response_text[3:]
+    if response_text.endswith("```"):
+        response_text = response_text[:-3]
+    return response_text.strip()
+
+
+def _load_json(response_text: str) -> dict:
+    """Parse estrito do JSON da resposta (só os marcadores markdown são removidos)."""
+    result = json.loads(_strip_fences(response_text))
+    if not isinstance(result, dict):
+        raise json.JSONDecodeError("A resposta não é um objeto JSON", response_text, 0)
+    return result
+
 
-    Args:
-        official_text: Texto do laudo oficial
-        auditor_text: Texto do laudo do auditor
-        patient_name: Nome do paciente
-        exam_type: Tipo do exame
-        exam_date: Data do exame
+def _message_text(message) -> str:
+    """Texto de uma mensagem simples ou de uma conversa (lista de turnos)."""
+    if isinstance(message, str):
+        return message
+    return "".join(part for turn in message for part in turn["parts"])
 
-    Returns:
-        dict com resultado da comparação
+
+def _no_usage() -> dict:
+    """Uso de tokens de uma comparação que não chamou o modelo."""
+    return {"input_tokens": 0, "output_tokens": 0, "estimated": False}
+
+
+def _diff(official_text: str, auditor_text: str) -> Optional[ReportDiff]:
+    if not REPORT_DIFF_ENABLED:
+        return None
+    return diff_reports(official_text, auditor_text, context=REPORT_DIFF_CONTEXT)
+
+
+def _short_circuit(diff: Optional[ReportDiff], official_text: str, auditor_text: str) -> Optional[dict]:
+    """
+    Análise sem LLM quando os laudos são iguais após a normalização (que mantém
+    comparadores, sinais, % e unidades); qualquer diferença vai para o modelo.
     """
-    configure_gemini()
-
-    # Monta a mensagem do usuário
-    user_message = USER_MESSAGE_TEMPLATE.format(
-        patient_name=patient_name,
-        exam_type=exam_type,
-        exam_date=exam_date,
-        official_text=official_text,
-        auditor_text=auditor_text
+    if diff is None or not diff.identical:
+        return None
+    diff_stats.record(
+        short_circuited=True,
+        tokens_saved=estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(official_text + auditor_text)
     )
+    return identical_analysis(diff)
 
-    # Configura o modelo
-    model = genai.GenerativeModel(
-        model_name="gemini-2.0-flash",
-        system_instruction=SYSTEM_PROMPT
-    )
 
-    # Configuração de geração
-    generation_config = {
-        "temperature": 0.1,  # Baixa temperatura para respostas consistentes
-        "top_p": 0.95,
-        "top_k": 40,
-        "max_output_tokens": 4096,
-    }
+def _excerpted(diff: Optional[ReportDiff]) -> bool:
+    """Se o modelo recebe só os trechos divergentes no lugar dos laudos completos."""
+    return diff is not None and diff.changed_ratio <= REPORT_DIFF_MAX_CHANGED_RATIO
+
+
+def _merge_shared_findings(diff: Optional[ReportDiff], result: dict) -> list[str]:
+    """
+    No modo de trechos o modelo não vê o que os laudos têm em comum: esses
+    trechos entram nos achados concordantes. Retorna os que foram acrescentados.
+    """
+    if not _excerpted(diff):
+        return []
+    findings = result.setdefault("concordant_findings", [])
+    known = {normalize_segment(finding) for finding in findings}
+    added = []
+    for finding in diff.shared_findings:
+        if normalize_segment(finding) not in known:
+            known.add(normalize_segment(finding))
+            added.append(finding)
+    findings.extend(added)
+    return added
+
+
+class ModelRouter:
+    """
+    Escolhe o modelo de cada chamada pelo tamanho estimado da mensagem e pelo
+    tipo de exame: laudos longos ou de exames complexos (TC, RM...) vão para o
+    modelo pesado, laudos curtos para o modelo leve e os demais para o padrão.
+    Retorna a cadeia de modelos a tentar: o escolhido e um alternativo.
+    """
+
+    def __init__(
+        self,
+        default_model: str,
+        light_model: str = "",
+        heavy_model: str = "",
+        fallback_model: str = "",
+        light_max_tokens: int = 2000,
+        heavy_min_tokens: int = 8000,
+        heavy_exam_types: tuple = ()
+    ):
+        self.default_model = default_model
+        self.light_model = light_model
+        self.heavy_model = heavy_model
+        self.fallback_model = fallback_model
+        self.light_max_tokens = light_max_tokens
+        self.heavy_min_tokens = heavy_min_tokens
+        self.heavy_exam_types = {normalize_segment(t) for t in heavy_exam_types}
+
+    def _is_heavy_exam(self, exam_type: str) -> bool:
+        words = set(normalize_segment(exam_type or "").split())
+        return bool(words & self.heavy_exam_types)
+
+    def route(self, estimated_tokens: int, exam_type: str = "") -> list[str]:
+        model = self.default_model
+        if self.heavy_model and (
+            estimated_tokens >= self.heavy_min_tokens or self._is_heavy_exam(exam_type)
+        ):
+            model = self.heavy_model
+        elif self.light_model and estimated_tokens <= self.light_max_tokens:
+            model = self.light_model
+
+        fallback = self.fallback_model or self.default_model
+        return [model] if fallback == model else [model, fallback]
+
+
+class GeminiComparator:
+    """
+    Serviço de longa duração para chamadas ao Gemini.
+
+    - Reutiliza o mesmo handle do modelo entre requisições
+    - Usa o system prompt em cache no provedor (context caching), se disponível
+    - Limita requisições/minuto e tokens/minuto (token bucket)
+    - Limita chamadas simultâneas; quem excede espera na fila (back-pressure)
+    - Refaz chamadas com erro transitório com backoff exponencial + jitter
+    - Aplica timeout por tentativa e um prazo total por comparação
+    - Escolhe o modelo por tamanho/tipo de exame (ModelRouter), dispara uma
+      requisição "hedged" quando a chamada passa do percentil de latência do
+      modelo e recorre ao modelo alternativo em caso de erro
+    - Contabiliza tokens, custo e latência por modelo
+    """
+
+    name = "gemini"
+
+    def __init__(
+        self,
+        model_name: str,
+        max_concurrency: int,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        timeout: float,
+        deadline: float,
+        max_retries: int,
+        router: Optional[ModelRouter] = None
+    ):
+        self.model_name = model_name
+        self.router = router or ModelRouter(model_name)
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self._models: dict[str, Any] = {}
+        self._model_lock = threading.Lock()
+        self._model_stats: dict[str, dict] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.retries = 0
+        self.hedged = 0
+        self.fallbacks = 0
+        self.truncated = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_input_tokens = 0
+
+    def _get_plain_model(self, model_name: str):
+        """Cria o handle do modelo (com o system prompt na requisição) uma única vez."""
+        if model_name not in self._models:
+            with self._model_lock:
+                if model_name not in self._models:
+                    configure_gemini()
+                    self._models[model_name] = genai.GenerativeModel(
+                        model_name=model_name,
+                        system_instruction=SYSTEM_PROMPT
+                    )
+        return self._models[model_name]
+
+    async def _get_model(self, model_name: str) -> tuple[Any, bool]:
+        """
+        Modelo para a próxima chamada: o ligado ao system prompt em cache no
+        provedor, se disponível, ou o modelo comum. Retorna (modelo, em_cache).
+        """
+        if system_prompt_cache.enabled:
+            if not system_prompt_cache.is_fresh(model_name):
+                await run_io(self._ensure_prompt_cache, model_name)
+            model = system_prompt_cache.model(model_name)
+            if model is not None:
+                return model, True
+        return self._get_plain_model(model_name), False
 
-    try:
-        response = model.generate_content(
+    def _ensure_prompt_cache(self, model_name: str) -> None:
+        configure_gemini()
+        system_prompt_cache.ensure(model_name)
+
+    def _stats_for(self, model_name: str) -> dict:
+        if model_name not in self._model_stats:
+            self._model_stats[model_name] = {
+                "calls": 0, "errors": 0, "hedged": 0, "hedge_wins": 0,
+                "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0,
+            }
+        return self._model_stats[model_name]
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # O semáforo pertence ao event loop em que foi criado
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    @asynccontextmanager
+    async def _slot(self, reserved_tokens: int):
+        """Aguarda cota (rate limit) e uma vaga de concorrência para uma chamada."""
+        self.waiting += 1
+        try:
+            await self.limiter.acquire(reserved_tokens)
+            semaphore = self._get_semaphore()
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            semaphore.release()
+
+    async def _call_with_retries(self, call: Callable[[], Awaitable], reserved_tokens: int, metric: str):
+        """
+        Executa `call()` com timeout por tentativa, refazendo erros transitórios
+        com backoff exponencial + jitter enquanto couber no prazo total.
+
+        Só tentativas bem-sucedidas entram no histograma `metric`: erros e
+        chamadas canceladas (hedge perdedor) distorceriam o percentil do hedge.
+        """
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt_started = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(call(), timeout=self.timeout)
+                get_histogram(metric).observe((time.perf_counter() - attempt_started) * 1000)
+                return response
+            except RETRYABLE_ERRORS:
+                # Backoff exponencial com "full jitter"
+                backoff = min(GEMINI_BACKOFF_MAX, GEMINI_BACKOFF_BASE * 2 ** attempt)
+                delay = random.uniform(0, backoff)
+                elapsed = time.monotonic() - started
+                if attempt >= self.max_retries or elapsed + delay + self.timeout > self.deadline:
+                    raise
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(delay)
+                # Cada nova tentativa também conta na cota
+                await self.limiter.acquire(reserved_tokens)
+
+    async def _send(self, user_message, reserved_tokens: int, models: list[str], kind: str = "generate"):
+        """
+        Envia a mensagem ao primeiro modelo da cadeia; se ele falhar (após os
+        retries), tenta o próximo. Retorna (resposta, modelo usado).
+
+        `kind`: "generate" (comparação completa, a única "hedged"), "repair"
+        (continuação/reparo de JSON) ou "stream_open" (abertura do streaming).
+        Cada tipo tem seu próprio histograma de latência.
+        """
+        for index, model_name in enumerate(models):
+            try:
+                if kind == "generate":
+                    response = await self._hedged_call(model_name, user_message, reserved_tokens)
+                else:
+                    # No streaming só a abertura seria "hedged"; reparos são curtos
+                    # e não seguem o percentil das comparações completas
+                    response = await self._call_model(model_name, user_message, reserved_tokens, kind)
+                return response, model_name
+            except Exception as e:
+                self._stats_for(model_name)["errors"] += 1
+                if index == len(models) - 1:
+                    raise
+                self.fallbacks += 1
+                print(f"Falha no modelo {model_name}, usando {models[index + 1]}: {str(e) or type(e).__name__}")
+
+    async def _call_model(self, model_name: str, user_message, reserved_tokens: int, kind: str = "generate"):
+        """
+        Chama um modelo (com retries). Se o conteúdo em cache tiver sumido do
+        provedor, descarta o cache e repete a chamada com o modelo comum.
+        """
+        self._stats_for(model_name)["calls"] += 1
+        model, cached = await self._get_model(model_name)
+        metric = f"gemini.{kind}.{model_name}"
+        call = lambda: model.generate_content_async(
             user_message,
-            generation_config=generation_config
+            generation_config=GENERATION_CONFIG,
+            stream=kind == "stream_open",
+            request_options={"timeout": self.timeout}
         )
+        try:
+            return await self._call_with_retries(call, reserved_tokens, metric)
+        except (google_exceptions.NotFound, google_exceptions.PermissionDenied):
+            if not cached:
+                raise
+            system_prompt_cache.invalidate(model_name)
+            model = self._get_plain_model(model_name)
+            return await self._call_with_retries(call, reserved_tokens, metric)
 
-        # Extrai o texto da resposta
-        response_text = response.text.strip()
+    def _hedge_delay(self, model_name: str) -> Optional[float]:
+        """Segundos até disparar a requisição hedged (percentil de latência do modelo)."""
+        if not GEMINI_HEDGE_ENABLED:
+            return None
+        histogram = get_histogram(f"gemini.generate.{model_name}")
+        if histogram.count < GEMINI_HEDGE_MIN_SAMPLES:
+            return None
+        threshold_ms = histogram.percentile(GEMINI_HEDGE_PERCENTILE)
+        return threshold_ms / 1000 if threshold_ms else None
 
-        # Remove possíveis marcadores de código markdown
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.startswith("```"):
-            response_text = response_text[3:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
+    async def _hedged_call(self, model_name: str, user_message, reserved_tokens: int):
+        """
+        Chama o modelo; se a resposta não chegar dentro do percentil de latência,
+        dispara uma segunda chamada igual e fica com a primeira que responder.
+        """
+        delay = self._hedge_delay(model_name)
+        if delay is None:
+            return await self._call_model(model_name, user_message, reserved_tokens)
 
-        # Parse do JSON
-        result = json.loads(response_text.strip())
+        stats = self._stats_for(model_name)
+        tasks = [asyncio.create_task(self._call_model(model_name, user_message, reserved_tokens))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.hedged += 1
+                stats["hedged"] += 1
+                tasks.append(asyncio.create_task(self._hedge(model_name, user_message, reserved_tokens)))
 
-        # Valida campos obrigatórios
-        required_fields = ["classification", "summary", "concordant_findings", "discrepancies"]
-        for field in required_fields:
-            if field not in result:
-                result[field] = [] if field in ["concordant_findings", "discrepancies"] else ""
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
 
-        # Garante valores padrão para campos opcionais
-        result.setdefault("has_critical_alert", False)
-        result.setdefault("critical_alert_text", None)
-        result.setdefault("technical_note", None)
+    async def _hedge(self, model_name: str, user_message, reserved_tokens: int):
+        # A chamada extra ocupa sua própria vaga e reserva de tokens
+        async with self._slot(reserved_tokens):
+            return await self._call_model(model_name, user_message, reserved_tokens)
 
-        return {
-            "success": True,
-            "data": result,
-            "raw_response": response_text
-        }
+    def _record_usage(
+        self,
+        response,
+        reserved_tokens: int,
+        text: str,
+        usage: Optional[dict],
+        model_name: str
+    ) -> None:
+        """
+        Desconta da cota os tokens além da reserva e contabiliza os tokens de
+        entrada/saída (do usage_metadata ou, na falta dele, estimados) e o custo.
+        """
+        metadata = getattr(response, "usage_metadata", None)
+        if metadata is not None:
+            self.limiter.debit(getattr(metadata, "total_token_count", 0) - reserved_tokens)
 
-    except json.JSONDecodeError as e:
-        return {
-            "success": False,
-            "error": f"Erro ao parsear resposta da IA: {str(e)}",
-            "raw_response": response_text if 'response_text' in locals() else None
+        input_tokens = getattr(metadata, "prompt_token_count", 0) or 0
+        output_tokens = getattr(metadata, "candidates_token_count", 0) or 0
+        # Parte da entrada servida pelo system prompt em cache (cobrada com desconto)
+        self.cached_input_tokens += getattr(metadata, "cached_content_token_count", 0) or 0
+        estimated = not input_tokens
+        if estimated:
+            input_tokens, output_tokens = reserved_tokens, estimate_tokens(text)
+
+        input_price, output_price = GEMINI_MODEL_PRICES.get(model_name, (0.0, 0.0))
+        cost = (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        stats = self._stats_for(model_name)
+        stats["input_tokens"] += input_tokens
+        stats["output_tokens"] += output_tokens
+        stats["cost_usd"] += cost
+        if usage is not None:
+            usage["input_tokens"] = usage.get("input_tokens", 0) + input_tokens
+            usage["output_tokens"] = usage.get("output_tokens", 0) + output_tokens
+            usage["estimated"] = usage.get("estimated", False) or estimated
+            usage["cost_usd"] = round(usage.get("cost_usd", 0.0) + cost, 6)
+            usage["model"] = model_name
+
+    def _build_user_message(
+        self,
+        diff: Optional[ReportDiff],
+        official_text: str,
+        auditor_text: str,
+        patient_name: str,
+        exam_type: str,
+        exam_date: str
+    ) -> tuple[str, dict]:
+        """
+        Monta a mensagem do usuário. Se o diff indicar poucas divergências, envia
+        só os trechos divergentes (com contexto) no lugar dos laudos completos.
+        Os laudos são cortados por seção para caber em PROMPT_TOKEN_BUDGET.
+
+        Retorna (mensagem, economia); a economia só entra nas estatísticas via
+        _record_savings, quando a mensagem de fato vai para o modelo.
+        """
+        excerpted = _excerpted(diff)
+        full_tokens = estimate_tokens(official_text + auditor_text)
+        note = ""
+        if excerpted:
+            official_text, auditor_text = diff.official_excerpt, diff.auditor_excerpt
+            note = EXCERPT_NOTE.format(shared_segments=diff.shared_segments)
+
+        savings = {
+            "diff": diff is not None,
+            "excerpted": excerpted,
+            "tokens_saved": full_tokens - estimate_tokens(official_text + auditor_text + note),
+            "truncated": 0,
         }
-    except Exception as e:
+
+        # Orçamento dos laudos: o que sobra do system prompt e do template.
+        # Cada laudo tem direito à metade; o que um não usa fica para o outro.
+        available = max(
+            512,
+            PROMPT_TOKEN_BUDGET - estimate_tokens(SYSTEM_PROMPT + USER_MESSAGE_TEMPLATE + note)
+        )
+        official_tokens, auditor_tokens = estimate_tokens(official_text), estimate_tokens(auditor_text)
+        if official_tokens + auditor_tokens > available:
+            half = available // 2
+            official_text, official_cut = fit_to_budget(official_text, available - min(auditor_tokens, half))
+            auditor_text, auditor_cut = fit_to_budget(auditor_text, available - min(official_tokens, half))
+            savings["truncated"] = official_cut + auditor_cut
+
+        user_message = note + USER_MESSAGE_TEMPLATE.format(
+            patient_name=patient_name,
+            exam_type=exam_type,
+            exam_date=exam_date,
+            official_text=official_text,
+            auditor_text=auditor_text
+        )
+        return user_message, savings
+
+    def _record_savings(self, savings: dict) -> None:
+        if savings["diff"]:
+            diff_stats.record(excerpted=savings["excerpted"], tokens_saved=savings["tokens_saved"])
+        self.truncated += savings["truncated"]
+
+    async def generate(
+        self,
+        user_message,
+        usage: Optional[dict] = None,
+        models: Optional[list[str]] = None,
+        kind: str = "generate"
+    ) -> str:
+        """
+        Envia a mensagem (texto ou lista de turnos) ao modelo e retorna o texto
+        da resposta. Se `usage` for informado, os tokens de entrada/saída e o
+        custo da chamada são somados a ele.
+
+        Args:
+            models: Cadeia de modelos a tentar (padrão: escolha do router pelo tamanho)
+            kind: "generate" (comparação) ou "repair" (continuação/reparo de JSON)
+
+        Raises:
+            Exception: erro não transitório, ou transitório após esgotar as tentativas
+        """
+        message_tokens = estimate_tokens(_message_text(user_message))
+        reserved = estimate_tokens(SYSTEM_PROMPT) + message_tokens
+        models = models or self.router.route(message_tokens)
+
+        async with self._slot(reserved):
+            response, model_name = await self._send(user_message, reserved, models, kind)
+
+        self._record_usage(response, reserved, response.text, usage, model_name)
+        return response.text
+
+    async def generate_stream(
+        self,
+        user_message: str,
+        usage: Optional[dict] = None,
+        models: Optional[list[str]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Envia a mensagem ao modelo em modo streaming, produzindo o texto em pedaços.
+        Só a abertura do stream é refeita em caso de erro transitório. Cada
+        pedaço tem GEMINI_STREAM_CHUNK_TIMEOUT segundos para chegar e o stream
+        inteiro, o prazo total da comparação.
+        `usage` (opcional) é preenchido ao fim do stream, como em generate.
+
+        Raises:
+            asyncio.TimeoutError: o modelo parou de enviar ou passou do prazo
+        """
+        message_tokens = estimate_tokens(user_message)
+        reserved = estimate_tokens(SYSTEM_PROMPT) + message_tokens
+        models = models or self.router.route(message_tokens)
+
+        async with self._slot(reserved):
+            response, model_name = await self._send(user_message, reserved, models, "stream_open")
+            received = []
+            chunks = response.__aiter__()
+            started = time.monotonic()
+            while True:
+                remaining = self.deadline - (time.monotonic() - started)
+                if remaining <= 0:
+                    raise asyncio.TimeoutError("Prazo total do streaming esgotado")
+                try:
+                    chunk = await asyncio.wait_for(
+                        chunks.__anext__(), timeout=min(GEMINI_STREAM_CHUNK_TIMEOUT, remaining)
+                    )
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise asyncio.TimeoutError("O modelo parou de enviar a resposta") from None
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Pedaço sem texto (ex.: só metadados)
+                    continue
+                if text:
+                    received.append(text)
+                    yield text
+
+        self._record_usage(response, reserved, "".join(received), usage, model_name)
+
+    async def compare(
+        self,
+        official_text: str,
+        auditor_text: str,
+        patient_name: str = "Não informado",
+        exam_type: str = "Não informado",
+        exam_date: str = "Não informada"
+    ) -> dict:
+        """Compara dois laudos (ver compare_reports_async)."""
+        diff = _diff(official_text, auditor_text)
+        analysis = _short_circuit(diff, official_text, auditor_text)
+        if analysis is not None:
+            return {
+                "success": True,
+                "data": analysis,
+                "raw_response": None,
+                "usage": _no_usage(),
+                "short_circuit": True
+            }
+
+        # Monta a mensagem do usuário
+        user_message, savings = self._build_user_message(
+            diff, official_text, auditor_text, patient_name, exam_type, exam_date
+        )
+        models = self.router.route(estimate_tokens(user_message), exam_type)
+
+        key_parts = (official_text, auditor_text, patient_name, exam_type, exam_date)
+        if COMPARISON_CACHE_ENABLED:
+            cached = await run_io(_cached_analysis, key_parts, models)
+            if cached is not None:
+                return {
+                    "success": True,
+                    "data": cached,
+                    "raw_response": None,
+                    "usage": _no_usage(),
+                    "cached": True
+                }
+
+        self._record_savings(savings)
+        try:
+            usage = _no_usage()
+            response_text = await self.generate(user_message, usage, models)
+            result = await self._parse_or_repair(user_message, response_text, usage)
+            _merge_shared_findings(diff, result)
+
+            if COMPARISON_CACHE_ENABLED and not usage.get("truncated_response"):
+                await run_io(_store_analysis, key_parts, usage, models, result)
+
+            return {
+                "success": True,
+                "data": result,
+                "raw_response": response_text,
+                "usage": usage,
+                "truncated": bool(usage.get("truncated_response"))
+            }
+
+        except json.JSONDecodeError as e:
+            return {
+                "success": False,
+                "error": f"Erro ao parsear resposta da IA: {str(e)}",
+                "raw_response": response_text if 'response_text' in locals() else None
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Erro na chamada da API Gemini: {str(e) or type(e).__name__}",
+                "raw_response": None
+            }
+
+    async def compare_stream(
+        self,
+        official_text: str,
+        auditor_text: str,
+        patient_name: str = "Não informado",
+        exam_type: str = "Não informado",
+        exam_date: str = "Não informada"
+    ) -> AsyncIterator[tuple[str, Any]]:
+        """Compara dois laudos em streaming (ver compare_reports_stream)."""
+        diff = _diff(official_text, auditor_text)
+        analysis = _short_circuit(diff, official_text, auditor_text)
+        if analysis is not None:
+            for event in analysis_events(analysis):
+                yield event
+            yield "usage", _no_usage()
+            yield "analysis", analysis
+            return
+
+        user_message, savings = self._build_user_message(
+            diff, official_text, auditor_text, patient_name, exam_type, exam_date
+        )
+        models = self.router.route(estimate_tokens(user_message), exam_type)
+
+        key_parts = (official_text, auditor_text, patient_name, exam_type, exam_date)
+        if COMPARISON_CACHE_ENABLED:
+            cached = await run_io(_cached_analysis, key_parts, models)
+            if cached is not None:
+                for event in analysis_events(cached):
+                    yield event
+                yield "usage", _no_usage()
+                yield "analysis", cached
+                return
+
+        self._record_savings(savings)
+        parser = AnalysisStreamParser()
+        usage = _no_usage()
+        async for text in self.generate_stream(user_message, usage, models):
+            for event in parser.feed(text):
+                event = validate_stream_event(*event)
+                if event is not None:
+                    yield event
+
+        result = await self._parse_or_repair(user_message, parser.buffer, usage)
+        for finding in _merge_shared_findings(diff, result):
+            yield "concordant_finding", finding
+        if COMPARISON_CACHE_ENABLED and not usage.get("truncated_response"):
+            await run_io(_store_analysis, key_parts, usage, models, result)
+        yield "usage", usage
+        yield "analysis", result
+
+    async def _parse_or_repair(self, user_message: str, response_text: str, usage: dict) -> dict:
+        """
+        Converte a resposta na análise. Se o JSON for inválido, tenta nesta
+        ordem: pedir a continuação de uma resposta truncada, o reparo local
+        (prosa extra, vírgulas sobrando, listas não fechadas) e pedir ao modelo
+        só a correção do JSON, com no máximo JSON_REPAIR_FOLLOWUPS chamadas extras.
+
+        Raises:
+            json.JSONDecodeError: se nada disso recuperar um objeto JSON
+        """
+        try:
+            result, outcome = _load_json(response_text), "valid"
+        except json.JSONDecodeError as error:
+            result, outcome = await self._repair(user_message, response_text, usage)
+            if result is None:
+                repair_stats.record("failed")
+                raise error
+
+        result, fixes = validate_analysis(result)
+        if outcome == "truncated":
+            add_technical_note(result, TRUNCATED_RESPONSE_NOTE)
+            usage["truncated_response"] = True
+        repair_stats.record(outcome, fixes)
+        return result
+
+    async def _repair(self, user_message: str, response_text: str, usage: dict) -> tuple[Optional[dict], str]:
+        followups = JSON_REPAIR_FOLLOWUPS
+        # Continuação e reparo vão para o mesmo modelo que respondeu
+        models = [usage["model"]] if usage.get("model") else None
+        result, truncated = repair_json(response_text)
+
+        # Resposta truncada: pede só o restante, em vez de refazer a comparação
+        continued = False
+        while truncated and followups > 0:
+            followups -= 1
+            try:
+                continuation = await self.generate([
+                    {"role": "user", "parts": [user_message]},
+                    {"role": "model", "parts": [response_text]},
+                    {"role": "user", "parts": [CONTINUE_PROMPT]},
+                ], usage, models, kind="repair")
+            except Exception as e:
+                print(f"Erro ao pedir a continuação da resposta: {e}")
+                break
+            response_text += _strip_fences(continuation)
+            continued = True
+            result, truncated = repair_json(response_text)
+
+        if result is not None:
+            if truncated:
+                # Continuações esgotadas: o JSON foi fechado localmente, mas falta conteúdo
+                return result, "truncated"
+            return result, "continued" if continued else "repaired_locally"
+
+        # JSON malformado: pede só a correção da sintaxe (sem reenviar os laudos)
+        if followups > 0:
+            try:
+                repaired = await self.generate(
+                    REPAIR_PROMPT_TEMPLATE.format(response_text=response_text), usage, models,
+                    kind="repair"
+                )
+            except Exception as e:
+                print(f"Erro ao pedir o reparo do JSON: {e}")
+                return None, "failed"
+            result, _ = repair_json(repaired)
+            if result is not None:
+                return result, "repaired_by_model"
+
+        return None, "failed"
+
+    def stats(self) -> dict:
         return {
-            "success": False,
-            "error": f"Erro na chamada da API Gemini: {str(e)}",
-            "raw_response": None
+            "backend": self.name,
+            "model": self.model_name,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "retries": self.retries,
+            "router": {
+                "default": self.router.default_model,
+                "light": self.router.light_model or None,
+                "heavy": self.router.heavy_model or None,
+                "fallback": self.router.fallback_model or None,
+            },
+            "hedged": self.hedged,
+            "fallbacks": self.fallbacks,
+            "truncated_reports": self.truncated,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cached_input_tokens": self.cached_input_tokens,
+            "prompt_cache": system_prompt_cache.stats(),
+            "models": {
+                name: {
+                    **stats,
+                    "cost_usd": round(stats["cost_usd"], 4),
+                    "p50_ms": get_histogram(f"gemini.generate.{name}").percentile(0.5),
+                    "p95_ms": get_histogram(f"gemini.generate.{name}").percentile(0.95),
+                }
+                for name, stats in sorted(self._model_stats.items())
+            },
+            "rate_limiter": self.limiter.stats(),
         }
 
 
+gemini_comparator = GeminiComparator(
+    model_name=GEMINI_MODEL,
+    max_concurrency=GEMINI_MAX_CONCURRENCY,
+    requests_per_minute=GEMINI_RPM,
+    tokens_per_minute=GEMINI_TPM,
+    timeout=GEMINI_TIMEOUT,
+    deadline=GEMINI_DEADLINE,
+    max_retries=GEMINI_MAX_RETRIES,
+    router=ModelRouter(
+        default_model=GEMINI_MODEL,
+        light_model=GEMINI_LIGHT_MODEL,
+        heavy_model=GEMINI_HEAVY_MODEL,
+        fallback_model=GEMINI_FALLBACK_MODEL,
+        light_max_tokens=GEMINI_LIGHT_MAX_TOKENS,
+        heavy_min_tokens=GEMINI_HEAVY_MIN_TOKENS,
+        heavy_exam_types=tuple(GEMINI_HEAVY_EXAM_TYPES)
+    )
+)
+
+
 def get_classification_color(classification: str) -> str:
     """Retorna a cor hexadecimal baseada na classificação."""
     colors = {
@@ -0,0 +1,368 @@
+import asyncio
+import copy
+import ipaddress
+import json
+import shutil
+import socket
+import sqlite3
+import threading
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from pathlib import Path
+from typing import Optional
+
+from app.config import (
+    JOBS_DIR, JOB_WORKERS, JOB_CALLBACK_TIMEOUT, JOB_RETENTION, JOB_PURGE_INTERVAL
+)
+from app.services.audit_pipeline import AuditPipelineError, PDF_STAGES, run_pdf_audit
+from app.services.worker_pools import run_io
+
+
+class CallbackURLError(Exception):
+    """callback_url recusado (esquema não HTTP ou destino em rede interna)."""
+
+
+def validate_callback_url(url: str) -> None:
+    """
+    Aceita só http/https para hosts públicos: endereços privados, loopback,
+    link-local, reservados e multicast são recusados (evita SSRF e file://).
+    Resolve o DNS, portanto é bloqueante: chame fora do event loop.
+    """
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise CallbackURLError("callback_url deve ser uma URL http(s)")
+    try:
+        infos = socket.getaddrinfo(parsed.hostname, parsed.port or None, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError, ValueError) as e:
+        raise CallbackURLError(f"callback_url com host inválido: {e}")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise CallbackURLError("callback_url aponta para um endereço interno")
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Não segue redirecionamentos do callback (poderiam levar a um host interno)."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+_callback_opener = urllib.request.build_opener(_NoRedirect)
+
+
+class JobStore:
+    """
+    Persistência local (SQLite) das auditorias assíncronas.
+
+    Os PDFs de entrada ficam em disco ao lado do banco, para que jobs
+    pendentes sejam retomados após um restart.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.directory / "jobs.sqlite3"), check_same_thread=False
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                stage TEXT,
+                stages TEXT NOT NULL,
+                params TEXT NOT NULL,
+                callback_url TEXT,
+                result TEXT,
+                error TEXT,
+                status_code INTEGER,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def files_dir(self, job_id: str) -> Path:
+        return self.directory / "files" / job_id
+
+    def create(
+        self,
+        official_bytes: bytes,
+        auditor_bytes: bytes,
+        params: dict,
+        callback_url: Optional[str] = None
+    ) -> str:
+        """Grava os arquivos e registra o job como "queued"."""
+        job_id = str(uuid.uuid4())
+        files_dir = self.files_dir(job_id)
+        files_dir.mkdir(parents=True, exist_ok=True)
+        (files_dir / "official.pdf").write_bytes(official_bytes)
+        (files_dir / "auditor.pdf").write_bytes(auditor_bytes)
+
+        now = datetime.utcnow().isoformat()
+        stages = [{"name": name, "status": "pending"} for name in PDF_STAGES]
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, stage, stages, params, callback_url, created_at, updated_at) "
+                "VALUES (?, 'queued', NULL, ?, ?, ?, ?, ?)",
+                (job_id, json.dumps(stages), json.dumps(params), callback_url, now, now)
+            )
+            self._conn.commit()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for field in ("stages", "params", "result"):
+            job[field] = json.loads(job[field]) if job[field] else None
+        return job
+
+    def update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = datetime.utcnow().isoformat()
+        for field in ("stages", "result"):
+            if field in fields and fields[field] is not None:
+                fields[field] = json.dumps(fields[field])
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id)
+            )
+            self._conn.commit()
+
+    def unfinished_ids(self) -> list[str]:
+        """Jobs enfileirados ou interrompidos no meio da execução."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def purge_finished(self, retention: float) -> int:
+        """Apaga jobs concluídos ou falhos há mais de `retention` segundos. Retorna quantos."""
+        cutoff = (datetime.utcnow() - timedelta(seconds=retention)).isoformat()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('completed', 'failed') AND updated_at < ?",
+                (cutoff,)
+            ).fetchall()
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(row["id"],) for row in rows])
+            self._conn.commit()
+        # Os arquivos já são apagados ao fim do job; isto cobre os que sobraram
+        for row in rows:
+            self.delete_files(row["id"])
+        return len(rows)
+
+    def read_files(self, job_id: str) -> tuple[bytes, bytes]:
+        files_dir = self.files_dir(job_id)
+        return (
+            (files_dir / "official.pdf").read_bytes(),
+            (files_dir / "auditor.pdf").read_bytes(),
+        )
+
+    def delete_files(self, job_id: str) -> None:
+        shutil.rmtree(self.files_dir(job_id), ignore_errors=True)
+
+
+class AuditJobQueue:
+    """
+    Fila de auditorias processada por workers assíncronos em background.
+
+    O SQLite e os arquivos dos jobs são acessados numa thread própria, fora do
+    event loop. É uma única thread para que as atualizações de progresso de um
+    job sejam gravadas na ordem em que aconteceram.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        workers: int,
+        retention: float = JOB_RETENTION,
+        purge_interval: float = JOB_PURGE_INTERVAL
+    ):
+        self.directory = directory
+        self.workers = workers
+        self.retention = retention
+        self.purge_interval = purge_interval
+        self.store: Optional[JobStore] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+
+    def _store_call(self, method, *args, **kwargs) -> asyncio.Future:
+        """Executa um método do JobStore na thread de I/O da fila."""
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._writer, partial(method, *args, **kwargs))
+
+    def _store_call_nowait(self, method, *args, **kwargs) -> None:
+        """Como _store_call, sem esperar: erros da gravação só são logados."""
+        future = self._store_call(method, *args, **kwargs)
+        future.add_done_callback(_log_store_error)
+
+    async def start(self) -> None:
+        """Inicia os workers e re-enfileira jobs pendentes de execuções anteriores."""
+        self.store = await asyncio.get_running_loop().run_in_executor(
+            self._writer, JobStore, self.directory
+        )
+        self._queue = asyncio.Queue()
+        for job_id in await self._store_call(self.store.unfinished_ids):
+            await self._store_call(self.store.update, job_id, status="queued")
+            self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._purger()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(
+        self,
+        official_bytes: bytes,
+        auditor_bytes: bytes,
+        params: dict,
+        callback_url: Optional[str] = None
+    ) -> str:
+        """Registra um novo job e o coloca na fila. Retorna o ID do job."""
+        job_id = await self._store_call(
+            self.store.create, official_bytes, auditor_bytes, params, callback_url
+        )
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self._store_call(self.store.get, job_id)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._process(job_id)
+            except Exception as e:
+                print(f"Erro inesperado no job {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _purger(self) -> None:
+        """Remove periodicamente os jobs terminados há mais que a retenção."""
+        while True:
+            try:
+                purged = await self._store_call(self.store.purge_finished, self.retention)
+                if purged:
+                    print(f"Jobs antigos removidos: {purged}")
+            except Exception as e:
+                print(f"Erro ao remover jobs antigos: {e}")
+            await asyncio.sleep(self.purge_interval)
+
+    async def _process(self, job_id: str) -> None:
+        job = await self._store_call(self.store.get, job_id)
+        if job is None:
+            return
+
+        stages = job["stages"]
+
+        def on_stage(stage: str) -> None:
+            now = datetime.utcnow().isoformat()
+            for item in stages:
+                if item["status"] == "running":
+                    item["status"] = "completed"
+                    item["finished_at"] = now
+                if item["name"] == stage:
+                    item["status"] = "running"
+                    item["started_at"] = now
+            # Chamado de dentro do pipeline (síncrono): agenda a gravação sem esperar;
+            # a thread única do JobStore mantém a ordem em relação às gravações seguintes
+            self._store_call_nowait(self.store.update, job_id, stage=stage, stages=copy.deepcopy(stages))
+
+        await self._store_call(self.store.update, job_id, status="running")
+
+        try:
+            official_bytes, auditor_bytes = await self._store_call(self.store.read_files, job_id)
+            result = await run_pdf_audit(
+                # O job já é assíncrono: o relatório entra no resultado final
+                official_bytes, auditor_bytes, on_stage=on_stage, defer_report=False,
+                **job["params"]
+            )
+        except AuditPipelineError as e:
+            self._finish_stages(stages, "failed")
+            await self._store_call(
+                self.store.update,
+                job_id, status="failed", stages=stages, error=e.detail, status_code=e.status_code
+            )
+        except Exception as e:
+            self._finish_stages(stages, "failed")
+            await self._store_call(
+                self.store.update,
+                job_id, status="failed", stages=stages, error=str(e), status_code=500
+            )
+        else:
+            self._finish_stages(stages, "completed")
+            await self._store_call(
+                self.store.update,
+                job_id, status="completed", stages=stages, result=result, status_code=200
+            )
+
+        await self._store_call(self.store.delete_files, job_id)
+
+        if job["callback_url"]:
+            await run_io(_post_callback, job["callback_url"], await self.get(job_id))
+
+    @staticmethod
+    def _finish_stages(stages: list[dict], status: str) -> None:
+        now = datetime.utcnow().isoformat()
+        for item in stages:
+            if item["status"] == "running":
+                item["status"] = status
+                item["finished_at"] = now
+
+
+def _log_store_error(future: asyncio.Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        print(f"Erro ao gravar o progresso do job: {future.exception()}")
+
+
+def _post_callback(url: str, job: dict) -> None:
+    """Notifica o callback_url com o estado final do job (POST JSON)."""
+    payload = json.dumps(serialize_job(job)).encode("utf-8")
+    request = urllib.request.Request(
+        url, data=payload, headers={"Content-Type": "application/json"}, method="POST"
+    )
+    try:
+        # Revalida no envio: o DNS pode ter mudado desde a criação do job
+        validate_callback_url(url)
+        with _callback_opener.open(request, timeout=JOB_CALLBACK_TIMEOUT):
+            pass
+    except Exception as e:
+        print(f"Erro ao notificar callback do job {job['id']}: {e}")
+
+
+def serialize_job(job: dict) -> dict:
+    """Representação pública de um job (sem parâmetros internos)."""
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "stages": job["stages"],
+        "result": job["result"],
+        "error": job["error"],
+        "status_code": job["status_code"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
+
+audit_job_queue = AuditJobQueue(JOBS_DIR, JOB_WORKERS)
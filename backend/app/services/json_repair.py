@@ -0,0 +1,321 @@
+import json
+import threading
+import unicodedata
+from typing import Any, Optional
+
+
+CLASSIFICATIONS = ("CONCORDÂNCIA TOTAL", "CONCORDÂNCIA PARCIAL", "DISCORDÂNCIA")
+DISCREPANCY_TYPES = ("estilística", "omissão_menor", "medida", "escopo", "diagnóstica")
+SEVERITIES = ("baixa", "média", "alta", "crítica")
+DISCREPANCY_TEXT_FIELDS = ("description", "official_says", "auditor_says")
+
+# Classificação ausente ou fora da lista: assume a mais conservadora, que leva
+# a auditoria para revisão em vez de gravar um valor inválido
+FALLBACK_CLASSIFICATION = "DISCORDÂNCIA"
+FALLBACK_CLASSIFICATION_NOTE = (
+    "Classificação ausente ou inválida na resposta da IA; "
+    f"registrada como {FALLBACK_CLASSIFICATION} para revisão manual."
+)
+TRUNCATED_RESPONSE_NOTE = (
+    "A resposta da IA veio truncada mesmo após os pedidos de continuação; "
+    "a análise pode estar incompleta."
+)
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _plain(value: str) -> str:
+    """Forma comparável de um rótulo: sem acentos, minúscula, '_' no lugar de espaços."""
+    value = unicodedata.normalize("NFKD", value)
+    value = "".join(c for c in value if not unicodedata.combining(c))
+    return value.strip().lower().replace(" ", "_").replace("-", "_")
+
+
+def _match_label(value, allowed: tuple) -> Optional[str]:
+    if not isinstance(value, str):
+        return None
+    plain = _plain(value)
+    for label in allowed:
+        if _plain(label) == plain:
+            return label
+    return None
+
+
+def scan_json_object(text: str) -> tuple[str, bool]:
+    """
+    Localiza o objeto JSON na resposta, ignorando texto antes do primeiro "{"
+    (ex.: ```json) e depois do "}" correspondente (prosa final).
+
+    Returns:
+        (texto do objeto, True se o objeto foi fechado; False se veio truncado)
+    """
+    start = text.find("{")
+    if start < 0:
+        return "", False
+
+    depth = 0
+    in_string = escape = False
+    for index in range(start, len(text)):
+        c = text[index]
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c in "{[":
+            depth += 1
+        elif c in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:index + 1], True
+    return text[start:], False
+
+
+def close_truncated_json(text: str) -> str:
+    """
+    Fecha um JSON truncado: corta no último ponto em que um valor estava
+    completo (descartando chave, string ou número pela metade) e fecha as
+    listas/objetos abertos.
+    """
+    stack: list[list] = []  # [abertura, esperando_chave]
+    safe_end, safe_stack = 0, ""
+    in_string = escape = False
+    string_is_key = False
+
+    for index, c in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+                if not string_is_key:
+                    safe_end, safe_stack = index + 1, "".join(frame[0] for frame in stack)
+            continue
+
+        if c == '"':
+            in_string = True
+            string_is_key = bool(stack) and stack[-1][0] == "{" and stack[-1][1]
+        elif c in "{[":
+            stack.append([c, c == "{"])
+            safe_end, safe_stack = index + 1, "".join(frame[0] for frame in stack)
+        elif c in "}]":
+            if stack:
+                stack.pop()
+            safe_end, safe_stack = index + 1, "".join(frame[0] for frame in stack)
+            if not stack:
+                break
+        elif c == ":" and stack and stack[-1][0] == "{":
+            stack[-1][1] = False
+        elif c == ",":
+            if stack and stack[-1][0] == "{":
+                stack[-1][1] = True
+            # Tudo antes da vírgula é um elemento completo
+            safe_end, safe_stack = index, "".join(frame[0] for frame in stack)
+
+    return text[:safe_end] + "".join(_CLOSERS[opener] for opener in reversed(safe_stack))
+
+
+def repair_json(text: str) -> tuple[Optional[dict], bool]:
+    """
+    Tenta recuperar o objeto JSON da resposta localmente, sem nova chamada.
+
+    Returns:
+        (objeto ou None, True se a resposta veio truncada)
+    """
+    candidate, complete = scan_json_object(text)
+    if not candidate:
+        return None, False
+    if not complete:
+        candidate = close_truncated_json(candidate)
+
+    for attempt in (candidate, _without_trailing_commas(candidate)):
+        try:
+            result = json.loads(attempt)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(result, dict):
+            return result, not complete
+    return None, not complete
+
+
+def _without_trailing_commas(text: str) -> str:
+    """Remove vírgulas antes de "}" ou "]" (fora de strings)."""
+    out = []
+    in_string = escape = False
+    for c in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c in "}]":
+            while out and out[-1] in " \t\r\n":
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+        out.append(c)
+    return "".join(out)
+
+
+def validate_analysis(result: dict) -> tuple[dict, int]:
+    """
+    Valida a análise contra o formato esperado, corrigindo o que for possível:
+    rótulos com variação de acento/caixa, campos ausentes e itens com tipo
+    errado. Discrepâncias sem nenhum texto são descartadas.
+
+    Returns:
+        (análise corrigida, número de correções feitas)
+    """
+    fixes = 0
+
+    classification = _match_label(result.get("classification"), CLASSIFICATIONS)
+    if classification != result.get("classification"):
+        fixes += 1
+    if classification is None:
+        classification = FALLBACK_CLASSIFICATION
+        add_technical_note(result, FALLBACK_CLASSIFICATION_NOTE)
+    result["classification"] = classification
+
+    if not isinstance(result.get("summary"), str):
+        fixes += 1
+        result["summary"] = str(result["summary"]) if result.get("summary") is not None else ""
+
+    findings = result.get("concordant_findings")
+    if not isinstance(findings, list):
+        fixes += 1
+        findings = [findings] if isinstance(findings, str) and findings else []
+    clean_findings = [str(item) for item in findings if item not in (None, "")]
+    fixes += len(findings) - len(clean_findings)
+    result["concordant_findings"] = clean_findings
+
+    discrepancies = result.get("discrepancies")
+    if not isinstance(discrepancies, list):
+        fixes += 1
+        discrepancies = []
+    clean_discrepancies = []
+    for item in discrepancies:
+        discrepancy, item_fixes = _validate_discrepancy(item)
+        fixes += item_fixes
+        if discrepancy is not None:
+            clean_discrepancies.append(discrepancy)
+    result["discrepancies"] = clean_discrepancies
+
+    if not isinstance(result.get("has_critical_alert"), bool):
+        if "has_critical_alert" in result:
+            fixes += 1
+        result["has_critical_alert"] = bool(result.get("has_critical_alert"))
+    result.setdefault("critical_alert_text", None)
+    result.setdefault("technical_note", None)
+
+    return result, fixes
+
+
+def validate_stream_event(event: str, value: Any) -> Optional[tuple[str, Any]]:
+    """
+    Normaliza um evento parcial do streaming (ver json_stream) com as mesmas
+    regras de validate_analysis. Retorna None se o item deve ser descartado.
+    """
+    if event == "classification":
+        return event, _match_label(value, CLASSIFICATIONS) or FALLBACK_CLASSIFICATION
+    if event == "summary":
+        return event, value if isinstance(value, str) else ("" if value is None else str(value))
+    if event == "concordant_finding":
+        return None if value in (None, "") else (event, str(value))
+    if event == "discrepancy":
+        discrepancy, _ = _validate_discrepancy(value)
+        return None if discrepancy is None else (event, discrepancy)
+    if event == "has_critical_alert":
+        return event, bool(value)
+    return event, value
+
+
+def add_technical_note(result: dict, note: str) -> None:
+    """Acrescenta um aviso à nota técnica da análise."""
+    current = result.get("technical_note")
+    result["technical_note"] = f"{current} {note}" if isinstance(current, str) and current else note
+
+
+def _validate_discrepancy(item) -> tuple[Optional[dict], int]:
+    if not isinstance(item, dict):
+        if isinstance(item, str) and item:
+            return {
+                "type": None, "severity": "alta", "description": item,
+                "official_says": "", "auditor_says": "",
+            }, 1
+        return None, 1
+
+    fixes = 0
+    for field in DISCREPANCY_TEXT_FIELDS:
+        value = item.get(field)
+        if not isinstance(value, str):
+            fixes += 1
+            item[field] = "" if value is None else str(value)
+    if not any(item[field] for field in DISCREPANCY_TEXT_FIELDS):
+        return None, fixes + 1
+
+    # Tipo fora da lista é mantido como veio (só a grafia é corrigida)
+    discrepancy_type = _match_label(item.get("type"), DISCREPANCY_TYPES)
+    if discrepancy_type is not None and discrepancy_type != item.get("type"):
+        fixes += 1
+        item["type"] = discrepancy_type
+    elif not isinstance(item.get("type"), str):
+        fixes += 1
+        item["type"] = None
+
+    severity = _match_label(item.get("severity"), SEVERITIES)
+    if severity != item.get("severity"):
+        fixes += 1
+    # Severidade desconhecida não pode esconder um problema: assume "alta"
+    item["severity"] = severity or "alta"
+
+    return item, fixes
+
+
+class RepairStats:
+    """Contadores de respostas do modelo que precisaram de reparo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.valid = 0
+        self.repaired_locally = 0
+        self.continued = 0
+        self.repaired_by_model = 0
+        self.truncated = 0
+        self.failed = 0
+        self.schema_fixes = 0
+
+    def record(self, outcome: str, schema_fixes: int = 0) -> None:
+        """`outcome`: valid, repaired_locally, continued, repaired_by_model, truncated ou failed."""
+        with self._lock:
+            self.responses += 1
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            self.schema_fixes += schema_fixes
+
+    def stats(self) -> dict:
+        with self._lock:
+            repaired = self.repaired_locally + self.continued + self.repaired_by_model
+            return {
+                "responses": self.responses,
+                "valid": self.valid,
+                "repaired_locally": self.repaired_locally,
+                "continued": self.continued,
+                "repaired_by_model": self.repaired_by_model,
+                "truncated": self.truncated,
+                "failed": self.failed,
+                "repair_rate": round(repaired / self.responses, 3) if self.responses else 0.0,
+                "schema_fixes": self.schema_fixes,
+            }
+
+
+repair_stats = RepairStats()
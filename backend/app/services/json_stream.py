@@ -0,0 +1,125 @@
+import json
+from typing import Any
+
+
+# Campos de lista da análise e o nome do evento emitido para cada item
+ARRAY_ITEM_EVENTS = {
+    "concordant_findings": "concordant_finding",
+    "discrepancies": "discrepancy",
+}
+
+
+class AnalysisStreamParser:
+    """
+    Parser incremental do JSON de análise retornado pelo modelo.
+
+    Recebe o texto em pedaços (`feed`) e devolve eventos assim que cada parte
+    fica completa: campos escalares do objeto raiz ("classification",
+    "summary", ...) e cada item das listas ("concordant_finding",
+    "discrepancy"). Ignora texto antes do primeiro "{" (ex.: ```json).
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._key_start = None
+        self._key = None
+        self._value_start = None
+        self._array_key = None
+        self._item_start = None
+        self.done = False
+
+    def feed(self, chunk: str) -> list[tuple[str, Any]]:
+        """Adiciona um pedaço do texto e retorna os eventos completados."""
+        self.buffer += chunk
+        events = []
+
+        while self._pos < len(self.buffer) and not self.done:
+            i = self._pos
+            c = self.buffer[i]
+            self._pos += 1
+
+            if not self._started:
+                if c == "{":
+                    self._started = True
+                    self._depth = 1
+                    self._expect_key = True
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._key_start is not None:
+                        self._key = json.loads(self.buffer[self._key_start:i + 1])
+                        self._key_start = None
+                continue
+
+            if c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect_key:
+                    self._key_start = i
+                    self._expect_key = False
+            elif c == ":" and self._depth == 1:
+                self._value_start = i + 1
+            elif c in "{[":
+                self._depth += 1
+                if c == "[" and self._depth == 2 and self._key in ARRAY_ITEM_EVENTS:
+                    self._array_key = self._key
+                    self._item_start = i + 1
+            elif c in "}]":
+                if self._depth == 2 and self._array_key is not None:
+                    self._emit_item(i, events)
+                    self._array_key = None
+                    self._value_start = None
+                if self._depth == 1:
+                    self._emit_value(i, events)
+                    self.done = True
+                self._depth -= 1
+            elif c == ",":
+                if self._depth == 1:
+                    self._emit_value(i, events)
+                    self._expect_key = True
+                elif self._depth == 2 and self._array_key is not None:
+                    self._emit_item(i, events)
+                    self._item_start = i + 1
+
+        return events
+
+    def _emit_item(self, end: int, events: list) -> None:
+        raw = self.buffer[self._item_start:end].strip()
+        if raw:
+            try:
+                events.append((ARRAY_ITEM_EVENTS[self._array_key], json.loads(raw)))
+            except json.JSONDecodeError:
+                pass  # item malformado: fica para o parse final da resposta
+
+    def _emit_value(self, end: int, events: list) -> None:
+        if self._value_start is None or self._key is None:
+            return
+        raw = self.buffer[self._value_start:end].strip()
+        self._value_start = None
+        if raw:
+            try:
+                events.append((self._key, json.loads(raw)))
+            except json.JSONDecodeError:
+                pass
+
+
+def analysis_events(result: dict) -> list[tuple[str, Any]]:
+    """Eventos equivalentes aos do parser, a partir de uma análise já completa."""
+    events = []
+    for key, value in result.items():
+        if key in ARRAY_ITEM_EVENTS:
+            events.extend((ARRAY_ITEM_EVENTS[key], item) for item in value)
+        else:
+            events.append((key, value))
+    return events
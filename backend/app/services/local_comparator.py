@@ -0,0 +1,197 @@
+import asyncio
+import difflib
+import random
+from typing import Any, AsyncIterator, Optional
+
+from app.services.json_stream import analysis_events
+from app.services.report_diff import split_segments
+from app.services.text_preparation import estimate_tokens
+
+
+class InjectedFailure(Exception):
+    """Falha simulada pelo comparador local (LOCAL_COMPARATOR_ERROR_RATE)."""
+
+
+def local_analysis(official_text: str, auditor_text: str) -> dict:
+    """
+    Análise determinística derivada do diff dos laudos, no formato da
+    resposta do Gemini. Não tem valor clínico: serve para exercitar o pipeline.
+    """
+    official = split_segments(official_text)
+    auditor = split_segments(auditor_text)
+    matcher = difflib.SequenceMatcher(
+        None, [s[1] for s in official], [s[1] for s in auditor], autojunk=False
+    )
+
+    concordant, discrepancies = [], []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        official_says = " ".join(segment[0] for segment in official[i1:i2])
+        auditor_says = " ".join(segment[0] for segment in auditor[j1:j2])
+        if tag == "equal":
+            concordant.extend(segment[0] for segment in official[i1:i2])
+        elif tag == "replace":
+            discrepancies.append({
+                "type": "diagnóstica",
+                "severity": "média",
+                "description": "Trechos divergentes entre os laudos.",
+                "official_says": official_says,
+                "auditor_says": auditor_says,
+            })
+        else:
+            discrepancies.append({
+                "type": "omissão_menor",
+                "severity": "baixa",
+                "description": "Trecho presente em apenas um dos laudos.",
+                "official_says": official_says or "Não mencionado",
+                "auditor_says": auditor_says or "Não mencionado",
+            })
+
+    total = len(official) + len(auditor)
+    changed_ratio = 1 - 2 * len(concordant) / total if total else 1.0
+    if not discrepancies:
+        classification = "CONCORDÂNCIA TOTAL"
+    elif changed_ratio <= 0.25:
+        classification = "CONCORDÂNCIA PARCIAL"
+    else:
+        classification = "DISCORDÂNCIA"
+
+    return {
+        "classification": classification,
+        "summary": (
+            f"Comparação local (sem IA): {len(concordant)} trechos em comum e "
+            f"{len(discrepancies)} divergências."
+        ),
+        "concordant_findings": concordant,
+        "discrepancies": discrepancies,
+        "has_critical_alert": False,
+        "critical_alert_text": None,
+        "technical_note": "Gerado pelo comparador local (COMPARATOR_BACKEND=local), sem análise clínica.",
+    }
+
+
+class LocalComparator:
+    """
+    Comparador offline e determinístico, para testes de carga e desenvolvimento
+    sem rede nem cota do Gemini.
+
+    - Análise derivada do diff dos laudos (ver local_analysis)
+    - Latência simulada de `latency` ± `jitter` segundos por chamada
+    - Falhas injetadas com probabilidade `error_rate` (sequência fixa pela `seed`)
+    - Limite de chamadas simultâneas, como o do Gemini
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        latency: float,
+        jitter: float,
+        error_rate: float,
+        seed: int,
+        max_concurrency: int
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.max_concurrency = max_concurrency
+        self._random = random.Random(seed)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop = None
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # O semáforo pertence ao event loop em que foi criado
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    def _draw(self) -> tuple[float, bool]:
+        """Sorteia a latência e se a chamada vai falhar."""
+        delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+        return delay, self._random.random() < self.error_rate
+
+    def _usage(self, official_text: str, auditor_text: str, analysis: dict) -> dict:
+        return {
+            "input_tokens": estimate_tokens(official_text + auditor_text),
+            "output_tokens": estimate_tokens(str(analysis)),
+            "estimated": True,
+        }
+
+    async def compare(
+        self,
+        official_text: str,
+        auditor_text: str,
+        patient_name: str = "Não informado",
+        exam_type: str = "Não informado",
+        exam_date: str = "Não informada"
+    ) -> dict:
+        """Compara dois laudos localmente (mesmo formato de GeminiComparator.compare)."""
+        delay, fail = self._draw()
+        async with self._get_semaphore():
+            self.calls += 1
+            self.in_flight += 1
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self.in_flight -= 1
+
+        if fail:
+            self.errors += 1
+            return {
+                "success": False,
+                "error": "Erro no comparador local: falha injetada",
+                "raw_response": None
+            }
+
+        analysis = local_analysis(official_text, auditor_text)
+        return {
+            "success": True,
+            "data": analysis,
+            "raw_response": None,
+            "usage": self._usage(official_text, auditor_text, analysis)
+        }
+
+    async def compare_stream(
+        self,
+        official_text: str,
+        auditor_text: str,
+        patient_name: str = "Não informado",
+        exam_type: str = "Não informado",
+        exam_date: str = "Não informada"
+    ) -> AsyncIterator[tuple[str, Any]]:
+        """Versão em streaming: a latência é distribuída entre os eventos."""
+        delay, fail = self._draw()
+        analysis = local_analysis(official_text, auditor_text)
+        events = analysis_events(analysis)
+
+        async with self._get_semaphore():
+            self.calls += 1
+            self.in_flight += 1
+            try:
+                for event in events:
+                    await asyncio.sleep(delay / len(events))
+                    if fail:
+                        self.errors += 1
+                        raise InjectedFailure("falha injetada")
+                    yield event
+            finally:
+                self.in_flight -= 1
+
+        yield "usage", self._usage(official_text, auditor_text, analysis)
+        yield "analysis", analysis
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "errors": self.errors,
+            "latency": self.latency,
+            "jitter": self.jitter,
+            "error_rate": self.error_rate,
+        }
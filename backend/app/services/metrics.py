@@ -0,0 +1,93 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+
+# Limites superiores dos buckets de latência (ms)
+DEFAULT_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+class LatencyHistogram:
+    """Histograma de latências em buckets fixos, com percentis aproximados."""
+
+    def __init__(self, buckets_ms: tuple = DEFAULT_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self._counts = [0] * (len(buckets_ms) + 1)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, elapsed_ms: float, error: bool = False) -> None:
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets_ms, elapsed_ms)] += 1
+            self.count += 1
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+            if error:
+                self.errors += 1
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Limite superior do bucket que contém o percentil pedido (0-1)."""
+        with self._lock:
+            if self.count == 0:
+                return None
+            target = fraction * self.count
+            seen = 0
+            for index, bucket_count in enumerate(self._counts):
+                seen += bucket_count
+                if seen >= target:
+                    return float(self.buckets_ms[index]) if index < len(self.buckets_ms) else self.max_ms
+            return self.max_ms
+
+    def snapshot(self) -> dict:
+        p50, p95, p99 = self.percentile(0.5), self.percentile(0.95), self.percentile(0.99)
+        with self._lock:
+            buckets = {f"le_{bound}": count for bound, count in zip(self.buckets_ms, self._counts)}
+            buckets["le_inf"] = self._counts[-1]
+            return {
+                "count": self.count,
+                "errors": self.errors,
+                "avg_ms": round(self.total_ms / self.count, 1) if self.count else None,
+                "max_ms": round(self.max_ms, 1),
+                "p50_ms": p50,
+                "p95_ms": p95,
+                "p99_ms": p99,
+                "buckets": buckets,
+            }
+
+
+_histograms: dict[str, LatencyHistogram] = {}
+_registry_lock = threading.Lock()
+
+
+def get_histogram(name: str) -> LatencyHistogram:
+    """Retorna (criando se necessário) o histograma com esse nome."""
+    with _registry_lock:
+        if name not in _histograms:
+            _histograms[name] = LatencyHistogram()
+        return _histograms[name]
+
+
+@contextmanager
+def timed(name: str):
+    """Mede a duração do bloco e registra no histograma `name` (erros são contados)."""
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        get_histogram(name).observe((time.perf_counter() - started) * 1000, error=error)
+
+
+def get_latency_metrics() -> dict:
+    """Snapshot de todos os histogramas registrados."""
+    with _registry_lock:
+        histograms = dict(_histograms)
+    return {name: histogram.snapshot() for name, histogram in sorted(histograms.items())}
@@ -1,75 +1,216 @@
+import copy
+import hashlib
 import io
+import os
+import tempfile
+import time
 import pdfplumber
+from dataclasses import asdict, dataclass, field
 from typing import Optional
 
-def extract_text_from_pdf(pdf_bytes: bytes) -> str:
+from app.config import (
+    DATA_DIR, OCR_MIN_PAGE_CHARS, OCR_DPI,
+    EXTRACTION_CACHE_ENABLED, EXTRACTION_CACHE_MEMORY_ENTRIES,
+    EXTRACTION_CACHE_DISK_ENTRIES, EXTRACTION_CACHE_TTL
+)
+from app.services.cache import LRUCache, SQLiteCache, TieredCache
+
+
+# Cache de ingestão (PdfIngestion serializado) por SHA-256 do PDF
+extraction_cache = TieredCache(
+    LRUCache(EXTRACTION_CACHE_MEMORY_ENTRIES, ttl=EXTRACTION_CACHE_TTL),
+    SQLiteCache(
+        os.path.join(DATA_DIR, "cache", "extractions.sqlite3"),
+        EXTRACTION_CACHE_DISK_ENTRIES,
+        ttl=EXTRACTION_CACHE_TTL
+    )
+)
+
+
+@dataclass
+class PdfIngestion:
+    """Resultado da leitura de um PDF: validação, páginas e texto extraído."""
+    valid: bool
+    error: Optional[str] = None
+    page_count: int = 0
+    pages: list[str] = field(default_factory=list)
+    text: str = ""
+    used_ocr: bool = False
+    ocr_pages: list[int] = field(default_factory=list)
+    ocr_failed_pages: list[int] = field(default_factory=list)
+    needs_ocr: list[int] = field(default_factory=list)
+    timings: dict = field(default_factory=dict)
+    cached: bool = False
+
+
+def pdf_sha256(pdf_bytes: bytes) -> str:
+    """Hash do conteúdo do PDF (chave do cache de extração)."""
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def get_cached_ingestion(digest: str) -> Optional[PdfIngestion]:
+    """Retorna a ingestão em cache para o hash informado, se houver."""
+    if not EXTRACTION_CACHE_ENABLED:
+        return None
+    cached = extraction_cache.get(digest)
+    if cached is None:
+        return None
+    ingestion = PdfIngestion(**copy.deepcopy(cached))
+    ingestion.cached = True
+    return ingestion
+
+
+def store_ingestion(digest: str, ingestion: PdfIngestion) -> None:
     """
-    Extrai texto de um arquivo PDF.
-    Usa pdfplumber para PDFs nativos (texto selecionável).
-    Se o texto extraído for muito curto, tenta OCR como fallback.
+    Guarda a ingestão no cache. PDFs inválidos, sem texto ou com falha no OCR
+    de alguma página não são guardados (a falha pode ser passageira).
     """
-    text = ""
+    if (
+        EXTRACTION_CACHE_ENABLED and ingestion.valid and ingestion.text
+        and not ingestion.ocr_failed_pages
+    ):
+        extraction_cache.set(digest, asdict(ingestion))
+
 
+def ingest_pdf(pdf_bytes: bytes, ocr: bool = True) -> PdfIngestion:
+    """
+    Valida o PDF, conta as páginas e extrai o texto abrindo o documento uma única vez.
+    Usa pdfplumber para a camada de texto nativa. Páginas sem texto nativo
+    (menos de OCR_MIN_PAGE_CHARS caracteres) são marcadas em `needs_ocr`.
+
+    Args:
+        pdf_bytes: Conteúdo do PDF
+        ocr: Se True, faz o OCR dessas páginas aqui, uma por vez. Se False,
+            deixa para quem chamou distribuir as páginas (ver ocr_page).
+    """
+    started = time.perf_counter()
+
+    # Verifica magic bytes do PDF
+    if not pdf_bytes.startswith(b'%PDF'):
+        return PdfIngestion(valid=False, error="Arquivo não é um PDF válido")
+
+    pages = []
     try:
         with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+            opened = time.perf_counter()
+            if len(pdf.pages) == 0:
+                return PdfIngestion(valid=False, error="PDF não contém páginas")
             for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+                pages.append(page.extract_text() or "")
     except Exception as e:
-        print(f"Erro ao extrair texto com pdfplumber: {e}")
-        return ""
+        return PdfIngestion(valid=False, error=f"Erro ao processar PDF: {str(e)}")
+
+    extracted = time.perf_counter()
+    timings = {
+        "open_ms": round((opened - started) * 1000, 1),
+        "extract_ms": round((extracted - opened) * 1000, 1),
+    }
+
+    # Páginas sem camada de texto (escaneadas) precisam de OCR
+    needs_ocr = [
+        number for number, page_text in enumerate(pages, 1)
+        if len(page_text.strip()) < OCR_MIN_PAGE_CHARS
+    ]
 
-    # Se o texto extraído for muito curto, pode ser um PDF escaneado
-    # Nesse caso, tentamos OCR (requer tesseract instalado)
-    if len(text.strip()) < 50:
-        text = _try_ocr_extraction(pdf_bytes)
+    ingestion = PdfIngestion(
+        valid=True,
+        page_count=len(pages),
+        pages=pages,
+        text=_join_pages(pages),
+        needs_ocr=needs_ocr,
+        timings=timings
+    )
 
-    return text.strip()
+    if ocr and needs_ocr:
+        ocr_started = time.perf_counter()
+        pdf_path = write_temp_pdf(pdf_bytes)
+        try:
+            results = {number: ocr_page(pdf_path, number) for number in needs_ocr}
+        finally:
+            remove_temp_pdf(pdf_path)
+        apply_ocr_results(ingestion, results, time.perf_counter() - ocr_started)
 
+    timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return ingestion
 
-def _try_ocr_extraction(pdf_bytes: bytes) -> str:
+
+def apply_ocr_results(
+    ingestion: PdfIngestion,
+    results: dict[int, Optional[str]],
+    elapsed: float
+) -> None:
     """
-    Tenta extrair texto usando OCR (Tesseract).
-    Requer pytesseract e tesseract-ocr instalados no sistema.
+    Incorpora o texto de OCR das páginas (número da página -> texto) na ingestão.
+    O OCR só substitui a página quando traz mais texto que a camada nativa;
+    páginas em que o OCR falhou (None) ficam em `ocr_failed_pages`.
     """
-    try:
-        import pytesseract
-        from PIL import Image
-        from pdf2image import convert_from_bytes
+    for number, ocr_text in results.items():
+        if ocr_text is None:
+            ingestion.ocr_failed_pages.append(number)
+        elif len(ocr_text.strip()) > len(ingestion.pages[number - 1].strip()):
+            ingestion.pages[number - 1] = ocr_text
+            ingestion.ocr_pages.append(number)
 
-        # Converte PDF para imagens
-        images = convert_from_bytes(pdf_bytes)
+    ingestion.ocr_pages.sort()
+    ingestion.ocr_failed_pages.sort()
+    ingestion.used_ocr = bool(ingestion.ocr_pages)
+    ingestion.needs_ocr = []
+    ingestion.text = _join_pages(ingestion.pages)
+    ingestion.timings["ocr_ms"] = round(elapsed * 1000, 1)
 
-        text = ""
-        for image in images:
-            page_text = pytesseract.image_to_string(image, lang='por')
-            text += page_text + "\n"
 
-        return text.strip()
-    except ImportError:
-        print("OCR não disponível: pdf2image ou pytesseract não instalado")
-        return ""
-    except Exception as e:
-        print(f"Erro no OCR: {e}")
-        return ""
+def _join_pages(pages: list[str]) -> str:
+    return "".join(page_text + "\n" for page_text in pages if page_text).strip()
 
 
-def validate_pdf(pdf_bytes: bytes) -> tuple[bool, Optional[str]]:
+def write_temp_pdf(pdf_bytes: bytes) -> str:
     """
-    Valida se o arquivo é um PDF válido.
-    Retorna (True, None) se válido, (False, mensagem_erro) se inválido.
+    Grava o PDF num arquivo temporário para o OCR: cada tarefa de página recebe
+    só o caminho, em vez de uma cópia do PDF inteiro serializada para o worker.
     """
-    # Verifica magic bytes do PDF
-    if not pdf_bytes.startswith(b'%PDF'):
-        return False, "Arquivo não é um PDF válido"
+    fd, path = tempfile.mkstemp(prefix="laudosync-ocr-", suffix=".pdf")
+    with os.fdopen(fd, "wb") as file:
+        file.write(pdf_bytes)
+    return path
+
 
-    # Tenta abrir com pdfplumber para validação adicional
+def remove_temp_pdf(path: str) -> None:
     try:
-        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-            if len(pdf.pages) == 0:
-                return False, "PDF não contém páginas"
-    except Exception as e:
-        return False, f"Erro ao processar PDF: {str(e)}"
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
 
-    return True, None
+def ocr_page(pdf_path: str, page_number: int) -> Optional[str]:
+    """
+    Extrai o texto de uma única página usando OCR (Tesseract).
+    Renderiza só essa página, para não manter o documento inteiro em memória.
+    Requer pytesseract e tesseract-ocr instalados no sistema.
+    Retorna None se o OCR falhar ("" é uma página sem texto reconhecido).
+
+    Args:
+        pdf_path: PDF gravado em disco (ver write_temp_pdf)
+        page_number: Página a reconhecer (a partir de 1)
+    """
+    try:
+        import pytesseract
+        from pdf2image import convert_from_path
+
+        # Converte apenas a página pedida para imagem
+        images = convert_from_path(
+            pdf_path, dpi=OCR_DPI, first_page=page_number, last_page=page_number
+        )
+        if not images:
+            return ""
+
+        image = images[0]
+        try:
+            return pytesseract.image_to_string(image, lang='por')
+        finally:
+            image.close()
+    except ImportError:
+        print("OCR não disponível: pdf2image ou pytesseract não instalado")
+        return None
+    except Exception as e:
+        print(f"Erro no OCR da página {page_number}: {e}")
+        return None
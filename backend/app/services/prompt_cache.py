@@ -0,0 +1,232 @@
+import datetime
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from google.generativeai import caching
+
+from app.config import (
+    PROMPT_CACHE_PROVIDER, PROMPT_CACHE_TTL, PROMPT_CACHE_REFRESH_MARGIN, PROMPT_CACHE_RETRY_AFTER
+)
+from app.prompts.comparison import PROMPT_VERSION, SYSTEM_PROMPT
+
+
+class GeminiPromptCacheProvider:
+    """Context caching do Gemini (caching.CachedContent)."""
+
+    name = "gemini"
+
+    def find(self, display_name: str):
+        for cached_content in caching.CachedContent.list():
+            if cached_content.display_name == display_name:
+                return cached_content
+        return None
+
+    def create(self, model_name: str, display_name: str, system_instruction: str, ttl: float):
+        return caching.CachedContent.create(
+            model=model_name,
+            display_name=display_name,
+            system_instruction=system_instruction,
+            ttl=datetime.timedelta(seconds=ttl)
+        )
+
+    def refresh(self, handle, ttl: float) -> None:
+        handle.update(ttl=datetime.timedelta(seconds=ttl))
+
+    def expires_at(self, handle) -> float:
+        return handle.expire_time.timestamp()
+
+    def model_for(self, handle):
+        return genai.GenerativeModel.from_cached_content(cached_content=handle)
+
+
+@dataclass
+class FakeCachedContent:
+    name: str
+    display_name: str
+    model: str
+    system_instruction: str
+    expire_time: float
+
+
+class FakePromptCacheProvider:
+    """
+    Provedor local (desenvolvimento/testes): guarda o conteúdo em memória e
+    devolve um modelo comum com o system_instruction, sem chamar a API de cache.
+    """
+
+    name = "fake"
+
+    def __init__(self):
+        self.entries: dict[str, FakeCachedContent] = {}
+
+    def find(self, display_name: str):
+        return self.entries.get(display_name)
+
+    def create(self, model_name: str, display_name: str, system_instruction: str, ttl: float):
+        handle = FakeCachedContent(
+            name=f"cachedContents/fake-{len(self.entries) + 1}",
+            display_name=display_name,
+            model=model_name,
+            system_instruction=system_instruction,
+            expire_time=time.time() + ttl
+        )
+        self.entries[display_name] = handle
+        return handle
+
+    def refresh(self, handle, ttl: float) -> None:
+        handle.expire_time = time.time() + ttl
+
+    def expires_at(self, handle) -> float:
+        return handle.expire_time
+
+    def model_for(self, handle):
+        return genai.GenerativeModel(
+            model_name=handle.model,
+            system_instruction=handle.system_instruction
+        )
+
+
+@dataclass
+class _Entry:
+    handle: Any
+    model: Any
+    expires_at: float
+
+
+class SystemPromptCache:
+    """
+    Mantém o SYSTEM_PROMPT em cache no provedor, um conteúdo por modelo,
+    identificado pela versão do prompt (reaproveitado entre processos).
+
+    O conteúdo é renovado quando faltam menos de `refresh_margin` segundos
+    para expirar. Se o provedor falhar, o cache fica desativado por
+    `retry_after` segundos e quem chama usa o modelo comum. Se a falha for
+    permanente (InvalidArgument: modelo sem suporte ou prompt abaixo do
+    mínimo de tokens), o cache fica desativado para o modelo até o restart,
+    sem novas tentativas no caminho das requisições.
+    """
+
+    def __init__(
+        self,
+        provider,
+        system_instruction: str,
+        version: str,
+        ttl: float,
+        refresh_margin: float,
+        retry_after: float
+    ):
+        self.provider = provider
+        self.system_instruction = system_instruction
+        self.version = version
+        self.ttl = ttl
+        self.refresh_margin = min(refresh_margin, ttl / 2)
+        self.retry_after = retry_after
+        self._entries: dict[str, _Entry] = {}
+        self._unavailable_until: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.disabled_models: set[str] = set()
+        self.created = 0
+        self.reused = 0
+        self.refreshed = 0
+        self.failures = 0
+        self.fallbacks = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.provider is not None
+
+    def display_name(self, model_name: str) -> str:
+        return f"laudosync-system-v{self.version}-{model_name}"
+
+    def is_fresh(self, model_name: str) -> bool:
+        """True se não há nada a fazer agora (conteúdo válido ou cache em pausa)."""
+        now = time.time()
+        if model_name in self.disabled_models or self._unavailable_until.get(model_name, 0) > now:
+            return True
+        entry = self._entries.get(model_name)
+        return entry is not None and entry.expires_at - now > self.refresh_margin
+
+    def ensure(self, model_name: str) -> None:
+        """Cria, reaproveita ou renova o conteúdo em cache (faz I/O; fora do event loop)."""
+        with self._lock:
+            if self.is_fresh(model_name):
+                return
+            try:
+                entry = self._entries.get(model_name)
+                if entry is not None:
+                    self.provider.refresh(entry.handle, self.ttl)
+                    entry.expires_at = time.time() + self.ttl
+                    self.refreshed += 1
+                else:
+                    self._entries[model_name] = self._open(model_name)
+            except google_exceptions.InvalidArgument as e:
+                self.failures += 1
+                self._entries.pop(model_name, None)
+                self.disabled_models.add(model_name)
+                print(f"Cache do system prompt desativado para {model_name}: {e}")
+            except Exception as e:
+                self.failures += 1
+                self._entries.pop(model_name, None)
+                self._unavailable_until[model_name] = time.time() + self.retry_after
+                print(f"Cache do system prompt indisponível para {model_name}: {e}")
+
+    def _open(self, model_name: str) -> _Entry:
+        display_name = self.display_name(model_name)
+        handle = self.provider.find(display_name)
+        if handle is not None and self.provider.expires_at(handle) - time.time() > self.refresh_margin:
+            self.reused += 1
+        else:
+            handle = self.provider.create(model_name, display_name, self.system_instruction, self.ttl)
+            self.created += 1
+        return _Entry(handle, self.provider.model_for(handle), self.provider.expires_at(handle))
+
+    def model(self, model_name: str):
+        """Modelo ligado ao conteúdo em cache, ou None (usar o modelo comum)."""
+        entry = self._entries.get(model_name)
+        if entry is None or entry.expires_at <= time.time():
+            return None
+        return entry.model
+
+    def invalidate(self, model_name: str) -> None:
+        """Descarta o conteúdo (ex.: removido no provedor) e pausa o cache."""
+        with self._lock:
+            self.fallbacks += 1
+            self._entries.pop(model_name, None)
+            self._unavailable_until[model_name] = time.time() + self.retry_after
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            "provider": self.provider.name if self.provider else None,
+            "active_models": sorted(
+                name for name, entry in self._entries.items() if entry.expires_at > now
+            ),
+            "created": self.created,
+            "reused": self.reused,
+            "refreshed": self.refreshed,
+            "failures": self.failures,
+            "fallbacks": self.fallbacks,
+            "disabled_models": sorted(self.disabled_models),
+        }
+
+
+def _make_provider(kind: str):
+    if kind == "gemini":
+        return GeminiPromptCacheProvider()
+    if kind == "fake":
+        return FakePromptCacheProvider()
+    return None
+
+
+system_prompt_cache = SystemPromptCache(
+    provider=_make_provider(PROMPT_CACHE_PROVIDER),
+    system_instruction=SYSTEM_PROMPT,
+    version=PROMPT_VERSION,
+    ttl=PROMPT_CACHE_TTL,
+    refresh_margin=PROMPT_CACHE_REFRESH_MARGIN,
+    retry_after=PROMPT_CACHE_RETRY_AFTER
+)
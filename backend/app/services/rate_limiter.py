@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """Balde de tokens com reposição contínua (capacidade = limite por minuto)."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Segundos até haver `amount` tokens (0 se já houver)."""
+        self._refill()
+        # Pedidos maiores que a capacidade são limitados a ela para não travar
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= amount
+
+
+class RateLimiter:
+    """
+    Limitador de chamadas por requisições/minuto e tokens/minuto.
+
+    `acquire` aguarda (sem falhar) até as duas cotas permitirem a chamada,
+    aplicando back-pressure em quem chama.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._lock = threading.Lock()
+        self.throttled = 0
+        self.throttled_seconds = 0.0
+
+    async def acquire(self, tokens: int) -> None:
+        """Reserva uma requisição e `tokens` tokens, esperando se necessário."""
+        throttled = False
+        while True:
+            with self._lock:
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                if wait == 0:
+                    self.requests.consume(1)
+                    self.tokens.consume(tokens)
+                    return
+                if not throttled:
+                    self.throttled += 1
+                    throttled = True
+                self.throttled_seconds += wait
+            await asyncio.sleep(wait)
+
+    def debit(self, tokens: int) -> None:
+        """Desconta tokens consumidos além da reserva (ex.: tokens de saída)."""
+        if tokens > 0:
+            with self._lock:
+                self.tokens.consume(tokens)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self.requests._refill()
+            self.tokens._refill()
+            return {
+                "requests_available": round(self.requests.tokens, 1),
+                "tokens_available": round(self.tokens.tokens),
+                "throttled": self.throttled,
+                "throttled_seconds": round(self.throttled_seconds, 2),
+            }
@@ -0,0 +1,100 @@
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Optional
+
+from app.config import REPORT_CACHE_ENABLED, REPORT_CACHE_DIR, REPORT_CACHE_MAX_ENTRIES
+
+
+class ReportRenderCache:
+    """
+    PDFs de relatório já renderizados, em disco: um arquivo por auditoria,
+    com o hash do conteúdo no nome. Se a auditoria ou o template mudarem, o
+    hash muda e o relatório é gerado de novo (a versão antiga é apagada).
+
+    Acima de `max_entries` arquivos, os menos acessados são removidos.
+    Uma falha de disco só perde aquela gravação: o PDF é servido mesmo assim
+    e a próxima gravação tenta de novo.
+    """
+
+    def __init__(self, directory: str, max_entries: int, enabled: bool = True):
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+        self._disabled = not enabled
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.renders = 0
+        self.evictions = 0
+
+    def _prefix(self, audit_id: str) -> str:
+        return re.sub(r"[^\w-]", "_", audit_id) + "--"
+
+    def _path(self, audit_id: str, digest: str) -> Path:
+        return self.directory / f"{self._prefix(audit_id)}{digest[:32]}.pdf"
+
+    def get(self, audit_id: str, digest: str) -> Optional[bytes]:
+        """PDF em cache para este conteúdo, ou None."""
+        if self._disabled:
+            return None
+        path = self._path(audit_id, digest)
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # marca como acessado (descarte LRU)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, audit_id: str, digest: str, data: bytes) -> None:
+        """Guarda o PDF e apaga versões anteriores do relatório da mesma auditoria."""
+        with self._lock:
+            self.renders += 1
+            if self._disabled:
+                return
+            path = self._path(audit_id, digest)
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                tmp_path.write_bytes(data)
+                os.replace(tmp_path, path)
+                for old in self.directory.glob(f"{self._prefix(audit_id)}*.pdf"):
+                    if old != path:
+                        old.unlink(missing_ok=True)
+                self._evict()
+            except OSError as e:
+                print(f"Erro ao gravar relatório no cache ({self.directory}): {e}")
+                tmp_path.unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        files = []
+        for path in self.directory.glob("*.pdf"):
+            try:
+                files.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue  # removido por outro processo entre o glob e o stat
+        if len(files) <= self.max_entries:
+            return
+        files.sort()
+        for _, old in files[:len(files) - self.max_entries]:
+            old.unlink(missing_ok=True)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": not self._disabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "renders": self.renders,
+                "evictions": self.evictions,
+            }
+
+
+report_cache = ReportRenderCache(REPORT_CACHE_DIR, REPORT_CACHE_MAX_ENTRIES, REPORT_CACHE_ENABLED)
@@ -0,0 +1,183 @@
+import difflib
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass, field
+
+
+# Linhas de rodapé/cabeçalho sem conteúdo clínico (comparadas já normalizadas)
+BOILERPLATE_PATTERNS = tuple(re.compile(pattern) for pattern in (
+    r"^(pagina|pag) \d+( (de|/) \d+)?$",
+    r"^\d+ (de|/) \d+$",
+    r"^(documento|laudo) assinado (digitalmente|eletronicamente).*$",
+    r"^assinado (digitalmente|eletronicamente).*$",
+    # Linha de assinatura/carimbo: só nome, CRM, número e UF (ex.: "Dr. Fulano - CRM/SP 12345");
+    # se houver mais texto na linha, ela é mantida
+    r"^((dr|dra) )?([a-z]+ ){0,6}([-/] )?crm( [-/])?( [a-z]{2})?( [-/])? \d+(( [-/])? [a-z]{2})?$",
+    r"^(medico|medica) (responsavel|radiologista)$",
+    r"^data (de|da) (emissao|impressao|liberacao).*$",
+))
+
+# Divide o laudo em frases/achados: quebras de linha e fim de frase
+# (exceto após abreviações de tratamento, como "Dr.")
+_SEGMENT_SPLIT = re.compile(
+    r"\n+|(?<!\bDr\.)(?<!\bDra\.)(?<!\bSr\.)(?<!\bSra\.)(?<!\bProf\.)"
+    r"(?<=[.;!?])\s+(?=[A-ZÀ-Ý0-9])"
+)
+# Palavras, números (com separador decimal) e símbolos com valor clínico:
+# comparadores ("< 5 mm" != "> 5 mm"), sinais ("HER2: +" != "HER2: -"), % e /
+_TOKEN = re.compile(r"\d+(?:[.,]\d+)*|[a-z]+|[<>=+\-%/±≤≥]")
+# Marcadores de lista no início da linha (não são sinal de menos)
+_BULLET = re.compile(r"^\s*[-•*]\s+")
+# Variantes tipográficas do hífen/menos
+_DASHES = str.maketrans({"−": "-", "–": "-", "—": "-"})
+
+
+def normalize_segment(text: str) -> str:
+    """
+    Forma canônica de um trecho: sem acentos, minúsculo, sem pontuação e com
+    espaços simples. Separadores decimais viram vírgula ("1.2" == "1,2").
+    Comparadores, sinais, % e / são mantidos: mudam o sentido clínico.
+    """
+    text = _BULLET.sub("", text).translate(_DASHES)
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(token.replace(".", ",") for token in _TOKEN.findall(text))
+
+
+def is_boilerplate(normalized: str) -> bool:
+    """True se o trecho (já normalizado) é cabeçalho/rodapé sem conteúdo clínico."""
+    return any(pattern.match(normalized) for pattern in BOILERPLATE_PATTERNS)
+
+
+def split_segments(text: str) -> list[tuple[str, str]]:
+    """
+    Divide o laudo em trechos (frases/achados), descartando os vazios e os
+    de boilerplate. Retorna pares (texto original, texto normalizado).
+    """
+    segments = []
+    for raw in _SEGMENT_SPLIT.split(text or ""):
+        raw = raw.strip()
+        normalized = normalize_segment(raw)
+        if normalized and not is_boilerplate(normalized):
+            segments.append((raw, normalized))
+    return segments
+
+
+@dataclass
+class ReportDiff:
+    """Diferença entre os laudos no nível de frases/achados."""
+    identical: bool
+    official_segments: int
+    auditor_segments: int
+    shared_segments: int
+    changed_ratio: float
+    official_excerpt: str = ""
+    auditor_excerpt: str = ""
+    shared_findings: list[str] = field(default_factory=list)
+
+
+def _excerpt(segments: list[tuple[str, str]], ranges: list[tuple[int, int]], context: int) -> str:
+    """Junta os trechos dos intervalos (mais `context` vizinhos), marcando as lacunas com [...]."""
+    keep = set()
+    for start, end in ranges:
+        keep.update(range(max(0, start - context), min(len(segments), end + context)))
+
+    lines = []
+    previous = -1
+    for index in sorted(keep):
+        if index != previous + 1:
+            lines.append("[...]")
+        lines.append(segments[index][0])
+        previous = index
+    if previous != len(segments) - 1 and segments:
+        lines.append("[...]")
+    return "\n".join(lines)
+
+
+def diff_reports(official_text: str, auditor_text: str, context: int = 1) -> ReportDiff:
+    """
+    Compara os laudos trecho a trecho após a normalização.
+
+    Se forem iguais, `identical` é True. Caso contrário, os excertos trazem só
+    os trechos divergentes de cada laudo, com `context` trechos vizinhos.
+    """
+    official = split_segments(official_text)
+    auditor = split_segments(auditor_text)
+
+    matcher = difflib.SequenceMatcher(
+        None, [s[1] for s in official], [s[1] for s in auditor], autojunk=False
+    )
+    official_ranges, auditor_ranges, shared = [], [], []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            shared.extend(segment[0] for segment in official[i1:i2])
+            continue
+        if i2 > i1:
+            official_ranges.append((i1, i2))
+        if j2 > j1:
+            auditor_ranges.append((j1, j2))
+        # Trecho só de um lado: o vizinho do outro lado dá o contexto da omissão
+        if i2 == i1 and official:
+            official_ranges.append((min(i1, len(official) - 1), min(i1, len(official) - 1) + 1))
+        if j2 == j1 and auditor:
+            auditor_ranges.append((min(j1, len(auditor) - 1), min(j1, len(auditor) - 1) + 1))
+
+    total = len(official) + len(auditor)
+    identical = bool(official) and not official_ranges and not auditor_ranges
+    return ReportDiff(
+        identical=identical,
+        official_segments=len(official),
+        auditor_segments=len(auditor),
+        shared_segments=len(shared),
+        changed_ratio=round(1 - 2 * len(shared) / total, 3) if total else 1.0,
+        official_excerpt="" if identical else _excerpt(official, official_ranges, context),
+        auditor_excerpt="" if identical else _excerpt(auditor, auditor_ranges, context),
+        shared_findings=shared,
+    )
+
+
+def identical_analysis(diff: ReportDiff) -> dict:
+    """Análise de CONCORDÂNCIA TOTAL para laudos iguais após a normalização (sem LLM)."""
+    return {
+        "classification": "CONCORDÂNCIA TOTAL",
+        "summary": (
+            "Os laudos têm o mesmo conteúdo; diferem no máximo em formatação, "
+            "acentuação, maiúsculas ou textos padrão (cabeçalho, rodapé, assinatura)."
+        ),
+        "concordant_findings": diff.shared_findings,
+        "discrepancies": [],
+        "has_critical_alert": False,
+        "critical_alert_text": None,
+        "technical_note": "Comparação determinística: laudos idênticos após normalização.",
+    }
+
+
+class DiffStats:
+    """Contadores de economia do diff determinístico."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.comparisons = 0
+        self.short_circuited = 0
+        self.excerpted = 0
+        self.tokens_saved = 0
+
+    def record(self, short_circuited: bool = False, excerpted: bool = False, tokens_saved: int = 0) -> None:
+        with self._lock:
+            self.comparisons += 1
+            self.short_circuited += short_circuited
+            self.excerpted += excerpted
+            self.tokens_saved += max(0, tokens_saved)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "comparisons": self.comparisons,
+                "llm_calls_saved": self.short_circuited,
+                "excerpted": self.excerpted,
+                "tokens_saved": self.tokens_saved,
+            }
+
+
+diff_stats = DiffStats()
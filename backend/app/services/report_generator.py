@@ -1,5 +1,6 @@
 import io
-from datetime import datetime
+import json
+from datetime import datetime, timezone
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -10,6 +11,20 @@ from reportlab.platypus import (
 )
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
 
+from app.services.cache import content_hash
+
+
+# Versão do layout do relatório: altere ao mudar o template para invalidar
+# os PDFs já renderizados em cache
+REPORT_TEMPLATE_VERSION = "2"
+
+# Campos da auditoria que aparecem no relatório
+REPORT_FIELDS = (
+    "patient_name", "exam_type", "exam_date", "classification", "analysis_summary",
+    "has_critical_alert", "critical_alert_text", "concordant_findings",
+    "discrepancies", "technical_note",
+)
+
 
 # Cores do sistema
 COLOR_GREEN = colors.HexColor("#27ae60")
@@ -21,42 +36,30 @@ COLOR_LIGHT_GRAY = colors.HexColor("#f5f5f5")
 COLOR_DARK_GRAY = colors.HexColor("#333333")
 
 
-def get_classification_color(classification: str) -> colors.Color:
-    """Retorna a cor baseada na classificação."""
-    mapping = {
-        "CONCORDÂNCIA TOTAL": COLOR_GREEN,
-        "CONCORDÂNCIA PARCIAL": COLOR_YELLOW,
-        "DISCORDÂNCIA": COLOR_RED
-    }
-    return mapping.get(classification, colors.gray)
+CLASSIFICATION_COLORS = {
+    "CONCORDÂNCIA TOTAL": COLOR_GREEN,
+    "CONCORDÂNCIA PARCIAL": COLOR_YELLOW,
+    "DISCORDÂNCIA": COLOR_RED
+}
 
+SEVERITY_COLORS = {
+    "baixa": COLOR_LIGHT_GRAY,
+    "média": colors.HexColor("#fff3e0"),
+    "alta": colors.HexColor("#fff8e1"),
+    "crítica": colors.HexColor("#ffebee")
+}
 
-def generate_report_pdf(audit_data: dict) -> bytes:
-    """
-    Gera o PDF do relatório de auditoria.
 
-    Args:
-        audit_data: Dicionário com todos os dados da auditoria
+def get_classification_color(classification: str) -> colors.Color:
+    """Retorna a cor baseada na classificação."""
+    return CLASSIFICATION_COLORS.get(classification, colors.gray)
 
-    Returns:
-        Bytes do PDF gerado
-    """
-    buffer = io.BytesIO()
 
-    # Configuração do documento
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=2*cm,
-        leftMargin=2*cm,
-        topMargin=2*cm,
-        bottomMargin=2*cm
-    )
-
-    # Estilos
+# Estilos e templates de tabela, montados uma vez na importação do módulo
+# (só são lidos durante a geração, então podem ser compartilhados)
+def _build_styles():
     styles = getSampleStyleSheet()
 
-    # Estilos customizados
     styles.add(ParagraphStyle(
         name='MainTitle',
         parent=styles['Heading1'],
@@ -90,6 +93,137 @@ def generate_report_pdf(audit_data: dict) -> bytes:
         textColor=colors.gray
     ))
 
+    return styles
+
+
+STYLES = _build_styles()
+
+PATIENT_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+])
+
+
+def _status_table_style(status_color: colors.Color) -> TableStyle:
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), status_color),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.white),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 14),
+        ('PADDING', (0, 0), (-1, -1), 15),
+        ('ROUNDEDCORNERS', [5, 5, 5, 5]),
+    ])
+
+
+STATUS_TABLE_STYLES = {
+    classification: _status_table_style(color)
+    for classification, color in CLASSIFICATION_COLORS.items()
+}
+DEFAULT_STATUS_TABLE_STYLE = _status_table_style(colors.gray)
+
+ALERT_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), COLOR_RED),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor("#ffebee")),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('TEXTCOLOR', (0, 1), (-1, -1), COLOR_RED),
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ('PADDING', (0, 0), (-1, -1), 10),
+    ('BOX', (0, 0), (-1, -1), 2, COLOR_RED),
+])
+
+
+def _discrepancy_table_style(bg_color: colors.Color) -> TableStyle:
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), COLOR_BLUE),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('BACKGROUND', (0, 1), (-1, -1), bg_color),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, 2), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('PADDING', (0, 0), (-1, -1), 8),
+        ('BOX', (0, 0), (-1, -1), 1, COLOR_BLUE),
+        ('SPAN', (0, 2), (-1, 2)),
+        ('SPAN', (0, 3), (-1, 3)),
+        ('SPAN', (0, 4), (-1, 4)),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ])
+
+
+DISCREPANCY_TABLE_STYLES = {
+    severity: _discrepancy_table_style(color) for severity, color in SEVERITY_COLORS.items()
+}
+DEFAULT_DISCREPANCY_TABLE_STYLE = DISCREPANCY_TABLE_STYLES["baixa"]
+
+NOTE_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, -1), COLOR_LIGHT_GRAY),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Oblique'),
+    ('PADDING', (0, 0), (-1, -1), 10),
+])
+
+FOOTER_TEXT = """
+    <font size="8" color="gray">
+    Este relatório foi gerado automaticamente pelo sistema ELO System - LaudoSync.<br/>
+    A análise comparativa é realizada por inteligência artificial e deve ser validada por um médico qualificado.<br/>
+    Este documento não substitui a avaliação médica profissional.
+    </font>
+    """
+
+
+def report_content_hash(audit_data: dict) -> str:
+    """Hash do conteúdo do relatório (campos exibidos + versão do template)."""
+    content = json.dumps(
+        {field: audit_data.get(field) for field in REPORT_FIELDS},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return content_hash(REPORT_TEMPLATE_VERSION, content)
+
+
+def _report_datetime(audit_data: dict) -> datetime:
+    """Data da auditoria (created_at), para que o mesmo conteúdo gere sempre o mesmo PDF."""
+    created_at = audit_data.get("created_at")
+    if created_at:
+        try:
+            moment = datetime.fromisoformat(str(created_at).replace("Z", "+00:00"))
+        except ValueError:
+            return datetime.now()
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)  # save_audit grava em UTC
+        return moment.astimezone()
+    return datetime.now()
+
+
+def generate_report_pdf(audit_data: dict) -> bytes:
+    """
+    Gera o PDF do relatório de auditoria.
+
+    Args:
+        audit_data: Dicionário com todos os dados da auditoria
+
+    Returns:
+        Bytes do PDF gerado
+    """
+    buffer = io.BytesIO()
+
+    # Configuração do documento
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=2*cm,
+        leftMargin=2*cm,
+        topMargin=2*cm,
+        bottomMargin=2*cm,
+        invariant=True  # sem data de criação/ID aleatório: mesmo conteúdo, mesmos bytes
+    )
+
+    styles = STYLES
+
     # Elementos do documento
     elements = []
 
@@ -102,7 +236,7 @@ def generate_report_pdf(audit_data: dict) -> bytes:
 
     # Data do relatório
     elements.append(Paragraph(
-        f"Gerado em: {datetime.now().strftime('%d/%m/%Y às %H:%M')}",
+        f"Gerado em: {_report_datetime(audit_data).strftime('%d/%m/%Y às %H:%M')}",
         styles['SmallText']
     ))
     elements.append(Spacer(1, 0.5*cm))
@@ -117,18 +251,12 @@ def generate_report_pdf(audit_data: dict) -> bytes:
     ]
 
     patient_table = Table(patient_data, colWidths=[4*cm, 12*cm])
-    patient_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-    ]))
+    patient_table.setStyle(PATIENT_TABLE_STYLE)
     elements.append(patient_table)
     elements.append(Spacer(1, 0.5*cm))
 
     # Status da classificação (destaque)
     classification = audit_data.get("classification", "")
-    status_color = get_classification_color(classification)
 
     elements.append(Paragraph("Resultado da Análise", styles['SectionTitle']))
 
@@ -136,15 +264,9 @@ def generate_report_pdf(audit_data: dict) -> bytes:
         [[classification]],
         colWidths=[16*cm]
     )
-    status_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), status_color),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 14),
-        ('PADDING', (0, 0), (-1, -1), 15),
-        ('ROUNDEDCORNERS', [5, 5, 5, 5]),
-    ]))
+    status_table.setStyle(
+        STATUS_TABLE_STYLES.get(classification, DEFAULT_STATUS_TABLE_STYLE)
+    )
     elements.append(status_table)
     elements.append(Spacer(1, 0.5*cm))
 
@@ -164,18 +286,7 @@ def generate_report_pdf(audit_data: dict) -> bytes:
             [["⚠️ ALERTA CRÍTICO"], [alert_text]],
             colWidths=[16*cm]
         )
-        alert_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), COLOR_RED),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor("#ffebee")),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('TEXTCOLOR', (0, 1), (-1, -1), COLOR_RED),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('FONTSIZE', (0, 1), (-1, -1), 10),
-            ('PADDING', (0, 0), (-1, -1), 10),
-            ('BOX', (0, 0), (-1, -1), 2, COLOR_RED),
-        ]))
+        alert_table.setStyle(ALERT_TABLE_STYLE)
         elements.append(alert_table)
         elements.append(Spacer(1, 0.5*cm))
 
@@ -196,37 +307,19 @@ def generate_report_pdf(audit_data: dict) -> bytes:
 
         for i, disc in enumerate(discrepancies, 1):
             severity = disc.get("severity", "baixa")
-            severity_colors = {
-                "baixa": COLOR_LIGHT_GRAY,
-                "média": colors.HexColor("#fff3e0"),
-                "alta": colors.HexColor("#fff8e1"),
-                "crítica": colors.HexColor("#ffebee")
-            }
-            bg_color = severity_colors.get(severity, COLOR_LIGHT_GRAY)
 
             disc_data = [
                 [f"Discrepância #{i}", f"Severidade: {severity.upper()}"],
-                [f"Tipo: {disc.get('type', 'N/A')}", ""],
+                [f"Tipo: {disc.get('type') or 'N/A'}", ""],
                 ["Descrição:", disc.get("description", "")],
                 ["Laudo Oficial diz:", disc.get("official_says", "N/A")],
                 ["Laudo Auditor diz:", disc.get("auditor_says", "N/A")],
             ]
 
             disc_table = Table(disc_data, colWidths=[8*cm, 8*cm])
-            disc_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), COLOR_BLUE),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('BACKGROUND', (0, 1), (-1, -1), bg_color),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTNAME', (0, 2), (0, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('PADDING', (0, 0), (-1, -1), 8),
-                ('BOX', (0, 0), (-1, -1), 1, COLOR_BLUE),
-                ('SPAN', (0, 2), (-1, 2)),
-                ('SPAN', (0, 3), (-1, 3)),
-                ('SPAN', (0, 4), (-1, 4)),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ]))
+            disc_table.setStyle(
+                DISCREPANCY_TABLE_STYLES.get(severity, DEFAULT_DISCREPANCY_TABLE_STYLE)
+            )
             elements.append(disc_table)
             elements.append(Spacer(1, 0.3*cm))
 
@@ -236,12 +329,7 @@ def generate_report_pdf(audit_data: dict) -> bytes:
         elements.append(Paragraph("Nota Técnica", styles['SectionTitle']))
 
         note_table = Table([[technical_note]], colWidths=[16*cm])
-        note_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), COLOR_LIGHT_GRAY),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Oblique'),
-            ('PADDING', (0, 0), (-1, -1), 10),
-        ]))
+        note_table.setStyle(NOTE_TABLE_STYLE)
         elements.append(note_table)
         elements.append(Spacer(1, 0.5*cm))
 
@@ -250,14 +338,7 @@ def generate_report_pdf(audit_data: dict) -> bytes:
     elements.append(HRFlowable(width="100%", thickness=1, color=colors.gray))
     elements.append(Spacer(1, 0.3*cm))
 
-    footer_text = """
-    <font size="8" color="gray">
-    Este relatório foi gerado automaticamente pelo sistema ELO System - LaudoSync.<br/>
-    A análise comparativa é realizada por inteligência artificial e deve ser validada por um médico qualificado.<br/>
-    Este documento não substitui a avaliação médica profissional.
-    </font>
-    """
-    elements.append(Paragraph(footer_text, styles['Normal']))
+    elements.append(Paragraph(FOOTER_TEXT, styles['Normal']))
 
     # Gera o PDF
     doc.build(elements)
@@ -1,13 +1,124 @@
+import base64
+import copy
+import hashlib
+import json
+import re
+import threading
 import uuid
-from datetime import datetime
+from datetime import date, datetime, time, timedelta
 from typing import Optional
+from zoneinfo import ZoneInfo
 from supabase import create_client, Client
-from app.config import SUPABASE_URL, SUPABASE_KEY, STORAGE_BUCKET
+from app.config import (
+    SUPABASE_URL, SUPABASE_KEY, SUPABASE_SERVICE_KEY, STORAGE_BUCKET,
+    AUDIT_CACHE_ENABLED, AUDIT_CACHE_ENTRIES, AUDIT_CACHE_TTL
+)
+from app.services.cache import LRUCache
+from app.services.metrics import timed
+
+
+# Colunas da listagem de auditorias (sem os textos e o JSON da análise)
+AUDIT_LIST_FIELDS = (
+    "id", "patient_name", "exam_type", "classification", "has_critical_alert", "created_at",
+)
+
+# Colunas que podem ser pedidas na listagem
+AUDIT_FIELDS = (
+    "id", "patient_name", "exam_type", "exam_date", "official_pdf_url", "auditor_pdf_url",
+    "official_text_hash", "auditor_text_hash", "classification", "analysis_summary",
+    "concordant_findings", "discrepancies", "has_critical_alert", "critical_alert_text",
+    "technical_note", "report_pdf_url", "report_status", "input_tokens", "output_tokens",
+    "created_at",
+)
+
+
+# Fuso dos filtros por data: um dia vai da meia-noite à meia-noite de São Paulo
+# (o mesmo usado pela view audit_daily_stats, migration 005)
+FILTER_TIMEZONE = ZoneInfo("America/Sao_Paulo")
+
+# Textos extraídos dos laudos: ficam em audit_texts (migration 007), fora da
+# linha da auditoria, e só são buscados quando pedidos
+TEXT_FIELDS = ("official_text", "auditor_text")
+
+
+# Cache curto das auditorias lidas por id (detalhe e download do relatório,
+# consultados várias vezes logo após a criação): preenchido no save_audit e
+# invalidado no update_audit
+audit_cache = LRUCache(AUDIT_CACHE_ENTRIES, ttl=AUDIT_CACHE_TTL) if AUDIT_CACHE_ENABLED else None
+
+# Geração das invalidações: uma leitura que começou antes de um update_audit
+# não grava no cache a linha que leu (pode ser a versão anterior ao update)
+_audit_generation = 0
+_audit_generation_lock = threading.Lock()
+
+
+def _cache_audit(row: dict, generation: Optional[int] = None) -> None:
+    """Guarda a linha no cache; com `generation`, só se nada foi invalidado desde a leitura."""
+    if audit_cache is None:
+        return
+    with _audit_generation_lock:
+        if generation is None or generation == _audit_generation:
+            audit_cache.set(row["id"], {field: row.get(field) for field in AUDIT_FIELDS})
+
+
+def _invalidate_audit(audit_id: str) -> None:
+    global _audit_generation
+    if audit_cache is None:
+        return
+    with _audit_generation_lock:
+        _audit_generation += 1
+        audit_cache.delete(audit_id)
+
+
+def _cached_audit(audit_id: str) -> Optional[dict]:
+    """Cópia da auditoria em cache (quem chama pode alterá-la), ou None."""
+    if audit_cache is None:
+        return None
+    audit = audit_cache.get(audit_id)
+    return copy.deepcopy(audit) if audit is not None else None
+
+
+def audit_cache_stats() -> dict:
+    if audit_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **audit_cache.stats()}
+
+
+# Cliente único, reutilizado entre requisições (mantém o pool HTTP e a autenticação)
+_client: Optional[Client] = None
+_service_client: Optional[Client] = None
+_client_lock = threading.Lock()
+
+
+def init_supabase_client() -> Optional[Client]:
+    """Cria o cliente compartilhado (chamado no startup da aplicação)."""
+    try:
+        return get_supabase_client()
+    except Exception as e:
+        print(f"Erro ao inicializar cliente Supabase: {e}")
+        return None
 
 
 def get_supabase_client() -> Client:
-    """Retorna uma instância do cliente Supabase."""
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
+    """Retorna o cliente Supabase compartilhado, criando-o na primeira chamada."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    return _client
+
+
+def _get_service_client() -> Client:
+    """Cliente com a chave service_role (se configurada); senão, o compartilhado."""
+    global _service_client
+    if not SUPABASE_SERVICE_KEY:
+        return get_supabase_client()
+    if _service_client is None:
+        with _client_lock:
+            if _service_client is None:
+                _service_client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+    return _service_client
 
 
 def upload_pdf_to_storage(
@@ -26,18 +137,19 @@ def upload_pdf_to_storage(
     Returns:
         URL pública do arquivo ou None em caso de erro
     """
-    client = get_supabase_client()
-
     # Gera nome único para evitar colisões
     unique_filename = f"{folder}/{uuid.uuid4()}_{filename}"
 
     try:
+        client = get_supabase_client()
+
         # Upload do arquivo
-        result = client.storage.from_(STORAGE_BUCKET).upload(
-            unique_filename,
-            pdf_bytes,
-            file_options={"content-type": "application/pdf"}
-        )
+        with timed("supabase.storage.upload"):
+            result = client.storage.from_(STORAGE_BUCKET).upload(
+                unique_filename,
+                pdf_bytes,
+                file_options={"content-type": "application/pdf"}
+            )
 
         # Gera URL pública
         public_url = client.storage.from_(STORAGE_BUCKET).get_public_url(unique_filename)
@@ -58,8 +170,6 @@ def save_audit(audit_data: dict) -> Optional[dict]:
     Returns:
         Registro salvo ou None em caso de erro
     """
-    client = get_supabase_client()
-
     # Prepara os dados
     record = {
         "id": str(uuid.uuid4()),
@@ -68,8 +178,8 @@ def save_audit(audit_data: dict) -> Optional[dict]:
         "exam_date": audit_data.get("exam_date"),
         "official_pdf_url": audit_data.get("official_pdf_url"),
         "auditor_pdf_url": audit_data.get("auditor_pdf_url"),
-        "official_text": audit_data.get("official_text", ""),
-        "auditor_text": audit_data.get("auditor_text", ""),
+        "official_text_hash": text_hash(audit_data.get("official_text", "")),
+        "auditor_text_hash": text_hash(audit_data.get("auditor_text", "")),
         "classification": audit_data.get("classification"),
         "analysis_summary": audit_data.get("analysis_summary"),
         "concordant_findings": audit_data.get("concordant_findings", []),
@@ -78,59 +188,391 @@ def save_audit(audit_data: dict) -> Optional[dict]:
         "critical_alert_text": audit_data.get("critical_alert_text"),
         "technical_note": audit_data.get("technical_note"),
         "report_pdf_url": audit_data.get("report_pdf_url"),
+        "report_status": audit_data.get("report_status", "ready"),
+        "input_tokens": audit_data.get("input_tokens"),
+        "output_tokens": audit_data.get("output_tokens"),
         "created_at": datetime.utcnow().isoformat(),
     }
 
     try:
-        result = client.table("audits").insert(record).execute()
-        return result.data[0] if result.data else None
+        client = get_supabase_client()
+        _save_texts(client, [audit_data.get(field, "") for field in TEXT_FIELDS])
+        with timed("supabase.audits.insert"):
+            result = client.table("audits").insert(record).execute()
     except Exception as e:
         print(f"Erro ao salvar auditoria: {e}")
         return None
 
+    _insert_discrepancies(client, record)
+    if not result.data:
+        return None
+    _cache_audit(result.data[0])
+    return result.data[0]
 
-def get_audit(audit_id: str) -> Optional[dict]:
+
+def text_hash(text: str) -> str:
+    """Chave do texto em audit_texts: SHA-256 (hex) do texto em UTF-8."""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def _save_texts(client: Client, texts: list[str]) -> None:
+    """
+    Grava os textos em audit_texts, um insert só; textos já existentes (ex.:
+    o mesmo laudo oficial em várias auditorias) não são regravados.
+    """
+    rows = {text_hash(text): {"hash": text_hash(text), "content": text or ""} for text in texts}
+    with timed("supabase.audit_texts.upsert"):
+        client.table("audit_texts").upsert(
+            list(rows.values()), on_conflict="hash", ignore_duplicates=True, returning="minimal"
+        ).execute()
+
+
+def _insert_discrepancies(client: Client, record: dict) -> None:
+    """
+    Grava as discrepâncias da auditoria em audit_discrepancies (uma linha
+    cada, num único insert). O JSON em audits.discrepancies continua sendo
+    a fonte: se falhar aqui, a auditoria fica salva e o erro só é logado.
+    """
+    rows = [
+        {
+            "audit_id": record["id"],
+            "position": position,
+            "type": discrepancy.get("type"),
+            "severity": discrepancy.get("severity"),
+            "description": discrepancy.get("description"),
+            "official_says": discrepancy.get("official_says"),
+            "auditor_says": discrepancy.get("auditor_says"),
+            "exam_type": record["exam_type"],
+            "created_at": record["created_at"],
+        }
+        for position, discrepancy in enumerate(record["discrepancies"] or [])
+        if isinstance(discrepancy, dict)
+    ]
+    if not rows:
+        return
+    try:
+        with timed("supabase.audit_discrepancies.insert"):
+            client.table("audit_discrepancies").insert(rows, returning="minimal").execute()
+    except Exception as e:
+        print(f"Erro ao salvar discrepâncias da auditoria {record['id']}: {e}")
+
+
+def update_audit(audit_id: str, fields: dict) -> Optional[dict]:
+    """
+    Atualiza campos de uma auditoria (ex.: URL do relatório gerado em background).
+
+    Args:
+        audit_id: UUID da auditoria
+        fields: Colunas e novos valores
+
+    Returns:
+        Registro atualizado ou None em caso de erro
+    """
+    try:
+        client = get_supabase_client()
+        with timed("supabase.audits.update"):
+            result = client.table("audits").update(fields).eq("id", audit_id).execute()
+        return result.data[0] if result.data else None
+    except Exception as e:
+        print(f"Erro ao atualizar auditoria: {e}")
+        return None
+    finally:
+        # Mesmo se a atualização falhar, a linha pode ter mudado
+        _invalidate_audit(audit_id)
+
+
+def get_audit(audit_id: str, include_texts: bool = False) -> Optional[dict]:
     """
     Busca uma auditoria pelo ID.
 
     Args:
         audit_id: UUID da auditoria
+        include_texts: Inclui official_text e auditor_text (consulta extra)
 
     Returns:
         Dados da auditoria ou None se não encontrada
     """
-    client = get_supabase_client()
+    audit = _cached_audit(audit_id)
+    if audit is not None and not include_texts:
+        return audit
 
+    generation = _audit_generation
     try:
-        result = client.table("audits").select("*").eq("id", audit_id).execute()
-        return result.data[0] if result.data else None
+        client = get_supabase_client()
+        if audit is None:
+            with timed("supabase.audits.get"):
+                # Colunas explícitas: fica de fora a search_vector (só para busca)
+                result = client.table("audits").select(",".join(AUDIT_FIELDS)).eq("id", audit_id).execute()
+            if not result.data:
+                return None
+            audit = result.data[0]
+            _cache_audit(audit, generation)
+    except Exception as e:
+        print(f"Erro ao buscar auditoria: {e}")
+        return None
+
+    if include_texts:
+        audit.update(_load_texts(client, audit))
+    return audit
+
+
+def get_audit_texts(audit_id: str) -> Optional[dict]:
+    """
+    Textos extraídos dos laudos de uma auditoria.
+
+    Returns:
+        {"official_text", "auditor_text"} ou None se a auditoria não existir
+    """
+    audit = _cached_audit(audit_id)
+    try:
+        client = get_supabase_client()
+        if audit is None:
+            with timed("supabase.audits.get"):
+                result = (
+                    client.table("audits")
+                    .select("official_text_hash,auditor_text_hash")
+                    .eq("id", audit_id)
+                    .execute()
+                )
+            if not result.data:
+                return None
+            audit = result.data[0]
     except Exception as e:
         print(f"Erro ao buscar auditoria: {e}")
         return None
+    return _load_texts(client, audit)
+
+
+def _load_texts(client: Client, audit: dict) -> dict:
+    """Busca em audit_texts os textos referenciados pela auditoria."""
+    hashes = {field: audit.get(f"{field}_hash") for field in TEXT_FIELDS}
+    wanted = sorted({value for value in hashes.values() if value})
+    contents = {}
+    if wanted:
+        try:
+            with timed("supabase.audit_texts.get"):
+                result = client.table("audit_texts").select("hash,content").in_("hash", wanted).execute()
+            contents = {row["hash"]: row["content"] for row in result.data or []}
+        except Exception as e:
+            print(f"Erro ao buscar textos da auditoria: {e}")
+    return {field: contents.get(value) for field, value in hashes.items()}
+
+
+def encode_cursor(audit: dict) -> str:
+    """Cursor opaco da próxima página: (created_at, id) do último registro."""
+    payload = json.dumps([audit["created_at"], audit["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """
+    Decodifica um cursor de encode_cursor.
+
+    Raises:
+        ValueError: cursor inválido
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, audit_id = json.loads(base64.urlsafe_b64decode(padded))
+        datetime.fromisoformat(created_at)
+        uuid.UUID(audit_id)
+    except Exception as e:
+        raise ValueError("Cursor inválido") from e
+    return created_at, audit_id
+
+
+def _day_start(day: date) -> str:
+    """Início do dia no fuso dos filtros, como timestamp com offset (ex.: 2026-01-02T00:00:00-03:00)."""
+    return datetime.combine(day, time.min, tzinfo=FILTER_TIMEZONE).isoformat()
+
+
+def _date_bounds(filters: dict) -> tuple[Optional[str], Optional[str]]:
+    """Limites de created_at para date_from/date_to: [início de date_from, início do dia após date_to)."""
+    start = _day_start(filters["date_from"]) if filters.get("date_from") else None
+    # Data final inclusiva
+    end = _day_start(filters["date_to"] + timedelta(days=1)) if filters.get("date_to") else None
+    return start, end
+
+
+def _apply_filters(query, filters: dict):
+    """Aplica os filtros da listagem (ver list_audits) à query do PostgREST."""
+    if filters.get("classification"):
+        query = query.eq("classification", filters["classification"])
+    if filters.get("exam_type"):
+        query = query.eq("exam_type", filters["exam_type"])
+    if filters.get("has_critical_alert") is not None:
+        query = query.eq("has_critical_alert", filters["has_critical_alert"])
+    start, end = _date_bounds(filters)
+    if start:
+        query = query.gte("created_at", start)
+    if end:
+        query = query.lt("created_at", end)
+    if filters.get("patient"):
+        # Busca por trecho do nome (índice trigram); curingas do usuário são removidos
+        pattern = re.sub(r"[%_*]", "", filters["patient"]).strip()
+        if pattern:
+            query = query.ilike("patient_name", f"%{pattern}%")
+    if filters.get("search"):
+        # Busca textual em nome, resumo e laudos (search_vector, migrations 005 e 007)
+        query = query.filter("search_vector", "wfts(portuguese)", filters["search"])
+    return query
 
 
-def list_audits(limit: int = 50, offset: int = 0) -> list:
+def list_audits(
+    limit: int = 50,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    fields: Optional[list[str]] = None,
+    filters: Optional[dict] = None
+) -> tuple[list, Optional[str]]:
     """
-    Lista auditorias com paginação.
+    Lista auditorias, das mais recentes para as mais antigas.
+
+    A paginação é por keyset em (created_at, id): passe o `next_cursor` da
+    página anterior em `cursor`. `offset` continua aceito para clientes
+    antigos, mas fica mais lento quanto mais fundo a página.
 
     Args:
         limit: Número máximo de registros
-        offset: Offset para paginação
+        offset: Offset para paginação (ignorado se houver cursor)
+        cursor: Cursor da página anterior
+        fields: Colunas a retornar (padrão: AUDIT_LIST_FIELDS); id e
+            created_at são sempre incluídos
+        filters: classification, exam_type, has_critical_alert,
+            date_from/date_to (date, sobre created_at), patient (trecho do
+            nome) e search (busca textual)
 
     Returns:
-        Lista de auditorias
+        (lista de auditorias, cursor da próxima página ou None)
+
+    Raises:
+        ValueError: cursor inválido
     """
-    client = get_supabase_client()
+    columns = list(dict.fromkeys(["id", "created_at", *(fields or AUDIT_LIST_FIELDS)]))
+    after = decode_cursor(cursor) if cursor else None
 
     try:
-        result = (
-            client.table("audits")
-            .select("*")
-            .order("created_at", desc=True)
-            .range(offset, offset + limit - 1)
-            .execute()
-        )
-        return result.data or []
+        client = get_supabase_client()
+        query = _apply_filters(client.table("audits").select(",".join(columns)), filters or {})
+        if after:
+            created_at, audit_id = after
+            query = query.or_(
+                f'created_at.lt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.lt.{audit_id})'
+            )
+        query = query.order("created_at", desc=True).order("id", desc=True)
+        # Um registro a mais indica se existe próxima página
+        if after or not offset:
+            query = query.limit(limit + 1)
+        else:
+            query = query.range(offset, offset + limit)
+        with timed("supabase.audits.list"):
+            result = query.execute()
     except Exception as e:
         print(f"Erro ao listar auditorias: {e}")
-        return []
+        return [], None
+
+    audits = result.data or []
+    next_cursor = encode_cursor(audits[limit - 1]) if len(audits) > limit else None
+    return audits[:limit], next_cursor
+
+
+def refresh_audit_daily_stats() -> bool:
+    """
+    Atualiza a view materializada audit_daily_stats (migration 005).
+    Desde a migration 008, só service_role pode executar a função.
+    """
+    try:
+        client = _get_service_client()
+        with timed("supabase.audit_daily_stats.refresh"):
+            client.rpc("refresh_audit_daily_stats").execute()
+        return True
+    except Exception as e:
+        print(f"Erro ao atualizar estatísticas de auditorias: {e}")
+        return False
+
+
+def list_audit_daily_stats(since: date) -> Optional[list]:
+    """
+    Linhas de audit_daily_stats a partir de `since`: uma por dia,
+    classificação e tipo de exame. None em caso de erro.
+    """
+    try:
+        client = get_supabase_client()
+        with timed("supabase.audit_daily_stats.list"):
+            result = (
+                client.table("audit_daily_stats")
+                .select("*")
+                .gte("day", since.isoformat())
+                .order("day")
+                .execute()
+            )
+        return result.data or []
+    except Exception as e:
+        print(f"Erro ao buscar estatísticas de auditorias: {e}")
+        return None
+
+
+def list_discrepancies(
+    limit: int = 50,
+    cursor: Optional[int] = None,
+    filters: Optional[dict] = None
+) -> tuple[list, Optional[int]]:
+    """
+    Lista discrepâncias (audit_discrepancies), das mais recentes para as mais antigas.
+
+    Args:
+        limit: Número máximo de registros
+        cursor: `next_cursor` da página anterior
+        filters: severity, type, exam_type e date_from/date_to (date)
+
+    Returns:
+        (lista de discrepâncias, cursor da próxima página ou None)
+    """
+    filters = filters or {}
+    try:
+        client = get_supabase_client()
+        query = client.table("audit_discrepancies").select("*")
+        for field in ("severity", "type", "exam_type"):
+            if filters.get(field):
+                query = query.eq(field, filters[field])
+        start, end = _date_bounds(filters)
+        if start:
+            query = query.gte("created_at", start)
+        if end:
+            query = query.lt("created_at", end)
+        if cursor is not None:
+            query = query.lt("id", cursor)
+        with timed("supabase.audit_discrepancies.list"):
+            result = query.order("id", desc=True).limit(limit + 1).execute()
+    except Exception as e:
+        print(f"Erro ao listar discrepâncias: {e}")
+        return [], None
+
+    rows = result.data or []
+    next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def count_discrepancies(filters: Optional[dict] = None) -> Optional[list]:
+    """
+    Contagem de discrepâncias por tipo de exame, tipo e severidade
+    (função discrepancy_counts, migration 006). None em caso de erro.
+    """
+    filters = filters or {}
+    start, end = _date_bounds(filters)
+    params = {
+        "p_date_from": start,
+        "p_date_to": end,
+        "p_severity": filters.get("severity"),
+        "p_type": filters.get("type"),
+        "p_exam_type": filters.get("exam_type"),
+    }
+    try:
+        client = get_supabase_client()
+        with timed("supabase.audit_discrepancies.count"):
+            result = client.rpc("discrepancy_counts", params).execute()
+        return result.data or []
+    except Exception as e:
+        print(f"Erro ao contar discrepâncias: {e}")
+        return None
@@ -0,0 +1,167 @@
+import math
+import re
+from typing import Optional
+
+from app.services.report_diff import is_boilerplate, normalize_segment
+
+
+# Linhas de contato/endereço da clínica (comparadas já normalizadas)
+CONTACT_PATTERNS = tuple(re.compile(pattern) for pattern in (
+    r".*\b(tel|telefone|fone|fax|whatsapp|cnpj|cep)\b.*\d",
+    r".*\b(www|http|https)\b",
+))
+
+# Títulos de seção e prioridade no corte por orçamento de tokens:
+# 2 = cortada primeiro, 1 = depois, 0 = só em último caso
+SECTION_PRIORITIES = {
+    "impressao": 0, "impressao diagnostica": 0, "conclusao": 0, "opiniao": 0,
+    "diagnostico": 0,
+    "relatorio": 1, "achados": 1, "descricao": 1, "analise": 1, "resultado": 1,
+    "tecnica": 2, "metodo": 2, "indicacao": 2, "indicacao clinica": 2,
+    "informacoes clinicas": 2, "historia clinica": 2, "dados clinicos": 2,
+    "comparacao": 2, "observacao": 2, "observacoes": 2,
+}
+DEFAULT_SECTION_PRIORITY = 1
+
+# Quantas linhas no topo/base de cada página podem ser cabeçalho/rodapé
+PAGE_EDGE_LINES = 3
+
+TRUNCATION_MARKER = "[... trecho omitido por limite de tokens ...]"
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa rápida de tokens (~4 caracteres por token em português)."""
+    return len(text) // 4 + 1
+
+
+def _furniture_key(line: str) -> str:
+    # Números variam entre páginas ("Página 1", "Página 2")
+    return re.sub(r"\d+", "#", normalize_segment(line))
+
+
+def remove_page_furniture(pages: list[str]) -> list[str]:
+    """
+    Remove cabeçalhos e rodapés repetidos: linhas do topo/base da página que
+    se repetem (a menos dos números) em pelo menos metade das páginas.
+    """
+    if len(pages) < 2:
+        return pages
+
+    page_lines = [[line for line in page.splitlines() if line.strip()] for page in pages]
+    counts: dict[str, int] = {}
+    for lines in page_lines:
+        edges = lines[:PAGE_EDGE_LINES] + lines[-PAGE_EDGE_LINES:]
+        for key in {_furniture_key(line) for line in edges}:
+            counts[key] = counts.get(key, 0) + 1
+
+    threshold = max(2, math.ceil(len(pages) / 2))
+    furniture = {key for key, count in counts.items() if key and count >= threshold}
+    if not furniture:
+        return pages
+
+    cleaned = []
+    for lines in page_lines:
+        last = len(lines) - PAGE_EDGE_LINES
+        cleaned.append("\n".join(
+            line for index, line in enumerate(lines)
+            if not ((index < PAGE_EDGE_LINES or index >= last) and _furniture_key(line) in furniture)
+        ))
+    return cleaned
+
+
+def remove_boilerplate(text: str) -> str:
+    """Remove linhas sem conteúdo clínico (paginação, assinatura, contato da clínica)."""
+    lines = []
+    for line in text.splitlines():
+        normalized = normalize_segment(line)
+        if not normalized:
+            continue
+        if is_boilerplate(normalized) or "@" in line:
+            continue
+        if any(pattern.match(normalized) for pattern in CONTACT_PATTERNS):
+            continue
+        lines.append(line.strip())
+    return "\n".join(lines)
+
+
+def prepare_report_text(text: str, pages: Optional[list[str]] = None) -> str:
+    """
+    Texto do laudo pronto para o prompt: sem cabeçalhos/rodapés repetidos
+    (quando as páginas são conhecidas) e sem boilerplate.
+    Se a limpeza esvaziar o texto, mantém o original.
+    """
+    if pages:
+        text = "\n".join(page for page in remove_page_furniture(pages) if page)
+    prepared = remove_boilerplate(text)
+    return prepared or text.strip()
+
+
+def _section_priority(line: str) -> Optional[int]:
+    """Prioridade da seção se a linha for um título; None caso contrário."""
+    stripped = line.strip()
+    if not stripped or len(stripped) > 60:
+        return None
+    normalized = normalize_segment(stripped)
+    if normalized in SECTION_PRIORITIES:
+        return SECTION_PRIORITIES[normalized]
+    letters = [c for c in stripped if c.isalpha()]
+    if stripped.endswith(":") or (len(letters) >= 3 and all(c.isupper() for c in letters)):
+        return DEFAULT_SECTION_PRIORITY
+    return None
+
+
+def split_sections(text: str) -> list[dict]:
+    """Divide o laudo em seções: {"priority", "lines", "titled"} (se titled, a 1ª linha é o título)."""
+    sections = [{"priority": DEFAULT_SECTION_PRIORITY, "lines": [], "titled": False}]
+    for line in text.splitlines():
+        priority = _section_priority(line)
+        if priority is not None:
+            sections.append({"priority": priority, "lines": [line], "titled": True})
+        else:
+            sections[-1]["lines"].append(line)
+    return [section for section in sections if section["lines"]]
+
+
+def fit_to_budget(text: str, max_tokens: int) -> tuple[str, bool]:
+    """
+    Limita o texto a `max_tokens` (estimados) cortando linhas do fim das
+    seções menos importantes primeiro (técnica/indicação, depois achados);
+    impressão/conclusão só são cortadas em último caso.
+
+    Returns:
+        (texto, True se houve corte)
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text, False
+
+    sections = split_sections(text)
+    excess = len(text) - max(0, max_tokens - 1) * 4
+
+    for priority in sorted({section["priority"] for section in sections}, reverse=True):
+        candidates = [section for section in sections if section["priority"] == priority]
+        for section in sorted(candidates, key=lambda s: -sum(len(line) for line in s["lines"])):
+            lines = section["lines"]
+            keep = 1 if section["titled"] else 0
+            if len(lines) <= keep:
+                continue
+            # O marcador de corte também ocupa espaço
+            excess += len(TRUNCATION_MARKER) + 1
+            while excess > 0 and len(lines) > keep:
+                if len(lines[-1]) > excess:
+                    # Linha longa: corta só o necessário, na fronteira de palavra
+                    lines[-1] = lines[-1][:len(lines[-1]) - excess].rsplit(" ", 1)[0]
+                    excess = 0
+                else:
+                    excess -= len(lines.pop()) + 1
+            lines.append(TRUNCATION_MARKER)
+            if excess <= 0:
+                break
+        if excess <= 0:
+            break
+
+    fitted = "\n".join(line for section in sections for line in section["lines"])
+    # Texto sem quebras de linha suficientes: corte direto no limite
+    if estimate_tokens(fitted) > max_tokens:
+        limit = max(0, (max_tokens - 1) * 4 - len(TRUNCATION_MARKER) - 1)
+        fitted = fitted[:limit] + "\n" + TRUNCATION_MARKER
+    return fitted, True
@@ -0,0 +1,135 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+from app.config import (
+    CPU_POOL_KIND, CPU_POOL_WORKERS, IO_POOL_WORKERS, OCR_POOL_KIND, OCR_POOL_WORKERS
+)
+
+
+class WorkerPool:
+    """
+    Pool de execução fora do event loop, com métricas de fila e saturação.
+
+    O pool "cpu" atende trabalho pesado de CPU (pdfplumber, ReportLab),
+    o pool "ocr" atende o OCR página a página e o pool "io" atende
+    chamadas bloqueantes de rede (Gemini, Supabase).
+    """
+
+    def __init__(self, name: str, kind: str, max_workers: int):
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._peak_pending = 0
+
+    def _get_executor(self) -> Executor:
+        """Cria o executor sob demanda (processos ou threads)."""
+        if self._executor is None:
+            if self.kind == "process":
+                try:
+                    # spawn: o fork copiaria o estado do processo pai (threads do
+                    # event loop, locks, clientes HTTP) para os workers
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+                except (NotImplementedError, OSError) as e:
+                    # Ambientes sem suporte a multiprocessing (ex.: serverless)
+                    print(f"Pool '{self.name}' sem suporte a processos, usando threads: {e}")
+                    self.kind = "thread"
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix=f"laudosync-{self.name}"
+                )
+        return self._executor
+
+    def _on_done(self, future) -> None:
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                self._failed += 1
+            else:
+                self._completed += 1
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Executa `fn(*args, **kwargs)` no pool e aguarda o resultado."""
+        executor = self._get_executor()
+
+        with self._lock:
+            self._pending += 1
+            self._submitted += 1
+            self._peak_pending = max(self._peak_pending, self._pending)
+
+        try:
+            future = executor.submit(partial(fn, *args, **kwargs))
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+                self._failed += 1
+            raise
+
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def metrics(self) -> dict:
+        """Retorna profundidade de fila, workers ocupados e saturação do pool."""
+        with self._lock:
+            pending = self._pending
+            active = min(pending, self.max_workers)
+            return {
+                "kind": self.kind,
+                "max_workers": self.max_workers,
+                "active": active,
+                "queue_depth": max(0, pending - self.max_workers),
+                "saturation": round(active / self.max_workers, 3),
+                "peak_pending": self._peak_pending,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+            }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+cpu_pool = WorkerPool("cpu", CPU_POOL_KIND, CPU_POOL_WORKERS)
+ocr_pool = WorkerPool("ocr", OCR_POOL_KIND, OCR_POOL_WORKERS)
+io_pool = WorkerPool("io", "thread", IO_POOL_WORKERS)
+
+
+async def run_cpu(fn: Callable, *args, **kwargs) -> Any:
+    """Executa trabalho CPU-bound (extração, renderização) fora do event loop."""
+    return await cpu_pool.run(fn, *args, **kwargs)
+
+
+async def run_ocr(fn: Callable, *args, **kwargs) -> Any:
+    """Executa o OCR de uma página no pool dedicado."""
+    return await ocr_pool.run(fn, *args, **kwargs)
+
+
+async def run_io(fn: Callable, *args, **kwargs) -> Any:
+    """Executa chamadas de rede bloqueantes (Gemini, Supabase) fora do event loop."""
+    return await io_pool.run(fn, *args, **kwargs)
+
+
+def get_pool_metrics() -> dict:
+    """Métricas de todos os pools de workers."""
+    return {pool.name: pool.metrics() for pool in (cpu_pool, ocr_pool, io_pool)}
+
+
+def shutdown_pools() -> None:
+    """Encerra os pools (chamado no shutdown da aplicação)."""
+    for pool in (cpu_pool, ocr_pool, io_pool):
+        pool.shutdown()
@@ -1,9 +1,34 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 from pathlib import Path
 
 from app.routers import audits
+from app.services.audit_pipeline import background_reports
+from app.services.audit_stats import audit_stats
+from app.services.comparator import comparator
+from app.services.gemini_comparator import comparison_cache
+from app.services.job_queue import audit_job_queue
+from app.services.json_repair import repair_stats
+from app.services.metrics import get_latency_metrics
+from app.services.pdf_extractor import extraction_cache
+from app.services.report_cache import report_cache
+from app.services.report_diff import diff_stats
+from app.services.supabase_client import audit_cache_stats, init_supabase_client
+from app.services.worker_pools import get_pool_metrics, shutdown_pools
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Inicializa e encerra os recursos compartilhados da aplicação."""
+    init_supabase_client()
+    await audit_job_queue.start()
+    yield
+    await audit_job_queue.stop()
+    await background_reports.drain()
+    shutdown_pools()
+
 
 # Cria a aplicação FastAPI
 app = FastAPI(
@@ -11,7 +36,8 @@ app = FastAPI(
     description="API para comparação automatizada de laudos médicos",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Configuração de CORS (permite requisições do frontend)
@@ -40,6 +66,27 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Métricas operacionais (pools de workers, fila de jobs, caches, latências)."""
+    return {
+        "pools": get_pool_metrics(),
+        "latency": get_latency_metrics(),
+        "comparator": comparator.stats(),
+        "jobs": {"queue_depth": audit_job_queue.queue_depth()},
+        "background_reports": background_reports.stats(),
+        "report_diff": diff_stats.stats(),
+        "json_repair": repair_stats.stats(),
+        "caches": {
+            "comparison": comparison_cache.stats(),
+            "extraction": extraction_cache.stats(),
+            "reports": report_cache.stats(),
+            "audits": audit_cache_stats(),
+            "audit_stats": audit_stats.stats(),
+        },
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
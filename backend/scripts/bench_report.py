@@ -0,0 +1,89 @@
+"""
+Micro-benchmark da geração do relatório PDF.
+
+Gera relatórios com 0, 10 e 100 discrepâncias e mostra, por relatório, o
+tempo médio/p95 e a memória alocada (tracemalloc).
+
+Uso (na pasta backend):
+    python scripts/bench_report.py [--runs 20]
+"""
+import argparse
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.report_generator import generate_report_pdf  # noqa: E402
+
+
+SEVERITIES = ["baixa", "média", "alta", "crítica"]
+
+
+def sample_audit(discrepancies: int) -> dict:
+    return {
+        "patient_name": "Paciente de Teste",
+        "exam_type": "Tomografia de Tórax",
+        "exam_date": "2026-01-15",
+        "classification": "DISCORDÂNCIA" if discrepancies else "CONCORDÂNCIA TOTAL",
+        "analysis_summary": "Resumo da comparação entre os laudos. " * 5,
+        "has_critical_alert": discrepancies > 0,
+        "critical_alert_text": "Nódulo pulmonar não descrito no laudo oficial.",
+        "concordant_findings": [f"Achado concordante {i}." for i in range(10)],
+        "discrepancies": [
+            {
+                "type": "diagnóstica",
+                "severity": SEVERITIES[i % len(SEVERITIES)],
+                "description": f"Descrição da discrepância {i}. " * 3,
+                "official_says": "Parênquima pulmonar sem alterações.",
+                "auditor_says": f"Nódulo de {i + 3} mm no lobo superior direito.",
+            }
+            for i in range(discrepancies)
+        ],
+        "technical_note": "Nota técnica de exemplo.",
+    }
+
+
+def bench(discrepancies: int, runs: int) -> dict:
+    audit = sample_audit(discrepancies)
+    generate_report_pdf(audit)  # aquecimento (imports, fontes)
+
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        generate_report_pdf(audit)
+        times.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    size = len(generate_report_pdf(audit))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    times.sort()
+    return {
+        "discrepancies": discrepancies,
+        "mean_ms": statistics.mean(times),
+        "p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))],
+        "peak_kb": peak / 1024,
+        "pdf_kb": size / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da geração do relatório PDF")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'discrep.':>8} {'média ms':>9} {'p95 ms':>8} {'pico KB':>9} {'PDF KB':>7}")
+    for discrepancies in (0, 10, 100):
+        result = bench(discrepancies, args.runs)
+        print(
+            f"{result['discrepancies']:>8} {result['mean_ms']:>9.1f} {result['p95_ms']:>8.1f} "
+            f"{result['peak_kb']:>9.0f} {result['pdf_kb']:>7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
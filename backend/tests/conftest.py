@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# Caches e fila em diretório temporário: os testes não tocam em backend/.data
+os.environ.setdefault("LAUDOSYNC_DATA_DIR", tempfile.mkdtemp(prefix="laudosync-tests-"))
+os.environ.setdefault("GEMINI_API_KEY", "")
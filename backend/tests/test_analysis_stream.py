@@ -0,0 +1,161 @@
+import asyncio
+import json
+
+import pytest
+
+from app.routers import audits
+from app.services import gemini_comparator as gc
+from app.services.audit_pipeline import AuditPipelineError
+from app.services.json_stream import AnalysisStreamParser
+
+RESPONSE = json.dumps({
+    "classification": "CONCORDÂNCIA PARCIAL",
+    "summary": "Divergência na medida do nódulo, com \"aspas\" e vírgula, no texto.",
+    "concordant_findings": ["Fígado normal", "Baço [normal]"],
+    "discrepancies": [
+        {"type": "medida", "severity": "média", "description": "Nódulo {5 mm} x 8 mm",
+         "official_says": "5 mm", "auditor_says": "8 mm"},
+    ],
+    "has_critical_alert": False,
+    "critical_alert_text": None,
+    "technical_note": None,
+}, ensure_ascii=False)
+
+
+def feed_in_chunks(text: str, size: int) -> list:
+    parser = AnalysisStreamParser()
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start:start + size]))
+    return events
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(RESPONSE)])
+def test_parser_events_do_not_depend_on_chunk_boundaries(size):
+    events = feed_in_chunks("```json\n" + RESPONSE + "\n```", size)
+
+    assert events == [
+        ("classification", "CONCORDÂNCIA PARCIAL"),
+        ("summary", "Divergência na medida do nódulo, com \"aspas\" e vírgula, no texto."),
+        ("concordant_finding", "Fígado normal"),
+        ("concordant_finding", "Baço [normal]"),
+        ("discrepancy", json.loads(RESPONSE)["discrepancies"][0]),
+        ("has_critical_alert", False),
+        ("critical_alert_text", None),
+        ("technical_note", None),
+    ]
+
+
+def test_parser_splits_escaped_quote_across_chunks():
+    parser = AnalysisStreamParser()
+    events = parser.feed('{"summary": "a \\')
+    events += parser.feed('"b\\"", "concordant_findings": ["x"')
+    events += parser.feed("]}")
+
+    assert events == [("summary", 'a "b"'), ("concordant_finding", "x")]
+
+
+@pytest.fixture
+def comparator(monkeypatch):
+    comparator = gc.GeminiComparator(
+        model_name="padrao", max_concurrency=1, requests_per_minute=600,
+        tokens_per_minute=1_000_000, timeout=1, deadline=1, max_retries=0
+    )
+    monkeypatch.setattr(gc, "COMPARISON_CACHE_ENABLED", False)
+    monkeypatch.setattr(gc, "REPORT_DIFF_ENABLED", False)
+    return comparator
+
+
+def stream_of(text: str, size: int = 5):
+    async def generate_stream(user_message, usage=None, models=None):
+        for start in range(0, len(text), size):
+            yield text[start:start + size]
+    return generate_stream
+
+
+def collect(comparator) -> list:
+    async def run():
+        return [event async for event in comparator.compare_stream("Laudo A", "Laudo B")]
+    return asyncio.run(run())
+
+
+def test_compare_stream_validates_partial_events(comparator, monkeypatch):
+    response = json.dumps({
+        "classification": "concordancia parcial",
+        "summary": "ok",
+        "concordant_findings": ["Fígado normal", ""],
+        "discrepancies": [{"description": ""}, {"severity": "???", "description": "Nódulo"}],
+        "has_critical_alert": 0,
+    })
+    monkeypatch.setattr(comparator, "generate_stream", stream_of(response))
+
+    events = collect(comparator)
+    names = [name for name, _ in events]
+
+    assert names == [
+        "classification", "summary", "concordant_finding", "discrepancy",
+        "has_critical_alert", "usage", "analysis",
+    ]
+    streamed = dict(events)
+    assert streamed["classification"] == "CONCORDÂNCIA PARCIAL"
+    assert streamed["discrepancy"]["severity"] == "alta"
+    assert streamed["has_critical_alert"] is False
+    assert streamed["analysis"]["discrepancies"] == [streamed["discrepancy"]]
+
+
+def test_stream_chunk_timeout(comparator, monkeypatch):
+    class StalledResponse:
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            await asyncio.sleep(10)
+
+    async def send(*args, **kwargs):
+        return StalledResponse(), "padrao"
+
+    monkeypatch.setattr(gc, "GEMINI_STREAM_CHUNK_TIMEOUT", 0.05)
+    monkeypatch.setattr(comparator, "_send", send)
+
+    async def run():
+        return [text async for text in comparator.generate_stream("mensagem")]
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run())
+
+
+def sse_events(events) -> list:
+    async def source():
+        for event in events:
+            if isinstance(event, Exception):
+                raise event
+            yield event
+
+    async def run():
+        return [message async for message in audits._sse(source())]
+
+    return [
+        (lines[0].removeprefix("event: "), json.loads(lines[1].removeprefix("data: ")))
+        for lines in (message.strip().split("\n") for message in asyncio.run(run()))
+    ]
+
+
+def test_sse_sequence_and_pipeline_error():
+    assert sse_events([
+        ("stage", {"stage": "compare"}),
+        ("classification", "DISCORDÂNCIA"),
+        AuditPipelineError(500, "Erro na análise"),
+    ]) == [
+        ("stage", {"stage": "compare"}),
+        ("classification", "DISCORDÂNCIA"),
+        ("error", {"status_code": 500, "detail": "Erro na análise"}),
+    ]
+
+
+def test_sse_unexpected_error_becomes_generic_event():
+    events = sse_events([("stage", {"stage": "save"}), RuntimeError("segredo interno")])
+
+    assert events[0] == ("stage", {"stage": "save"})
+    assert events[1][0] == "error"
+    assert events[1][1]["status_code"] == 500
+    assert "segredo" not in events[1][1]["detail"]
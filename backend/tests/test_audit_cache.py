@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import supabase_client
+from app.services.cache import LRUCache
+
+
+class FakeQuery:
+    def __init__(self, client, table: str):
+        self.client = client
+        self.table = table
+        self.fields = None
+
+    def select(self, columns):
+        return self
+
+    def update(self, fields):
+        self.fields = fields
+        return self
+
+    def eq(self, column, value):
+        self.audit_id = value
+        return self
+
+    def execute(self):
+        row = self.client.rows.get(self.audit_id)
+        if self.fields is not None:
+            if row is not None:
+                row.update(self.fields)
+            return SimpleNamespace(data=[dict(row)] if row else [])
+        self.client.selects += 1
+        result = SimpleNamespace(data=[dict(row)] if row else [])
+        if self.client.on_select is not None:
+            self.client.on_select()
+        return result
+
+
+class FakeClient:
+    def __init__(self, rows: dict):
+        self.rows = rows
+        self.selects = 0
+        self.on_select = None
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient({"a1": {"id": "a1", "report_status": "pending"}})
+    monkeypatch.setattr(supabase_client, "audit_cache", LRUCache(10, ttl=60))
+    monkeypatch.setattr(supabase_client, "get_supabase_client", lambda: client)
+    return client
+
+
+def test_hit_skips_the_client(client, monkeypatch):
+    assert supabase_client.get_audit("a1")["report_status"] == "pending"
+
+    def fail():
+        raise AssertionError("o cliente não deveria ser usado num acerto do cache")
+
+    monkeypatch.setattr(supabase_client, "get_supabase_client", fail)
+    assert supabase_client.get_audit("a1")["report_status"] == "pending"
+    assert client.selects == 1
+
+
+def test_miss_for_unknown_audit(client):
+    assert supabase_client.get_audit("nao-existe") is None
+    assert supabase_client.audit_cache.get("nao-existe") is None
+
+
+def test_update_invalidates(client):
+    supabase_client.get_audit("a1")
+    supabase_client.update_audit("a1", {"report_status": "ready"})
+
+    assert supabase_client.get_audit("a1")["report_status"] == "ready"
+    assert client.selects == 2
+
+
+def test_read_racing_an_update_is_not_cached(client):
+    # A leitura pega a linha antiga e, antes de gravar no cache, chega um update
+    def update_during_read():
+        client.on_select = None
+        supabase_client.update_audit("a1", {"report_status": "ready"})
+
+    client.on_select = update_during_read
+    assert supabase_client.get_audit("a1")["report_status"] == "pending"
+
+    assert supabase_client.audit_cache.get("a1") is None
+    assert supabase_client.get_audit("a1")["report_status"] == "ready"
+
+
+def test_disabled_cache_always_reads(client, monkeypatch):
+    monkeypatch.setattr(supabase_client, "audit_cache", None)
+
+    supabase_client.get_audit("a1")
+    supabase_client.get_audit("a1")
+
+    assert client.selects == 2
+    assert supabase_client.audit_cache_stats() == {"enabled": False}
@@ -0,0 +1,18 @@
+from datetime import date, datetime, timezone
+
+from app.services.supabase_client import _date_bounds
+
+
+def test_date_bounds_use_sao_paulo_days():
+    start, end = _date_bounds({"date_from": date(2026, 1, 2), "date_to": date(2026, 1, 2)})
+
+    assert start == "2026-01-02T00:00:00-03:00"
+    assert end == "2026-01-03T00:00:00-03:00"
+    # 01:30 UTC do dia 3 ainda é dia 2 em São Paulo
+    late_evening = datetime(2026, 1, 3, 1, 30, tzinfo=timezone.utc)
+    assert datetime.fromisoformat(start) <= late_evening < datetime.fromisoformat(end)
+
+
+def test_date_bounds_are_optional():
+    assert _date_bounds({}) == (None, None)
+    assert _date_bounds({"date_to": date(2026, 1, 31)}) == (None, "2026-02-01T00:00:00-03:00")
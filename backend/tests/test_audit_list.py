@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import audits
+from app.services import supabase_client
+from app.services.supabase_client import decode_cursor, encode_cursor
+
+ROWS = [
+    {"id": "00000000-0000-0000-0000-00000000000c", "created_at": "2026-01-02T10:00:00+00:00"},
+    {"id": "00000000-0000-0000-0000-00000000000b", "created_at": "2026-01-02T10:00:00+00:00"},
+    {"id": "00000000-0000-0000-0000-00000000000a", "created_at": "2026-01-02T10:00:00+00:00"},
+]
+
+
+class FakeQuery:
+    """Registra os filtros do PostgREST e devolve as linhas fixas."""
+
+    def __init__(self, calls: list):
+        self.calls = calls
+
+    def __getattr__(self, name):
+        def record(*args, **kwargs):
+            self.calls.append((name, args))
+            return self
+        return record
+
+    def execute(self):
+        limit = next((args[0] for name, args in self.calls if name == "limit"), len(ROWS))
+        return SimpleNamespace(data=ROWS[:limit])
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+    client = SimpleNamespace(table=lambda name: FakeQuery(calls))
+    monkeypatch.setattr(supabase_client, "get_supabase_client", lambda: client)
+    return calls
+
+
+@pytest.fixture
+def client(calls, monkeypatch):
+    async def run_inline(fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+    monkeypatch.setattr(audits, "run_io", run_inline)
+    app = FastAPI()
+    app.include_router(audits.router)
+    return TestClient(app)
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(ROWS[1])
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (ROWS[1]["created_at"], ROWS[1]["id"])
+
+
+@pytest.mark.parametrize("cursor", [
+    "nao-e-base64!",
+    encode_cursor({"created_at": "ontem", "id": ROWS[0]["id"]}),
+    encode_cursor({"created_at": ROWS[0]["created_at"], "id": "nao-e-uuid"}),
+])
+def test_malformed_cursor_is_400(client, cursor):
+    response = client.get("/api/audits", params={"cursor": cursor})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cursor inválido"
+
+
+def test_next_page_breaks_created_at_ties_by_id(client, calls):
+    first = client.get("/api/audits", params={"limit": 2}).json()
+    assert [audit["id"] for audit in first["audits"]] == [ROWS[0]["id"], ROWS[1]["id"]]
+    assert decode_cursor(first["next_cursor"]) == (ROWS[1]["created_at"], ROWS[1]["id"])
+
+    calls.clear()
+    client.get("/api/audits", params={"limit": 2, "cursor": first["next_cursor"]})
+
+    created_at, audit_id = ROWS[1]["created_at"], ROWS[1]["id"]
+    assert ("or_", (
+        f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{audit_id})',
+    )) in calls
+    assert ("order", ("created_at",)) in calls and ("order", ("id",)) in calls
@@ -0,0 +1,79 @@
+import io
+import json
+import zipfile
+
+import pytest
+
+from app.services import batch_audit
+from app.services.batch_audit import BatchError, pairs_from_manifest, pairs_from_zip
+
+PDF = b"%PDF-1.4 teste"
+
+
+def make_zip(members: list[tuple[str, bytes]]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def test_pairs_by_filename():
+    pairs = pairs_from_zip(make_zip([("a_oficial.pdf", PDF), ("a_auditor.pdf", PDF)]))
+    assert [(p.pair_id, p.error) for p in pairs] == [("a", None)]
+
+
+def test_non_pdf_member_is_rejected():
+    with pytest.raises(BatchError, match="só pode conter PDFs"):
+        pairs_from_zip(make_zip([("a_oficial.pdf", PDF), ("a_auditor.pdf", PDF), ("x.exe", b"MZ")]))
+
+
+def test_limits_are_checked_before_decompressing(monkeypatch):
+    monkeypatch.setattr(batch_audit, "BATCH_ZIP_MAX_FILE_MB", 1)
+    bomb = make_zip([("a_oficial.pdf", b"\0" * (2 * 1024 * 1024)), ("a_auditor.pdf", PDF)])
+    monkeypatch.setattr(zipfile.ZipFile, "read", lambda *args: pytest.fail("leu o arquivo"))
+    with pytest.raises(BatchError, match="excede o limite de 1 MB"):
+        pairs_from_zip(bomb)
+
+
+def test_total_and_member_limits(monkeypatch):
+    members = [("a_oficial.pdf", PDF), ("a_auditor.pdf", PDF)]
+    monkeypatch.setattr(batch_audit, "BATCH_ZIP_MAX_MEMBERS", 1)
+    with pytest.raises(BatchError, match="limite de 1 arquivos"):
+        pairs_from_zip(make_zip(members))
+
+    monkeypatch.setattr(batch_audit, "BATCH_ZIP_MAX_MEMBERS", 10)
+    monkeypatch.setattr(batch_audit, "BATCH_ZIP_MAX_TOTAL_MB", len(PDF) * 1.5 / (1024 * 1024))
+    with pytest.raises(BatchError, match="ZIP descompactado"):
+        pairs_from_zip(make_zip(members))
+
+
+def test_ambiguous_key_becomes_pair_error():
+    pairs = pairs_from_zip(make_zip([
+        ("a_oficial.pdf", PDF), ("a_official.pdf", PDF), ("a_auditor.pdf", PDF),
+        ("b_oficial.pdf", PDF), ("b_auditor.pdf", PDF),
+    ]))
+    assert [p.pair_id for p in pairs] == ["a", "b"]
+    assert "Mais de um arquivo" in pairs[0].error
+    assert pairs[1].error is None
+
+
+def test_duplicate_ids_and_files_in_manifest_become_pair_errors():
+    manifest = [
+        {"id": "1", "official": "o1.pdf", "auditor": "a1.pdf"},
+        {"id": "1", "official": "o2.pdf", "auditor": "a2.pdf"},
+        {"id": "2", "official": "dup.pdf", "auditor": "a2.pdf"},
+    ]
+    files = {name: PDF for name in ("o1.pdf", "a1.pdf", "o2.pdf", "a2.pdf", "dup.pdf")}
+    pairs = pairs_from_manifest(manifest, files, frozenset({"dup.pdf"}))
+    assert pairs[0].error is None
+    assert "repetido" in pairs[1].error
+    assert "mais de uma vez" in pairs[2].error
+
+
+def test_duplicate_zip_members_become_pair_errors():
+    manifest = json.dumps([{"id": "x", "official": "o.pdf", "auditor": "a.pdf"}]).encode()
+    with pytest.warns(UserWarning):
+        data = make_zip([("manifest.json", manifest), ("o.pdf", PDF), ("o.pdf", PDF), ("a.pdf", PDF)])
+    pairs = pairs_from_zip(data)
+    assert "mais de uma vez" in pairs[0].error
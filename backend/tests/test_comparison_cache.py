@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services import gemini_comparator as gc
+from app.services.cache import LRUCache, TieredCache
+
+ANALYSIS = {
+    "classification": "CONCORDÂNCIA PARCIAL",
+    "summary": "Medidas diferentes.",
+    "concordant_findings": [],
+    "discrepancies": [],
+    "has_critical_alert": False,
+    "critical_alert_text": None,
+    "technical_note": None,
+}
+
+
+@pytest.fixture
+def comparator(monkeypatch):
+    monkeypatch.setattr(gc, "comparison_cache", TieredCache(LRUCache(100, ttl=60)))
+    monkeypatch.setattr(gc, "COMPARISON_CACHE_ENABLED", True)
+    comparator = gc.GeminiComparator(
+        model_name="padrao", max_concurrency=1, requests_per_minute=60,
+        tokens_per_minute=1_000_000, timeout=1, deadline=1, max_retries=0,
+        router=gc.ModelRouter("padrao", fallback_model="reserva")
+    )
+    comparator.calls = []
+
+    async def generate(user_message, usage, models):
+        comparator.calls.append(models)
+        usage["model"] = comparator.answering_model
+        return json.dumps(ANALYSIS)
+
+    monkeypatch.setattr(comparator, "generate", generate)
+    return comparator
+
+
+def test_cache_key_depends_on_model():
+    parts = ("a", "b", "P", "RX", "2026-01-01")
+    assert gc.comparison_cache_key(*parts, "padrao") != gc.comparison_cache_key(*parts, "reserva")
+
+
+def test_result_is_stored_under_the_model_that_answered(comparator):
+    comparator.answering_model = "reserva"
+    args = ("Nódulo de 5 mm.", "Nódulo de 7 mm.", "P", "RX", "2026-01-01")
+
+    first = asyncio.run(comparator.compare(*args))
+    assert first["success"] and not first.get("cached")
+    assert gc.comparison_cache.get(gc.comparison_cache_key(*args, "reserva")) is not None
+    assert gc.comparison_cache.get(gc.comparison_cache_key(*args, "padrao")) is None
+
+    second = asyncio.run(comparator.compare(*args))
+    assert second["cached"]
+    assert len(comparator.calls) == 1
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from app.services import gemini_comparator as gc
+from app.services import metrics
+
+
+class SlowModel:
+    """Primeira chamada demora; as seguintes respondem na hora."""
+
+    def __init__(self, first_delay: float = 0.2):
+        self.first_delay = first_delay
+        self.calls = 0
+
+    async def generate_content_async(self, *args, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            await asyncio.sleep(self.first_delay)
+            return "lenta"
+        return "rapida"
+
+
+@pytest.fixture(autouse=True)
+def clean_histograms(monkeypatch):
+    monkeypatch.setattr(metrics, "_histograms", {})
+    monkeypatch.setattr(gc.system_prompt_cache, "provider", None)
+
+
+def make_comparator(model, max_concurrency: int = 4) -> gc.GeminiComparator:
+    comparator = gc.GeminiComparator(
+        model_name="padrao", max_concurrency=max_concurrency, requests_per_minute=600,
+        tokens_per_minute=1_000_000, timeout=1, deadline=1, max_retries=0
+    )
+    comparator._get_plain_model = lambda name: model
+    return comparator
+
+
+def test_only_full_generations_feed_hedge_histogram():
+    comparator = make_comparator(SlowModel(first_delay=0))
+
+    async def run():
+        await comparator._send("mensagem", 100, ["padrao"], "repair")
+        await comparator._send("mensagem", 100, ["padrao"], "stream_open")
+        await comparator._send("mensagem", 100, ["padrao"])
+
+    asyncio.run(run())
+
+    assert metrics.get_histogram("gemini.generate.padrao").count == 1
+    assert metrics.get_histogram("gemini.repair.padrao").count == 1
+    assert metrics.get_histogram("gemini.stream_open.padrao").count == 1
+
+
+def test_cancelled_hedge_loser_is_not_recorded(monkeypatch):
+    comparator = make_comparator(SlowModel(first_delay=0.2))
+    monkeypatch.setattr(comparator, "_hedge_delay", lambda name: 0.01)
+
+    result = asyncio.run(comparator._hedged_call("padrao", "mensagem", 100))
+
+    assert result == "rapida"
+    assert comparator._stats_for("padrao")["hedge_wins"] == 1
+    # Só a vencedora entra no histograma; a primeira foi cancelada
+    assert metrics.get_histogram("gemini.generate.padrao").count == 1
+
+
+def test_hedge_waits_for_its_own_slot(monkeypatch):
+    model = SlowModel(first_delay=0.2)
+    comparator = make_comparator(model, max_concurrency=1)
+    monkeypatch.setattr(comparator, "_hedge_delay", lambda name: 0.01)
+    acquired = []
+    original_acquire = comparator.limiter.acquire
+
+    async def acquire(tokens):
+        acquired.append(tokens)
+        await original_acquire(tokens)
+
+    monkeypatch.setattr(comparator.limiter, "acquire", acquire)
+
+    async def run():
+        async with comparator._slot(100):
+            return await comparator._hedged_call("padrao", "mensagem", 100)
+
+    # Com uma vaga só, a chamada extra espera a original terminar
+    assert asyncio.run(run()) == "lenta"
+    assert model.calls == 1
+    assert acquired == [100, 100]
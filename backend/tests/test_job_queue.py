@@ -0,0 +1,65 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.services.job_queue import AuditJobQueue, CallbackURLError, JobStore, validate_callback_url
+
+
+@pytest.mark.parametrize("url", [
+    "file:///etc/passwd",
+    "ftp://8.8.8.8/x",
+    "http://127.0.0.1:8000/hook",
+    "http://[::1]/hook",
+    "http://[::ffff:10.0.0.1]/hook",
+    "http://10.1.2.3/hook",
+    "http://192.168.0.10/hook",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://0.0.0.0/hook",
+    "http:///hook",
+])
+def test_callback_url_rejects_non_http_and_internal_hosts(url):
+    with pytest.raises(CallbackURLError):
+        validate_callback_url(url)
+
+
+def test_callback_url_accepts_public_http_host():
+    validate_callback_url("https://8.8.8.8/hook")
+
+
+def test_purge_removes_only_old_finished_jobs(tmp_path):
+    store = JobStore(str(tmp_path))
+    old_done = store.create(b"a", b"b", {})
+    old_running = store.create(b"a", b"b", {})
+    recent_done = store.create(b"a", b"b", {})
+    store.update(old_done, status="completed")
+    store.update(old_running, status="running")
+    store.update(recent_done, status="failed")
+    with store._lock:
+        store._conn.execute(
+            "UPDATE jobs SET updated_at = '2000-01-01T00:00:00' WHERE id IN (?, ?)",
+            (old_done, old_running)
+        )
+        store._conn.commit()
+
+    assert store.purge_finished(retention=3600) == 1
+
+    assert store.get(old_done) is None
+    assert not store.files_dir(old_done).exists()
+    assert store.get(old_running) is not None
+    assert store.get(recent_done) is not None
+
+
+def test_failed_progress_write_is_logged(tmp_path, capsys):
+    queue = AuditJobQueue(str(tmp_path), workers=0)
+
+    def fail(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    async def run():
+        queue._store_call_nowait(fail, "job-1")
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+
+    assert "database is locked" in capsys.readouterr().out
@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services import gemini_comparator as gc
+from app.services.json_repair import (
+    FALLBACK_CLASSIFICATION, TRUNCATED_RESPONSE_NOTE, close_truncated_json, repair_json,
+    repair_stats, validate_analysis
+)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": [1, 2', {"a": [1]}),
+    ('{"a": "com', {}),
+    ('{"a": 1, "b"', {"a": 1}),
+    ('{"a": {"b": [true, fal', {"a": {"b": [True]}}),
+    ('{"a": "x", "b": 1.', {"a": "x"}),
+])
+def test_close_truncated_json(text, expected):
+    assert json.loads(close_truncated_json(text)) == expected
+
+
+def test_repair_json_strips_fences_and_prose():
+    text = 'Segue a análise:\n```json\n{"classification": "DISCORDÂNCIA",}\n```\nObrigado.'
+    assert repair_json(text) == ({"classification": "DISCORDÂNCIA"}, False)
+
+
+def test_repair_json_reports_truncation():
+    result, truncated = repair_json('{"summary": "ok", "discrepancies": [{"description": "x"')
+    assert truncated
+    assert result == {"summary": "ok", "discrepancies": [{"description": "x"}]}
+
+
+def test_repair_json_without_object():
+    assert repair_json("sem json aqui") == (None, False)
+
+
+def test_validate_analysis_fixes_labels_and_types():
+    result, fixes = validate_analysis({
+        "classification": "concordancia parcial",
+        "summary": None,
+        "concordant_findings": "Coração normal",
+        "discrepancies": [
+            {"type": "Omissão menor", "severity": "MEDIA", "description": "x"},
+            {"description": "", "official_says": None},
+            "achado solto",
+        ],
+        "has_critical_alert": "false",
+    })
+    assert result["classification"] == "CONCORDÂNCIA PARCIAL"
+    assert result["summary"] == ""
+    assert result["concordant_findings"] == ["Coração normal"]
+    assert [d["type"] for d in result["discrepancies"]] == ["omissão_menor", None]
+    assert [d["severity"] for d in result["discrepancies"]] == ["média", "alta"]
+    assert result["has_critical_alert"] is True
+    assert fixes > 0
+
+
+@pytest.mark.parametrize("classification", [None, "", "TALVEZ", 3])
+def test_validate_analysis_unknown_classification_falls_back(classification):
+    result, _ = validate_analysis({"classification": classification, "technical_note": "Nota."})
+    assert result["classification"] == FALLBACK_CLASSIFICATION
+    assert result["technical_note"].startswith("Nota. ")
+
+
+def test_still_truncated_response_is_not_recorded_as_repaired(monkeypatch):
+    comparator = gc.GeminiComparator(
+        model_name="padrao", max_concurrency=1, requests_per_minute=60,
+        tokens_per_minute=1_000_000, timeout=1, deadline=1, max_retries=0
+    )
+
+    async def generate(message, usage, models):
+        return ', "summary": "ok"'  # nunca fecha o objeto
+
+    monkeypatch.setattr(comparator, "generate", generate)
+    before = repair_stats.stats()
+    usage = {"model": "padrao"}
+
+    result = asyncio.run(comparator._parse_or_repair(
+        "mensagem", '{"classification": "CONCORDÂNCIA TOTAL"', usage
+    ))
+
+    after = repair_stats.stats()
+    assert after["truncated"] == before["truncated"] + 1
+    assert after["repaired_locally"] == before["repaired_locally"]
+    assert usage["truncated_response"] is True
+    assert result["technical_note"] == TRUNCATED_RESPONSE_NOTE
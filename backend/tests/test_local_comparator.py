@@ -0,0 +1,55 @@
+import asyncio
+
+from app.services.local_comparator import LocalComparator, local_analysis
+
+
+def test_identical_reports_are_total_agreement():
+    analysis = local_analysis("Fígado normal. Baço normal.", "FIGADO NORMAL\nbaço normal")
+    assert analysis["classification"] == "CONCORDÂNCIA TOTAL"
+    assert analysis["discrepancies"] == []
+
+
+def test_changed_comparator_is_a_discrepancy():
+    analysis = local_analysis(
+        "Fígado normal. Baço normal. Rins normais. Nódulo < 5 mm.",
+        "Fígado normal. Baço normal. Rins normais. Nódulo > 5 mm."
+    )
+    assert analysis["classification"] == "CONCORDÂNCIA PARCIAL"
+    [discrepancy] = analysis["discrepancies"]
+    assert discrepancy["official_says"] == "Nódulo < 5 mm."
+    assert discrepancy["auditor_says"] == "Nódulo > 5 mm."
+
+
+def test_omission_is_low_severity():
+    analysis = local_analysis("Fígado normal. Cisto renal simples.", "Fígado normal.")
+    [discrepancy] = analysis["discrepancies"]
+    assert discrepancy["severity"] == "baixa"
+    assert discrepancy["auditor_says"] == "Não mencionado"
+
+
+def test_injected_failures_follow_the_seed():
+    def outcomes(seed: int) -> list[bool]:
+        comparator = LocalComparator(
+            latency=0, jitter=0, error_rate=0.5, seed=seed, max_concurrency=4
+        )
+
+        async def run():
+            return [
+                (await comparator.compare("Fígado normal.", "Fígado normal."))["success"]
+                for _ in range(20)
+            ]
+        return asyncio.run(run())
+
+    assert outcomes(7) == outcomes(7)
+    assert not all(outcomes(7)) and any(outcomes(7))
+
+
+def test_stream_ends_with_usage_and_analysis():
+    comparator = LocalComparator(latency=0, jitter=0, error_rate=0, seed=0, max_concurrency=1)
+
+    async def collect():
+        return [event async for event in comparator.compare_stream("A normal.", "B alterado.")]
+
+    events = asyncio.run(collect())
+    assert [name for name, _ in events[-2:]] == ["usage", "analysis"]
+    assert events[-1][1]["classification"] == "DISCORDÂNCIA"
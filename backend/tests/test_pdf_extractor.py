@@ -0,0 +1,36 @@
+from app.services import pdf_extractor
+from app.services.cache import LRUCache, TieredCache
+from app.services.pdf_extractor import PdfIngestion, apply_ocr_results, store_ingestion
+
+
+def scanned_ingestion() -> PdfIngestion:
+    return PdfIngestion(
+        valid=True, page_count=3, pages=["Texto nativo da primeira página", "", ""],
+        text="Texto nativo da primeira página", needs_ocr=[2, 3]
+    )
+
+
+def test_failed_ocr_page_is_not_cached(monkeypatch):
+    cache = TieredCache(LRUCache(10, ttl=60))
+    monkeypatch.setattr(pdf_extractor, "extraction_cache", cache)
+    monkeypatch.setattr(pdf_extractor, "EXTRACTION_CACHE_ENABLED", True)
+
+    ingestion = scanned_ingestion()
+    apply_ocr_results(ingestion, {2: "Texto reconhecido", 3: None}, 0.1)
+    store_ingestion("falhou", ingestion)
+
+    assert ingestion.ocr_pages == [2]
+    assert ingestion.ocr_failed_pages == [3]
+    assert cache.get("falhou") is None
+
+
+def test_successful_ocr_is_cached(monkeypatch):
+    cache = TieredCache(LRUCache(10, ttl=60))
+    monkeypatch.setattr(pdf_extractor, "extraction_cache", cache)
+    monkeypatch.setattr(pdf_extractor, "EXTRACTION_CACHE_ENABLED", True)
+
+    ingestion = scanned_ingestion()
+    apply_ocr_results(ingestion, {2: "Texto reconhecido", 3: ""}, 0.1)
+    store_ingestion("ok", ingestion)
+
+    assert cache.get("ok")["ocr_pages"] == [2]
@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from app.services import gemini_comparator as gc
+from app.services.prompt_cache import FakePromptCacheProvider, SystemPromptCache
+
+
+class StubModel:
+    def __init__(self, name: str, error: Exception = None):
+        self.name = name
+        self.error = error
+
+    async def generate_content_async(self, *args, **kwargs):
+        if self.error is not None:
+            raise self.error
+        return self.name
+
+
+class StubProvider(FakePromptCacheProvider):
+    def __init__(self, create_error: Exception = None, model_error: Exception = None):
+        super().__init__()
+        self.create_error = create_error
+        self.model_error = model_error
+        self.create_calls = 0
+
+    def create(self, *args, **kwargs):
+        self.create_calls += 1
+        if self.create_error is not None:
+            raise self.create_error
+        return super().create(*args, **kwargs)
+
+    def model_for(self, handle):
+        return StubModel("em-cache", self.model_error)
+
+
+def make_cache(provider) -> SystemPromptCache:
+    return SystemPromptCache(
+        provider, "prompt", version="1", ttl=100, refresh_margin=10, retry_after=600
+    )
+
+
+@pytest.fixture
+def comparator(monkeypatch):
+    comparator = gc.GeminiComparator(
+        model_name="padrao", max_concurrency=1, requests_per_minute=600,
+        tokens_per_minute=1_000_000, timeout=1, deadline=1, max_retries=0
+    )
+    monkeypatch.setattr(gc, "configure_gemini", lambda: None)
+    monkeypatch.setattr(comparator, "_get_plain_model", lambda name: StubModel("comum"))
+    return comparator
+
+
+def test_refreshes_before_expiry():
+    provider = StubProvider()
+    cache = make_cache(provider)
+    cache.ensure("padrao")
+    assert cache.stats()["created"] == 1 and cache.is_fresh("padrao")
+
+    # Dentro da margem de renovação: renova em vez de criar outro
+    cache._entries["padrao"].expires_at = time.time() + 5
+    assert not cache.is_fresh("padrao")
+    cache.ensure("padrao")
+
+    assert cache.stats()["refreshed"] == 1
+    assert provider.create_calls == 1
+    assert cache._entries["padrao"].expires_at > time.time() + 50
+
+
+def test_not_found_invalidates_and_retries_uncached(comparator, monkeypatch):
+    cache = make_cache(StubProvider(model_error=google_exceptions.NotFound("sumiu")))
+    monkeypatch.setattr(gc, "system_prompt_cache", cache)
+
+    response = asyncio.run(comparator._call_model("padrao", "mensagem", 100))
+
+    assert response == "comum"
+    assert cache.stats()["fallbacks"] == 1
+    assert cache.model("padrao") is None
+    assert cache.is_fresh("padrao")  # em pausa: não tenta recriar a cada chamada
+
+
+def test_invalid_argument_disables_cache_for_good(comparator, monkeypatch):
+    provider = StubProvider(create_error=google_exceptions.InvalidArgument("abaixo do mínimo de tokens"))
+    cache = make_cache(provider)
+    monkeypatch.setattr(gc, "system_prompt_cache", cache)
+
+    for _ in range(3):
+        model, cached = asyncio.run(comparator._get_model("padrao"))
+        assert (model.name, cached) == ("comum", False)
+
+    assert provider.create_calls == 1
+    assert cache.stats()["disabled_models"] == ["padrao"]
+
+
+def test_transient_error_pauses_cache(comparator, monkeypatch):
+    provider = StubProvider(create_error=google_exceptions.ServiceUnavailable("fora do ar"))
+    cache = make_cache(provider)
+    monkeypatch.setattr(gc, "system_prompt_cache", cache)
+
+    model, cached = asyncio.run(comparator._get_model("padrao"))
+
+    assert (model.name, cached) == ("comum", False)
+    assert cache.stats()["disabled_models"] == []
+    assert cache._unavailable_until["padrao"] > time.time()
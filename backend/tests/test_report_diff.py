@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from app.services import gemini_comparator
+from app.services.report_diff import diff_reports, is_boilerplate, normalize_segment, split_segments
+
+
+@pytest.mark.parametrize("official, auditor", [
+    ("Nódulo < 5 mm no lobo superior.", "Nódulo > 5 mm no lobo superior."),
+    ("HER2: +", "HER2: -"),
+    ("Desvio padrão de -2.", "Desvio padrão de 2."),
+    ("Ki-67: 20%", "Ki-67: 20"),
+    ("Nódulo de 5 mm.", "Nódulo de 5 cm."),
+])
+def test_symbols_and_units_are_not_normalized_away(official, auditor):
+    assert normalize_segment(official) != normalize_segment(auditor)
+    assert not diff_reports(official, auditor).identical
+
+
+def test_formatting_differences_are_identical():
+    official = "FÍGADO: dimensões normais.\nNódulo de 1.2 cm."
+    auditor = "- Fígado: dimensoes normais.\nnódulo de 1,2 cm"
+    assert diff_reports(official, auditor).identical
+
+
+@pytest.mark.parametrize("line", [
+    "Dr. João Silva - CRM/SP 12345",
+    "Dra. Maria Souza CRM-SP 98765",
+    "CRM 12345/SP",
+    "CRM: 123456",
+    "Página 1 / 2",
+    "Documento assinado digitalmente",
+])
+def test_signature_and_stamp_lines_are_boilerplate(line):
+    assert is_boilerplate(normalize_segment(line))
+
+
+@pytest.mark.parametrize("line", [
+    "Dr. João CRM 12345 nódulo de 5 mm",
+    "CRM 12345 - achado de nódulo espiculado",
+])
+def test_clinical_text_after_crm_is_kept(line):
+    assert not is_boilerplate(normalize_segment(line))
+    assert split_segments(line)
+
+
+def test_short_circuit_only_on_equal_texts():
+    same = gemini_comparator._short_circuit(
+        diff_reports("Nódulo < 5 mm.", "nódulo <5mm"), "Nódulo < 5 mm.", "nódulo <5mm"
+    )
+    assert same["classification"] == "CONCORDÂNCIA TOTAL"
+
+    different = diff_reports("Nódulo < 5 mm.", "Nódulo > 5 mm.")
+    assert gemini_comparator._short_circuit(different, "Nódulo < 5 mm.", "Nódulo > 5 mm.") is None
+
+
+def test_excerpt_mode_merges_shared_findings():
+    official = "Fígado normal.\nBaço normal.\nRins normais.\nNódulo de 5 mm."
+    auditor = "Fígado normal.\nBaço normal.\nRins normais.\nNódulo de 8 mm."
+    diff = diff_reports(official, auditor)
+    assert gemini_comparator._excerpted(diff)
+
+    result = {"concordant_findings": ["fígado normal"], "discrepancies": []}
+    added = gemini_comparator._merge_shared_findings(diff, result)
+
+    assert added == ["Baço normal.", "Rins normais."]
+    assert result["concordant_findings"] == ["fígado normal", "Baço normal.", "Rins normais."]
+
+
+def test_cache_hit_does_not_count_diff_savings(monkeypatch):
+    official = "Fígado normal.\nBaço normal.\nNódulo de 5 mm."
+    auditor = "Fígado normal.\nBaço normal.\nNódulo de 8 mm."
+    comparator = gemini_comparator.GeminiComparator(
+        model_name="padrao", max_concurrency=1, requests_per_minute=600,
+        tokens_per_minute=1_000_000, timeout=1, deadline=1, max_retries=0
+    )
+    monkeypatch.setattr(gemini_comparator, "COMPARISON_CACHE_ENABLED", True)
+    monkeypatch.setattr(
+        gemini_comparator, "_cached_analysis", lambda key_parts, models: {"classification": "x"}
+    )
+    recorded = []
+    monkeypatch.setattr(gemini_comparator.diff_stats, "record", lambda **kwargs: recorded.append(kwargs))
+
+    response = asyncio.run(comparator.compare(official, auditor))
+
+    assert response["cached"] and recorded == []
@@ -0,0 +1,116 @@
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.routers import audits
+from app.services.report_cache import ReportRenderCache
+
+AUDIT = {
+    "id": "audit-1",
+    "patient_name": "Paciente Teste",
+    "exam_type": "RX Tórax",
+    "exam_date": "2026-01-02",
+    "classification": "CONCORDÂNCIA PARCIAL",
+    "analysis_summary": "Divergência na medida do nódulo.",
+    "has_critical_alert": False,
+    "critical_alert_text": None,
+    "concordant_findings": ["Coração de dimensões normais"],
+    "discrepancies": [],
+    "technical_note": None,
+    "created_at": "2026-01-02T10:00:00+00:00",
+}
+
+
+@pytest.mark.parametrize("header, size, expected", [
+    (None, 100, None),
+    ("bytes=0-9", 100, (0, 9)),
+    ("bytes=90-", 100, (90, 99)),
+    ("bytes=-10", 100, (90, 99)),
+    ("bytes=50-500", 100, (50, 99)),
+    ("bytes=0-1,5-6", 100, None),
+    ("items=0-9", 100, None),
+    ("bytes=abc", 100, None),
+    ("bytes=-0", 100, None),
+])
+def test_parse_range(header, size, expected):
+    assert audits._parse_range(header, size) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=10-5"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(HTTPException) as exc:
+        audits._parse_range(header, 100)
+    assert exc.value.status_code == 416
+    assert exc.value.headers["Content-Range"] == "bytes */100"
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    async def run_inline(fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+    cache = ReportRenderCache(str(tmp_path), max_entries=10)
+    monkeypatch.setattr(audits, "get_audit", lambda audit_id: dict(AUDIT) if audit_id == "audit-1" else None)
+    monkeypatch.setattr(audits, "run_io", run_inline)
+    monkeypatch.setattr(audits, "run_cpu", run_inline)
+    monkeypatch.setattr(audits, "report_cache", cache)
+
+    app = FastAPI()
+    app.include_router(audits.router)
+    return TestClient(app)
+
+
+def test_etag_is_stable_across_re_renders(client, tmp_path):
+    first = client.get("/api/audits/audit-1/report")
+    assert first.status_code == 200
+    for path in tmp_path.glob("*.pdf"):
+        path.unlink()
+
+    second = client.get("/api/audits/audit-1/report")
+    assert second.headers["etag"] == first.headers["etag"]
+    assert second.content == first.content
+
+
+def test_if_none_match_returns_304(client):
+    etag = client.get("/api/audits/audit-1/report").headers["etag"]
+    response = client.get("/api/audits/audit-1/report", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_if_range_matching_etag_returns_partial_content(client):
+    full = client.get("/api/audits/audit-1/report")
+    response = client.get(
+        "/api/audits/audit-1/report",
+        headers={"Range": "bytes=0-9", "If-Range": full.headers["etag"]}
+    )
+    assert response.status_code == 206
+    assert response.content == full.content[:10]
+    assert response.headers["content-range"] == f"bytes 0-9/{len(full.content)}"
+
+
+def test_if_range_stale_etag_returns_full_file(client):
+    full = client.get("/api/audits/audit-1/report")
+    response = client.get(
+        "/api/audits/audit-1/report",
+        headers={"Range": "bytes=0-9", "If-Range": '"outra-versao"'}
+    )
+    assert response.status_code == 200
+    assert response.content == full.content
+
+
+def test_cache_survives_concurrent_unlink(tmp_path, monkeypatch):
+    cache = ReportRenderCache(str(tmp_path), max_entries=1)
+    cache.put("a", "1" * 32, b"%PDF-a")
+    real_stat = type(tmp_path).stat
+
+    def flaky_stat(path, *args, **kwargs):
+        if path.name.startswith("a--"):
+            raise FileNotFoundError(path)
+        return real_stat(path, *args, **kwargs)
+
+    monkeypatch.setattr(type(tmp_path), "stat", flaky_stat)
+    cache.put("b", "2" * 32, b"%PDF-b")
+    monkeypatch.undo()
+
+    assert cache.stats()["enabled"]
+    assert cache.get("b", "2" * 32) == b"%PDF-b"
@@ -0,0 +1,48 @@
+from app.services.text_preparation import (
+    TRUNCATION_MARKER, estimate_tokens, fit_to_budget, remove_boilerplate, split_sections
+)
+
+TECHNIQUE = "TÉCNICA:\n" + "\n".join(f"Aquisição helicoidal em cortes de 1 mm, série {i}." for i in range(20))
+FINDINGS = "ACHADOS:\n" + "\n".join(f"Achado descritivo número {i} sem alterações." for i in range(20))
+IMPRESSION = "IMPRESSÃO:\nNódulo pulmonar de 8 mm no lobo superior direito."
+REPORT = "\n".join((TECHNIQUE, FINDINGS, IMPRESSION))
+
+
+def test_text_within_budget_is_untouched():
+    assert fit_to_budget(REPORT, estimate_tokens(REPORT)) == (REPORT, False)
+
+
+def test_lowest_priority_section_is_trimmed_first():
+    budget = estimate_tokens(REPORT) - 100
+    fitted, truncated = fit_to_budget(REPORT, budget)
+    technique, findings, impression = (s["lines"] for s in split_sections(fitted))
+
+    assert truncated
+    assert estimate_tokens(fitted) <= budget
+    assert technique[-1] == TRUNCATION_MARKER
+    assert TRUNCATION_MARKER not in findings
+    assert "\n".join(impression) == IMPRESSION
+
+
+def test_findings_are_trimmed_before_impression():
+    budget = estimate_tokens(IMPRESSION) + 80
+    fitted, truncated = fit_to_budget(REPORT, budget)
+
+    assert truncated
+    assert estimate_tokens(fitted) <= budget
+    assert fitted.startswith("TÉCNICA:\n" + TRUNCATION_MARKER)
+    assert fitted.endswith(IMPRESSION)
+    assert "ACHADOS:" in fitted
+
+
+def test_text_without_line_breaks_is_hard_cut():
+    text = "palavra " * 500
+    fitted, truncated = fit_to_budget(text, 50)
+    assert truncated
+    assert estimate_tokens(fitted) <= 50
+    assert fitted.endswith(TRUNCATION_MARKER)
+
+
+def test_remove_boilerplate_keeps_clinical_lines():
+    text = "Nódulo de 5 mm.\nPágina 1 de 2\nDr. João Silva - CRM/SP 12345\nTel: (11) 5555-1234"
+    assert remove_boilerplate(text) == "Nódulo de 5 mm."
@@ -14,7 +14,9 @@ interface AuditResult {
   has_critical_alert: boolean
   critical_alert_text: string | null
   technical_note: string | null
+  report_status: 'pending' | 'ready' | 'failed'
   report_url: string | null
+  report_download_url: string | null
   extracted_texts: {
     official: string
     auditor: string
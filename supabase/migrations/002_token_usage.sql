@@ -0,0 +1,8 @@
+-- LaudoSync - Uso de tokens por auditoria
+-- Execute este SQL no Supabase SQL Editor
+
+ALTER TABLE audits ADD COLUMN IF NOT EXISTS input_tokens INTEGER;
+ALTER TABLE audits ADD COLUMN IF NOT EXISTS output_tokens INTEGER;
+
+COMMENT ON COLUMN audits.input_tokens IS 'Tokens de entrada enviados ao Gemini (0 quando a comparação não chamou o modelo)';
+COMMENT ON COLUMN audits.output_tokens IS 'Tokens de saída gerados pelo Gemini';
@@ -0,0 +1,7 @@
+-- LaudoSync - Status do relatório PDF (gerado em background)
+-- Execute este SQL no Supabase SQL Editor
+
+ALTER TABLE audits ADD COLUMN IF NOT EXISTS report_status TEXT NOT NULL DEFAULT 'ready'
+    CHECK (report_status IN ('pending', 'ready', 'failed'));
+
+COMMENT ON COLUMN audits.report_status IS 'pending enquanto o relatório é gerado/enviado ao Storage; ready quando report_pdf_url está preenchida; failed se a geração falhou';
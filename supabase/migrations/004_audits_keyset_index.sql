@@ -0,0 +1,10 @@
+-- LaudoSync - Paginação por keyset na listagem de auditorias
+-- Execute este SQL no Supabase SQL Editor
+
+-- A listagem ordena por (created_at, id) e pagina com
+-- "created_at < X OR (created_at = X AND id < Y)": o índice composto
+-- atende a ordenação e o desempate sem ordenar em memória
+CREATE INDEX IF NOT EXISTS idx_audits_created_at_id ON audits(created_at DESC, id DESC);
+
+-- Substituído pelo índice acima
+DROP INDEX IF EXISTS idx_audits_created_at;
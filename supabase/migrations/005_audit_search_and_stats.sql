@@ -0,0 +1,58 @@
+-- LaudoSync - Filtros, busca textual e estatísticas do painel
+-- Execute este SQL no Supabase SQL Editor
+
+-- Busca por trecho do nome do paciente (ILIKE '%...%')
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_audits_patient_name_trgm ON audits USING gin (patient_name gin_trgm_ops);
+
+-- Filtros combinados mais comuns na listagem (ordenada por created_at)
+CREATE INDEX IF NOT EXISTS idx_audits_critical_created_at ON audits(created_at DESC) WHERE has_critical_alert;
+
+-- Busca textual em nome, resumo e laudos
+ALTER TABLE audits ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    to_tsvector('portuguese',
+        coalesce(patient_name, '') || ' ' ||
+        coalesce(analysis_summary, '') || ' ' ||
+        coalesce(official_text, '') || ' ' ||
+        coalesce(auditor_text, ''))
+) STORED;
+CREATE INDEX IF NOT EXISTS idx_audits_search_vector ON audits USING gin (search_vector);
+
+-- Agregação diária para o painel (GET /api/audits/stats):
+-- uma linha por dia, classificação e tipo de exame
+CREATE MATERIALIZED VIEW IF NOT EXISTS audit_daily_stats AS
+SELECT
+    (a.created_at AT TIME ZONE 'America/Sao_Paulo')::date AS day,
+    coalesce(a.classification, '') AS classification,
+    coalesce(a.exam_type, '') AS exam_type,
+    count(*) AS audits,
+    count(*) FILTER (WHERE a.has_critical_alert) AS critical_alerts,
+    coalesce(sum(s.baixa), 0) AS severity_baixa,
+    coalesce(sum(s.media), 0) AS severity_media,
+    coalesce(sum(s.alta), 0) AS severity_alta,
+    coalesce(sum(s.critica), 0) AS severity_critica
+FROM audits a
+LEFT JOIN LATERAL (
+    SELECT
+        count(*) FILTER (WHERE d->>'severity' = 'baixa') AS baixa,
+        count(*) FILTER (WHERE d->>'severity' = 'média') AS media,
+        count(*) FILTER (WHERE d->>'severity' = 'alta') AS alta,
+        count(*) FILTER (WHERE d->>'severity' = 'crítica') AS critica
+    FROM jsonb_array_elements(coalesce(a.discrepancies, '[]'::jsonb)) AS d
+) s ON true
+GROUP BY 1, 2, 3;
+
+-- Índice único: permite REFRESH ... CONCURRENTLY (sem bloquear leituras)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_audit_daily_stats_key
+    ON audit_daily_stats(day, classification, exam_type);
+
+-- Chamada pelo backend (no máximo a cada AUDIT_STATS_REFRESH_INTERVAL segundos);
+-- com pg_cron, pode ser agendada: SELECT cron.schedule('*/5 * * * *', 'SELECT refresh_audit_daily_stats()');
+CREATE OR REPLACE FUNCTION refresh_audit_daily_stats() RETURNS void
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public, pg_temp AS $$
+BEGIN
+    REFRESH MATERIALIZED VIEW CONCURRENTLY audit_daily_stats;
+END;
+$$;
+
+COMMENT ON MATERIALIZED VIEW audit_daily_stats IS 'Contagem diária de auditorias por classificação, tipo de exame e severidade das discrepâncias';
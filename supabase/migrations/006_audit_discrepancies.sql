@@ -0,0 +1,71 @@
+-- LaudoSync - Discrepâncias normalizadas (uma linha por discrepância)
+-- Execute este SQL no Supabase SQL Editor
+
+-- audits.discrepancies (JSONB) continua sendo a fonte para exibição; esta
+-- tabela atende consultas analíticas sem varrer e desaninhar o JSON
+CREATE TABLE IF NOT EXISTS audit_discrepancies (
+    id BIGSERIAL PRIMARY KEY,
+    audit_id UUID NOT NULL REFERENCES audits(id) ON DELETE CASCADE,
+    position SMALLINT NOT NULL,
+    type TEXT,
+    severity TEXT CHECK (severity IN ('baixa', 'média', 'alta', 'crítica')),
+    description TEXT,
+    official_says TEXT,
+    auditor_says TEXT,
+    -- Copiados da auditoria para filtrar sem join
+    exam_type TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    UNIQUE (audit_id, position)
+);
+
+CREATE INDEX IF NOT EXISTS idx_audit_discrepancies_severity_type
+    ON audit_discrepancies(severity, type, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_audit_discrepancies_exam_type
+    ON audit_discrepancies(exam_type, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_audit_discrepancies_created_at
+    ON audit_discrepancies(created_at DESC);
+
+-- Carga das auditorias já existentes
+INSERT INTO audit_discrepancies (
+    audit_id, position, type, severity, description, official_says, auditor_says,
+    exam_type, created_at
+)
+SELECT
+    a.id,
+    d.ordinality - 1,
+    d.value->>'type',
+    CASE WHEN d.value->>'severity' IN ('baixa', 'média', 'alta', 'crítica')
+         THEN d.value->>'severity' ELSE 'alta' END,
+    d.value->>'description',
+    d.value->>'official_says',
+    d.value->>'auditor_says',
+    a.exam_type,
+    a.created_at
+FROM audits a
+CROSS JOIN LATERAL jsonb_array_elements(coalesce(a.discrepancies, '[]'::jsonb)) WITH ORDINALITY AS d
+WHERE jsonb_typeof(d.value) = 'object'
+ON CONFLICT (audit_id, position) DO NOTHING;
+
+-- Contagem por tipo de exame, tipo e severidade (GET /api/audits/discrepancies/summary);
+-- parâmetros NULL não filtram, p_date_to é exclusivo
+CREATE OR REPLACE FUNCTION discrepancy_counts(
+    p_date_from TIMESTAMPTZ DEFAULT NULL,
+    p_date_to TIMESTAMPTZ DEFAULT NULL,
+    p_severity TEXT DEFAULT NULL,
+    p_type TEXT DEFAULT NULL,
+    p_exam_type TEXT DEFAULT NULL
+)
+RETURNS TABLE (exam_type TEXT, type TEXT, severity TEXT, discrepancies BIGINT, audits BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT d.exam_type, d.type, d.severity, count(*), count(DISTINCT d.audit_id)
+    FROM audit_discrepancies d
+    WHERE (p_date_from IS NULL OR d.created_at >= p_date_from)
+      AND (p_date_to IS NULL OR d.created_at < p_date_to)
+      AND (p_severity IS NULL OR d.severity = p_severity)
+      AND (p_type IS NULL OR d.type = p_type)
+      AND (p_exam_type IS NULL OR d.exam_type = p_exam_type)
+    GROUP BY 1, 2, 3
+    ORDER BY 4 DESC;
+$$;
+
+COMMENT ON TABLE audit_discrepancies IS 'Discrepâncias de cada auditoria, uma por linha, para consultas analíticas';
@@ -0,0 +1,63 @@
+-- LaudoSync - Textos extraídos fora da linha da auditoria
+-- Execute este SQL no Supabase SQL Editor
+
+-- Um registro por texto distinto (chave: SHA-256 do texto em UTF-8): o mesmo
+-- laudo usado em várias auditorias é gravado uma vez só. O Postgres já
+-- comprime textos longos (TOAST)
+CREATE TABLE IF NOT EXISTS audit_texts (
+    hash TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT now()
+);
+
+ALTER TABLE audits ADD COLUMN IF NOT EXISTS official_text_hash TEXT REFERENCES audit_texts(hash);
+ALTER TABLE audits ADD COLUMN IF NOT EXISTS auditor_text_hash TEXT REFERENCES audit_texts(hash);
+
+-- Move os textos das auditorias existentes
+INSERT INTO audit_texts (hash, content)
+SELECT encode(sha256(convert_to(t, 'UTF8')), 'hex'), t
+FROM (
+    SELECT coalesce(official_text, '') AS t FROM audits WHERE official_text_hash IS NULL
+    UNION
+    SELECT coalesce(auditor_text, '') FROM audits WHERE auditor_text_hash IS NULL
+) texts
+ON CONFLICT (hash) DO NOTHING;
+
+UPDATE audits SET
+    official_text_hash = encode(sha256(convert_to(coalesce(official_text, ''), 'UTF8')), 'hex'),
+    auditor_text_hash = encode(sha256(convert_to(coalesce(auditor_text, ''), 'UTF8')), 'hex')
+WHERE official_text_hash IS NULL OR auditor_text_hash IS NULL;
+
+-- A busca textual (migration 005) lia os textos da própria linha: passa a
+-- ser mantida por trigger, buscando os textos em audit_texts
+DROP INDEX IF EXISTS idx_audits_search_vector;
+ALTER TABLE audits DROP COLUMN IF EXISTS search_vector;
+ALTER TABLE audits ADD COLUMN search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION audits_search_vector() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_vector := to_tsvector('portuguese',
+        coalesce(NEW.patient_name, '') || ' ' ||
+        coalesce(NEW.analysis_summary, '') || ' ' ||
+        coalesce((SELECT content FROM audit_texts WHERE hash = NEW.official_text_hash), '') || ' ' ||
+        coalesce((SELECT content FROM audit_texts WHERE hash = NEW.auditor_text_hash), ''));
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_audits_search_vector ON audits;
+CREATE TRIGGER trg_audits_search_vector
+    BEFORE INSERT OR UPDATE OF patient_name, analysis_summary, official_text_hash, auditor_text_hash
+    ON audits FOR EACH ROW EXECUTE FUNCTION audits_search_vector();
+
+UPDATE audits SET official_text_hash = official_text_hash;
+CREATE INDEX IF NOT EXISTS idx_audits_search_vector ON audits USING gin (search_vector);
+
+-- Os textos não ficam mais na linha da auditoria
+UPDATE audits SET official_text = NULL, auditor_text = NULL
+WHERE official_text IS NOT NULL OR auditor_text IS NOT NULL;
+
+COMMENT ON TABLE audit_texts IS 'Textos extraídos dos laudos, deduplicados por SHA-256';
+COMMENT ON COLUMN audits.official_text IS 'Obsoleta: o texto fica em audit_texts (official_text_hash)';
+COMMENT ON COLUMN audits.auditor_text IS 'Obsoleta: o texto fica em audit_texts (auditor_text_hash)';
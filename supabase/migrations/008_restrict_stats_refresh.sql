@@ -0,0 +1,13 @@
+-- LaudoSync - Restringe a atualização das estatísticas do painel
+-- Execute este SQL no Supabase SQL Editor
+
+-- refresh_audit_daily_stats() roda como SECURITY DEFINER (dono da view); sem
+-- isto, qualquer cliente com a chave anon poderia disparar REFRESH à vontade.
+-- search_path fixo: a função não pode ser desviada por objetos de outro schema.
+ALTER FUNCTION public.refresh_audit_daily_stats() SET search_path = public, pg_temp;
+
+REVOKE EXECUTE ON FUNCTION public.refresh_audit_daily_stats() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.refresh_audit_daily_stats() TO service_role;
+
+-- O backend chama a função com SUPABASE_SERVICE_KEY; sem essa chave, agende o
+-- refresh com pg_cron: SELECT cron.schedule('*/5 * * * *', 'SELECT refresh_audit_daily_stats()');